@@ -0,0 +1,949 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB Device Emulator
+
+Stand-in for the device's REST API so logs.py, ota_upload.py and other
+tooling can be benchmarked and regression-tested without hardware.
+
+Emulates the endpoints registered in src/WebServer.cpp:
+    GET  /api/status              - System status
+    GET  /api/logs                - since/cursor/count/level/clear over a
+                                    100-entry ring, JSON or binary (Accept)
+    GET  /api/logs/events         - Live log stream (server-sent events)
+    GET  /api/ota/status          - OTA progress
+    POST /api/ota/upload          - Multipart firmware/filesystem upload
+    GET  /api/config/backup       - Config backup
+    POST /api/config/restore      - Config restore
+    POST /api/system/reboot       - Reboot
+
+Reboots are real as far as clients can tell: the listening socket closes,
+open connections drop, and after --reboot-time the device comes back with
+an empty log buffer and its lifetime counter reset. A filesystem OTA wipes
+config.json and wifi.json, as flashing littlefs.bin does. An upload whose
+connection drops stays open for resuming, as on the device.
+
+Usage:
+    emulator.py                          # One device on 127.0.0.1:8080
+    emulator.py --count 10 --port 9000   # Ten devices on ports 9000-9009
+    emulator.py --latency 0.02 --bandwidth 60000 --log-rate 5
+    emulator.py --drop-every 100000      # Flaky link: uploads drop every 100 KB
+    emulator.py --flash-rate 80000       # Flash writes slower than the link
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ota_delta
+
+# Matches Logger::MAX_LOG_ENTRIES and the /api/logs count cap
+MAX_LOG_ENTRIES = 100
+
+# Binary /api/logs encoding (WebServer::sendLogsBinary)
+LOGS_BINARY_TYPE = 'application/x-tinklink-logs'
+
+# Delay between the OTA/reboot response and the restart (firmware: delay(500))
+RESTART_DELAY = 0.5
+
+# lwIP segment size and receive window on the device (TCP_MSS and
+# CONFIG_LWIP_TCP_WND_DEFAULT)
+TCP_MSS = 1436
+TCP_WINDOW = 5744
+
+# WebServer::STATUS_RSSI_STEP: the status fingerprint follows RSSI only
+# once it has moved this many dB; the snapshot reports the exact reading
+STATUS_RSSI_STEP = 5
+
+# ExtronSwVgaSwitcher::MAX_RECENT_MESSAGES
+MAX_RECENT_MESSAGES = 50
+
+# ESP32 application images start with this magic byte
+ESP_IMAGE_MAGIC = 0xE9
+
+LEVEL_DEBUG, LEVEL_INFO, LEVEL_WARN, LEVEL_ERROR = range(4)
+
+# Background traffic resembling a busy unit: (level, message template)
+TRAFFIC = [
+    (LEVEL_DEBUG, "Extron RX: [Sig {sig}]"),
+    (LEVEL_DEBUG, "Extron RX: [In{input} All]"),
+    (LEVEL_INFO, "Extron input changed to: {input}"),
+    (LEVEL_INFO, "Input change detected: {input}"),
+    (LEVEL_INFO, "RetroTink: Input {input} triggered -> remote prof{input}"),
+    (LEVEL_DEBUG, "RetroTink TX: [remote prof{input}]"),
+    (LEVEL_DEBUG, "DenonAvr TX: [PWON]"),
+    (LEVEL_INFO, "DenonAvr: Input change - sent PWON, queuing SIGAME"),
+    (LEVEL_DEBUG, "WebServer: AVR command: MV?"),
+    (LEVEL_WARN, "RetroTink: Boot timeout (15000 ms) - sending pending command anyway"),
+]
+
+# One input switch as the firmware logs it: (delay in ms after the Extron
+# line, level, message). Waking a sleeping RT4K queues its command until
+# boot completes; the Denon SI command follows DenonAvr::SI_DELAY_MS later.
+SWITCH_STEPS = [
+    ((0, 0), LEVEL_DEBUG, "Extron RX: [In{input} All]"),
+    ((0, 1), LEVEL_INFO, "Extron input changed to: {input}"),
+    ((0, 1), LEVEL_INFO, "Input change detected: {input}"),
+    ((1, 4), LEVEL_DEBUG, "RetroTink TX: [remote prof{input}]"),
+    ((1, 4), LEVEL_INFO, "RetroTink: Input {input} triggered -> remote prof{input}"),
+    ((5, 60), LEVEL_DEBUG, "DenonAvr TX: [PWON]"),
+    ((5, 60), LEVEL_INFO, "DenonAvr: Input change - sent PWON, queuing SIGAME"),
+    ((1000, 1030), LEVEL_DEBUG, "DenonAvr TX: [SIGAME]"),
+    ((1000, 1030), LEVEL_INFO, "DenonAvr: Sent delayed input select: SIGAME"),
+]
+SWITCH_WAKE_STEPS = [
+    ((0, 0), LEVEL_DEBUG, "Extron RX: [In{input} All]"),
+    ((0, 1), LEVEL_INFO, "Extron input changed to: {input}"),
+    ((0, 1), LEVEL_INFO, "Input change detected: {input}"),
+    ((1, 4), LEVEL_INFO, "RetroTink: RT4K is sleeping - sending power on before command"),
+    ((1, 4), LEVEL_DEBUG, "RetroTink TX: [pwr on]"),
+    ((1, 4), LEVEL_INFO, "RetroTink: Queued command for after boot: remote prof{input}"),
+    ((5, 60), LEVEL_DEBUG, "DenonAvr TX: [PWON]"),
+    ((5, 60), LEVEL_INFO, "DenonAvr: Input change - sent PWON, queuing SIGAME"),
+    ((1000, 1030), LEVEL_DEBUG, "DenonAvr TX: [SIGAME]"),
+    ((1000, 1030), LEVEL_INFO, "DenonAvr: Sent delayed input select: SIGAME"),
+    ((6000, 9000), LEVEL_INFO, "RetroTink: RT4K boot complete - power state: ON"),
+    ((6000, 9000), LEVEL_INFO, "RetroTink: Sending queued command: remote prof{input}"),
+    ((6000, 9000), LEVEL_DEBUG, "RetroTink TX: [remote prof{input}]"),
+]
+
+# Share of emulated switches that find the RT4K asleep
+SWITCH_WAKE_RATIO = 0.1
+
+
+def read_firmware_version():
+    """Version string from src/version.h, so the emulator reports the
+    version of the tree it ships with."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'version.h')
+    try:
+        with open(path) as f:
+            match = re.search(r'TINKLINK_VERSION_STRING\s+"([^"]+)"', f.read())
+            if match:
+                return match.group(1)
+    except OSError:
+        pass
+    return '0.0.0'
+
+
+class EmulatedDevice:
+    """
+    State and HTTP server for one emulated unit.
+
+    Device state (log ring, OTA progress) lives here so it survives the
+    server being torn down and recreated across reboots. Config files
+    persist across reboots like LittleFS does.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080, name='tinklink',
+                 latency=0.0, jitter=0.0, bandwidth=0, reboot_time=3.0,
+                 log_rate=0.0, keep_alive=True, version=None, firmware=b'',
+                 encodings=ota_delta.ENCODINGS, drop_every=0, flash_rate=0,
+                 switch_rate=0.0):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.reboot_time = reboot_time
+        self.log_rate = log_rate
+        self.keep_alive = keep_alive
+        self.version = version or read_firmware_version()
+        self.firmware = firmware  # Running image, the base for delta uploads
+        self.filesystem_sha256 = ''  # Last filesystem image flashed over OTA (NVS)
+        self.encodings = list(encodings)
+        self.drop_every = drop_every  # Cut uploads after this many bytes per request
+        self.flash_rate = flash_rate  # Decoded bytes/s written to flash (0 = instant)
+        self.switch_rate = switch_rate  # Input switches per second (0 = none)
+
+        self.lock = threading.Condition()
+        self.config = {'hostname': name, 'triggers': []}
+        self.wifi = {'ssid': 'Emulated', 'password': 'emulated'}
+
+        self.last_image = None
+        self.server = None
+        self.up = False
+        self.boots = 0
+        self.connections = set()
+        self._boot_state()
+
+    # -- Lifecycle -----------------------------------------------------------
+
+    def _boot_state(self):
+        """Reset volatile state, as a power cycle does."""
+        with self.lock:
+            self.boot_time = time.monotonic()
+            self.logs = []
+            self.total = 0
+            self.switcher_messages = []  # /api/switcher/receive
+            self.buffer_level = LEVEL_DEBUG
+            self.boot_id = random.getrandbits(32)  # Logger::getBootId()
+            self.rssi_base = random.randint(-70, -50)
+            self.status_rssi = 0
+            self.status_body = None  # /api/status snapshot and its ETag
+            self.status_fingerprint = None
+            self.status_etag = ''
+            self.status_generation = 0
+            self.ota = {'inProgress': False, 'progress': 0, 'total': 0, 'error': '', 'upload': '',
+                        'written': 0, 'writeMs': 0}
+            self.upload = None  # Open update: mode, payload so far, progress logging
+            self.firmware_sha256 = ota_delta.image_sha256(self.firmware) if self.firmware else ''
+            self.boots += 1
+            self.lock.notify_all()
+
+    def millis(self):
+        return int((time.monotonic() - self.boot_time) * 1000)
+
+    def start(self):
+        """Boot the device and start serving."""
+        device = self
+
+        class Handler(DeviceRequestHandler):
+            pass
+        Handler.device = device
+
+        self.server = DeviceServer((self.host, self.port), Handler)
+        self.up = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.log(LEVEL_INFO, f"  TinkLink-USB v{self.version}")
+        self.log(LEVEL_INFO, "[6/6] Starting web server...")
+        self.log(LEVEL_INFO, "WebServer: Started on port 80")
+        if self.log_rate > 0 and self.boots == 1:
+            threading.Thread(target=self._traffic, daemon=True).start()
+        if self.switch_rate > 0 and self.boots == 1:
+            threading.Thread(target=self._switches, daemon=True).start()
+
+    def stop(self):
+        """Stop serving and drop every open connection."""
+        self.up = False
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            for sock in list(self.connections):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.connections.clear()
+            self.lock.notify_all()
+
+    def reboot(self):
+        """Restart after the response has gone out, like ESP.restart()."""
+        def run():
+            time.sleep(RESTART_DELAY)
+            self.stop()
+            time.sleep(self.reboot_time)
+            self._boot_state()
+            self.start()
+        threading.Thread(target=run, daemon=True).start()
+
+    # -- Logging -------------------------------------------------------------
+
+    def log(self, level, message):
+        """Add an entry to the ring buffer and wake stream clients."""
+        with self.lock:
+            if message.startswith("Extron RX: ["):
+                # ExtronSwVgaSwitcher keeps received lines whatever the log level
+                self.switcher_messages.append(message[len("Extron RX: ["):-1])
+                del self.switcher_messages[:-MAX_RECENT_MESSAGES]
+            if level < self.buffer_level:
+                return
+            self.logs.append({'ts': self.millis(), 'lvl': level, 'msg': message})
+            if len(self.logs) > MAX_LOG_ENTRIES:
+                del self.logs[0]
+            self.total += 1
+            self.lock.notify_all()
+
+    def _traffic(self):
+        while True:
+            time.sleep(random.expovariate(self.log_rate))
+            if not self.up:
+                continue
+            level, template = random.choice(TRAFFIC)
+            sig = ' '.join(random.choice('01') for _ in range(4))
+            self.log(level, template.format(input=random.randint(1, 4), sig=sig))
+
+    def _switches(self):
+        """Log complete input switches, Extron line through Denon SI."""
+        while True:
+            time.sleep(random.expovariate(self.switch_rate))
+            if not self.up:
+                continue
+            steps = SWITCH_WAKE_STEPS if random.random() < SWITCH_WAKE_RATIO else SWITCH_STEPS
+            selected = random.randint(1, 4)
+            # Steps sharing a delay range happen together, in order
+            delays = {}
+            for span, _, _ in steps:
+                delays.setdefault(span, random.uniform(*span))
+            start = time.monotonic()
+            for span, level, template in sorted(steps, key=lambda step: delays[step[0]]):
+                time.sleep(max(0.0, start + delays[span] / 1000.0 - time.monotonic()))
+                self.log(level, template.format(input=selected))
+
+    def recent_logs(self, count):
+        """Logger::getRecentLogs()"""
+        return self.logs[-count:] if count > 0 else []
+
+    def logs_since(self, since, count):
+        """Logger::getLogsSince(), including its silent clamp to the buffer."""
+        if self.total <= since:
+            return []
+        start = max(0, len(self.logs) - (self.total - since))
+        start = max(start, len(self.logs) - count)
+        return self.logs[start:]
+
+    def select_logs(self, since, count, min_level):
+        """getLogsSince()/getRecentLogs() with a level filter. Returns
+        (logs, filtered): the newest `count` entries at or above min_level,
+        and how many entries in the window were skipped."""
+        if since > 0:
+            if self.total <= since:
+                return [], 0
+            window = self.logs[max(0, len(self.logs) - (self.total - since)):]
+        else:
+            window = self.logs
+        matched = [entry for entry in window if entry['lvl'] >= min_level]
+        return matched[len(matched) - min(count, len(matched)):], len(window) - len(matched)
+
+    def logs_from(self, cursor, count, min_level):
+        """Cursor paging (Logger::getLogsFrom()). Returns (logs, page) with
+        page fields as in the LogsPage struct."""
+        page = {'filtered': 0, 'lost': 0, 'more': False, 'reset': False}
+        boot, _, index = cursor.partition('-')
+        start = 0
+        if cursor:
+            if boot == f"{self.boot_id:08x}" and index.isdigit():
+                start = int(index)
+            else:
+                page['reset'] = True
+        oldest = self.total - len(self.logs)
+        page['lost'] = max(0, oldest - start)
+        position = min(max(start, oldest), self.total)
+
+        logs = []
+        for entry in self.logs[position - oldest:]:
+            if len(logs) >= count:
+                break
+            if entry['lvl'] < min_level:
+                page['filtered'] += 1
+            else:
+                logs.append(entry)
+            position += 1
+        page['next'] = position
+        page['more'] = position < self.total
+        return logs, page
+
+    def logs_json(self, logs, page=None):
+        """WebServer::buildLogsJson()"""
+        page = page or {}
+        return {'total': self.total, 'now': self.millis(), 'count': len(logs),
+                'filtered': page.get('filtered', 0),
+                'cursor': f"{self.boot_id:08x}-{page.get('next', self.total)}",
+                'more': page.get('more', False), 'lost': page.get('lost', 0),
+                'reset': page.get('reset', False), 'logs': logs}
+
+    def logs_binary(self, logs, page=None):
+        """WebServer::sendLogsBinary()"""
+        page = page or {}
+        flags = (1 if page.get('more') else 0) | (2 if page.get('reset') else 0)
+        out = bytearray(struct.pack('<4sIIHHIIHB', b'TLL1', self.total & 0xFFFFFFFF,
+                                    self.millis() & 0xFFFFFFFF, len(logs),
+                                    page.get('filtered', 0), self.boot_id,
+                                    page.get('next', self.total) & 0xFFFFFFFF,
+                                    min(page.get('lost', 0), 0xFFFF), flags))
+        out += struct.pack(f'<{len(logs)}I', *(entry['ts'] & 0xFFFFFFFF for entry in logs))
+        out += bytes(entry['lvl'] for entry in logs)
+        for entry in logs:
+            out += entry['msg'].encode('utf-8') + b'\0'
+        return bytes(out)
+
+    # -- Simulated link --------------------------------------------------------
+
+    def delay(self):
+        """Per-request latency."""
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def throttle(self, nbytes):
+        """Hold the link for as long as nbytes take at --bandwidth."""
+        if self.bandwidth:
+            time.sleep(nbytes / self.bandwidth)
+
+    def write_flash(self, data):
+        """
+        Decode upload data and hold it for as long as writing it takes at
+        --flash-rate, counting what /api/ota/status reports. Compressed
+        uploads are inflated as they arrive; deltas are applied at the
+        end, so for those the delta bytes stand in for the image.
+        """
+        start = time.monotonic()
+        inflater = self.upload['inflater']
+        out = len(inflater.decompress(data)) if inflater else len(data)
+        if self.flash_rate:
+            time.sleep(out / self.flash_rate)
+        self.upload['write_time'] += time.monotonic() - start
+        self.ota['written'] += out
+        self.ota['writeMs'] = int(self.upload['write_time'] * 1000)
+
+    def status_snapshot(self):
+        """(etag, body) of /api/status, rebuilt only when the status changes
+        (WebServer::handleApiStatus())."""
+        with self.lock:
+            # Signal jitters by a dB or two between polls
+            rssi = self.rssi_base + random.randint(-2, 2)
+            if abs(rssi - self.status_rssi) >= STATUS_RSSI_STEP:
+                self.status_rssi = rssi
+            # The fingerprint sees the stepped RSSI, the body the exact one
+            fingerprint = json.dumps(self.status_json(self.status_rssi), sort_keys=True)
+            if fingerprint != self.status_fingerprint:
+                self.status_fingerprint = fingerprint
+                self.status_body = json.dumps(self.status_json(rssi),
+                                              separators=(',', ':')).encode('utf-8')
+                self.status_generation += 1
+                self.status_etag = f'"{self.boot_id:08x}-{self.status_generation}"'
+            return self.status_etag, self.status_body
+
+    def status_json(self, rssi):
+        return {
+            'version': self.version,
+            'wifi': {
+                'connected': True,
+                'ssid': self.wifi.get('ssid', ''),
+                'ip': self.host,
+                'rssi': rssi,
+                'hostname': self.name,
+                'state': 'connected',
+                'mode': 'sta',
+            },
+            'switcher': {'type': 'Extron SW VGA', 'currentInput': 1},
+            'tink': {'connected': True, 'powerState': 'on', 'lastCommand': 'remote prof1'},
+            'avr': {'enabled': False},
+            'ota': {
+                'encodings': self.encodings,
+                'resume': True,
+                'firmwareSha256': self.firmware_sha256,
+                'filesystemSha256': self.filesystem_sha256,
+            },
+            'logs': {'levelFilter': True, 'bufferLevel': self.buffer_level},
+            'triggers': self.config.get('triggers', []),
+        }
+
+
+class DeviceServer(ThreadingHTTPServer):
+    """
+    HTTP server with the device's TCP segment size and receive window.
+
+    Without these, loopback's 64KB segments and large buffers swallow
+    whole uploads before the emulated bandwidth applies, so senders see
+    none of the backpressure a real device gives.
+    """
+
+    daemon_threads = True
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TCP_WINDOW)
+        if hasattr(socket, 'TCP_MAXSEG'):
+            try:
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG, TCP_MSS)
+            except OSError:
+                pass  # Not settable before connect on every platform
+        super().server_bind()
+
+
+class DeviceRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the EmulatedDevice bound as `device`."""
+
+    device = None
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ESPAsyncWebServer-Emulator'
+    # Write headers and body in one segment, like the device's response
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        with self.device.lock:
+            self.device.connections.add(self.connection)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            with self.device.lock:
+                self.device.connections.discard(self.connection)
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- Helpers ---------------------------------------------------------------
+
+    def send_json(self, code, obj):
+        self.send_body(code, 'application/json', json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+
+    def send_body(self, code, content_type, body, headers=None):
+        self.send_response(code)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if not self.device.keep_alive:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.device.throttle(len(body))
+        self.wfile.write(body)
+
+    def read_body(self, on_chunk=None, chunk_size=1460):
+        """Read the request body at the emulated bandwidth, calling
+        on_chunk(received, total) as data arrives. on_chunk returns False
+        to stop reading early, as if the link dropped."""
+        length = int(self.headers.get('Content-Length') or 0)
+        received = bytearray()
+        while len(received) < length:
+            chunk = self.rfile.read(min(chunk_size, length - len(received)))
+            if not chunk:
+                break
+            self.device.throttle(len(chunk))
+            received += chunk
+            if on_chunk and on_chunk(received, length) is False:
+                break
+        return bytes(received)
+
+    def drop_connection(self):
+        """Cut the connection without a response."""
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # -- Routing -----------------------------------------------------------------
+
+    def do_GET(self):
+        self.device.delay()
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+        routes = {
+            '/api/status': self.api_status,
+            '/api/logs': self.api_logs,
+            '/api/logs/events': self.api_log_events,
+            '/api/ota/status': self.api_ota_status,
+            '/api/config/backup': self.api_config_backup,
+            '/api/switcher/receive': self.api_switcher_receive,
+        }
+        handler = routes.get(url.path)
+        if handler is None:
+            self.send_json(404, {'error': 'Not Found'})
+        else:
+            handler(query)
+
+    def do_POST(self):
+        self.device.delay()
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+        routes = {
+            '/api/ota/upload': self.api_ota_upload,
+            '/api/config/restore': self.api_config_restore,
+            '/api/system/reboot': self.api_system_reboot,
+        }
+        handler = routes.get(url.path)
+        if handler is None:
+            self.read_body()
+            self.send_json(404, {'error': 'Not Found'})
+        else:
+            handler(query)
+
+    # -- Endpoints -----------------------------------------------------------------
+
+    def api_status(self, query):
+        etag, body = self.device.status_snapshot()
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        match = self.headers.get('If-None-Match', '')
+        if match == '*' or (match and etag in match):
+            self.send_body(304, None, b'', headers)
+        else:
+            self.send_body(200, 'application/json', body, headers)
+
+    def api_logs(self, query):
+        device = self.device
+        since = int(query.get('since', ['0'])[0] or 0)
+        count = max(1, min(MAX_LOG_ENTRIES, int(query.get('count', ['50'])[0] or 50)))
+        min_level = max(LEVEL_DEBUG, min(LEVEL_ERROR, int(query.get('level', ['0'])[0] or 0)))
+        with device.lock:
+            if 'bufferLevel' in query:
+                level = max(LEVEL_DEBUG, min(LEVEL_ERROR, int(query['bufferLevel'][0] or 0)))
+                device.log(LEVEL_INFO, f"WebServer: Log buffer level set to {level}")
+                device.buffer_level = level
+            if 'clear' in query:
+                device.logs.clear()  # total is preserved, as on the device
+            if 'cursor' in query:
+                logs, page = device.logs_from(query['cursor'][0], count, min_level)
+            else:
+                logs, filtered = device.select_logs(since, count, min_level)
+                oldest = device.total - len(device.logs)
+                page = {'filtered': filtered, 'lost': max(0, oldest - since) if since > 0 else 0}
+            if LOGS_BINARY_TYPE in self.headers.get('Accept', ''):
+                content_type, body = LOGS_BINARY_TYPE, device.logs_binary(logs, page)
+            else:
+                content_type = 'application/json'
+                body = json.dumps(device.logs_json(logs, page), separators=(',', ':')).encode('utf-8')
+        self.send_body(200, content_type, body)
+
+    def api_log_events(self, query):
+        device = self.device
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            last_id = int(self.headers.get('Last-Event-ID') or 0)
+        except ValueError:
+            last_id = 0
+        boots = device.boots
+        with device.lock:
+            if 0 < last_id <= device.total:
+                logs = device.logs_since(last_id, MAX_LOG_ENTRIES)
+            else:
+                logs = device.recent_logs(MAX_LOG_ENTRIES)
+            backlog = json.dumps(device.logs_json(list(logs)), separators=(',', ':'))
+            sent = device.total
+        try:
+            self.wfile.write(f"id: {sent}\nevent: backlog\ndata: {backlog}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            while True:
+                with device.lock:
+                    while device.up and device.boots == boots and device.total == sent:
+                        device.lock.wait()
+                    if not device.up or device.boots != boots:
+                        return
+                    # Entries not yet sent that are still in the buffer
+                    fresh = device.total - sent
+                    events = []
+                    for entry in device.logs[len(device.logs) - min(fresh, len(device.logs)):]:
+                        sent += 1
+                        event = dict(entry, seq=sent, now=device.millis())
+                        events.append(f"id: {sent}\nevent: log\n"
+                                      f"data: {json.dumps(event, separators=(',', ':'))}\n\n")
+                    sent = device.total
+                payload = ''.join(events).encode('utf-8')
+                device.throttle(len(payload))
+                self.wfile.write(payload)
+                self.wfile.flush()
+        except OSError:
+            return
+
+    def api_ota_status(self, query):
+        ota = dict(self.device.ota)
+        ota['percent'] = int(ota['progress'] * 100 / ota['total']) if ota['total'] else 0
+        self.send_json(200, ota)
+
+    def api_ota_upload(self, query):
+        device = self.device
+        ota = device.ota
+        content_type = self.headers.get('Content-Type', '')
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            self.send_json(411, {'error': 'Length Required'})
+            return
+
+        # Per request, like handleOtaUpload()'s index == 0 branch: owns is
+        # False for a rejected resume, whose data must not reach the update
+        state = {'begun': False, 'owns': False, 'data_start': 0, 'size': 0, 'offset': 0,
+                 'consumed': 0, 'rejected': ''}
+
+        def begin(fields, filename, total):
+            offset = int(fields.get('offset') or 0)
+            upload = fields.get('upload', '')
+            if offset > 0:
+                if not (ota['inProgress'] and device.upload and upload
+                        and upload == ota['upload'] and offset == ota['progress']):
+                    # Rejected on its own: another upload may still be streaming
+                    state['rejected'] = (f"Cannot resume at {offset}: device has "
+                                         f"{ota['progress']} bytes of upload '{ota['upload']}'")
+                    device.log(LEVEL_ERROR, f"OTA: {state['rejected']}")
+                    return
+                ota['error'] = ''
+                device.log(LEVEL_INFO, f"OTA: Resuming upload at {offset} of {ota['total']} bytes")
+            else:
+                size = int(fields.get('size') or total)
+                mode = upload_mode(fields, filename)
+                encoding = fields.get('encoding') or 'raw'
+                ota.update(inProgress=True, progress=0, total=size, error='', upload=upload,
+                           written=0, writeMs=0)
+                device.upload = {'mode': mode, 'data': bytearray(), 'last_percent': 0,
+                                 'encoding': encoding, 'name': filename, 'write_time': 0.0,
+                                 'inflater': zlib.decompressobj() if encoding.endswith('deflate')
+                                 else None}
+                if mode == 'fs':
+                    device.filesystem_sha256 = ''
+                device.log(LEVEL_INFO, f"OTA: Starting "
+                                       f"{'filesystem' if mode == 'fs' else 'firmware'} "
+                                       f"update, size: {size} bytes")
+            state.update(owns=True, size=ota['total'], offset=offset)
+
+        def on_chunk(received, total):
+            if not state['begun']:
+                # Update.begin() runs once the file part's headers are in,
+                # after any preceding form fields such as mode
+                header = re.search(rb'filename="([^"]*)"[^\r]*\r\n(?:[^\r]+\r\n)*\r\n', received)
+                if not header:
+                    return True
+                fields, _ = parse_multipart(bytes(received[:header.start()]), content_type)
+                state.update(begun=True, data_start=header.end())
+                begin(fields, header.group(1).decode('utf-8', 'replace'), total)
+            if not state['owns']:
+                return True
+
+            # File bytes in so far, short of the multipart trailer once the
+            # payload size is known
+            available = min(len(received) - state['data_start'], state['size'] - state['offset'])
+            upload = device.upload
+            data = received[state['data_start'] + state['consumed']:state['data_start'] + available]
+            upload['data'] += data
+            state['consumed'] = available
+            try:
+                device.write_flash(bytes(data))
+            except zlib.error:
+                pass  # Reported when the whole payload is decoded
+            ota['progress'] = len(upload['data'])
+            percent = ota['progress'] * 100 // ota['total'] if ota['total'] else 0
+            if percent // 10 > upload['last_percent'] // 10:
+                device.log(LEVEL_INFO, f"OTA: Progress {percent}%")
+                upload['last_percent'] = percent
+            return not (device.drop_every and state['consumed'] >= device.drop_every
+                        and ota['progress'] < ota['total'])
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.read_body(on_chunk)
+        if len(body) < length:
+            # Dropped mid-upload: the update stays open at its progress
+            self.drop_connection()
+            return
+        if state['rejected']:
+            self.send_json(409, {'error': state['rejected']})
+            return
+        if not state['owns']:
+            error = ota['error'] or 'No file uploaded'
+            device.log(LEVEL_ERROR, f"OTA: Update.end() failed: {error}")
+            self.send_json(400, {'error': error})
+            return
+
+        upload = device.upload
+        fields, files = parse_multipart(body, content_type)
+        if not fields.get('size'):
+            # Without a size the payload ends where the multipart body says
+            upload['data'] = bytearray(files['file'][1]) if 'file' in files else bytearray()
+            ota['progress'] = len(upload['data'])  # The device counts file bytes only
+        payload, mode, encoding = bytes(upload['data']), upload['mode'], upload['encoding']
+        device.upload = None
+
+        error, image = '', b''
+        if encoding not in device.encodings:
+            error = f"Unknown encoding: {encoding}"
+        elif not payload:
+            error = 'No file uploaded'
+        elif encoding.startswith('delta') and mode != 'firmware':
+            error = 'Delta updates are firmware-only'
+        else:
+            try:
+                image = ota_delta.decode(payload, encoding, device.firmware)
+            except ValueError as e:
+                error = str(e)
+                if 'base mismatch' in error:
+                    error = 'Delta base mismatch: device is not running the base image'
+            if not error and mode == 'firmware' and image[:1] != bytes([ESP_IMAGE_MAGIC]):
+                error = 'Wrong Magic Byte'
+        ota.update(inProgress=False, error=error)
+
+        if error:
+            device.log(LEVEL_ERROR, f"OTA: Update.end() failed: {error}")
+            self.send_json(400, {'error': error})
+            return
+
+        ota['progress'] = len(payload)
+        device.log(LEVEL_INFO, f"OTA: Update successful! Total: {len(payload)} bytes "
+                               f"({len(image)} bytes written)")
+        device.last_image = {'mode': mode, 'name': upload['name'], 'size': len(image)}
+        if mode == 'firmware':
+            device.firmware = image
+        else:
+            # The new LittleFS image carries the repo's default config only
+            device.config = {'hostname': 'tinklink', 'triggers': []}
+            device.wifi = {}
+            device.filesystem_sha256 = ota_delta.image_sha256(image, 'fs')
+        self.send_json(200, {'status': 'ok', 'message': 'Update successful. Rebooting...'})
+        device.reboot()
+
+    def api_switcher_receive(self, query):
+        device = self.device
+        count = max(1, min(MAX_RECENT_MESSAGES, int(query.get('count', ['10'])[0] or 10)))
+        with device.lock:
+            if 'clear' in query:
+                device.switcher_messages.clear()  # Before reading, as on the device
+            messages = device.switcher_messages[-count:]
+        self.send_json(200, {'count': len(messages), 'messages': messages})
+
+    def api_config_backup(self, query):
+        backup = {'version': '1.0'}
+        if self.device.config:
+            backup['config'] = self.device.config
+        if self.device.wifi:
+            backup['wifi'] = self.device.wifi
+        self.send_json(200, backup)
+
+    def api_config_restore(self, query):
+        try:
+            doc = json.loads(self.read_body().decode('utf-8'))
+        except ValueError as e:
+            self.send_json(400, {'error': f'Invalid JSON: {e}'})
+            return
+
+        version = doc.get('version')
+        major = re.match(r'\d*', version).group() if isinstance(version, str) else ''
+        if major and int(major) > 1:
+            self.send_json(400, {'error': f'Incompatible backup version {version} (expected 1.x)'})
+            return
+        if isinstance(doc.get('config'), dict):
+            self.device.config = doc['config']
+        if isinstance(doc.get('wifi'), dict):
+            self.device.wifi = doc['wifi']
+        self.device.log(LEVEL_INFO, "WebServer: Config restore complete")
+        self.send_json(200, {'status': 'ok', 'message': 'Config restored. Reboot to apply.'})
+
+    def api_system_reboot(self, query):
+        self.read_body()
+        self.device.log(LEVEL_INFO, "WebServer: Reboot requested via API")
+        self.send_json(200, {'status': 'ok', 'message': 'Rebooting...'})
+        self.device.reboot()
+
+
+def upload_mode(fields, filename):
+    """OTA mode the firmware picks from the mode field or the filename."""
+    if 'mode' in fields:
+        return 'fs' if fields['mode'] in ('fs', 'filesystem') else 'firmware'
+    return 'fs' if filename.endswith('.bin') and 'littlefs' in filename else 'firmware'
+
+
+def parse_multipart(body, content_type):
+    """
+    Split a multipart/form-data body.
+
+    Returns (fields, files): fields maps name -> str, files maps
+    name -> (filename, bytes).
+    """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    fields, files = {}, {}
+    if not match:
+        return fields, files
+
+    delimiter = b'--' + match.group(1).encode('latin-1')
+    for part in body.split(delimiter)[1:]:
+        if part.startswith(b'--'):
+            break
+        head, _, data = part.partition(b'\r\n\r\n')
+        data = data[:-2] if data.endswith(b'\r\n') else data
+        disposition = head.decode('latin-1')
+        name = re.search(r'name="([^"]*)"', disposition)
+        filename = re.search(r'filename="([^"]*)"', disposition)
+        if not name:
+            continue
+        if filename:
+            files[name.group(1)] = (filename.group(1), data)
+        else:
+            fields[name.group(1)] = data.decode('utf-8', 'replace')
+    return fields, files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Emulate the TinkLink-USB REST API for offline testing',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                  # One device on 127.0.0.1:8080
+  %(prog)s --count 20 --port 9000           # A 20-unit fleet on ports 9000-9019
+  %(prog)s --latency 0.03 --jitter 0.01     # Typical 2.4GHz WiFi round trip
+  %(prog)s --bandwidth 50000                # ~50 KB/s link for OTA tests
+  %(prog)s --log-rate 20                    # Busy unit, 20 log entries/s
+  %(prog)s --switch-rate 0.5 --log-rate 0   # An input switch every ~2s (switch_latency.py)
+  %(prog)s --drop-every 100000              # Uploads drop every 100 KB (resume tests)
+  %(prog)s --flash-rate 80000               # Flash-bound OTA: 80 KB/s of image writes
+
+Point tools at the emulator with --host 127.0.0.1:8080.
+        """
+    )
+    parser.add_argument('--bind', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='First port (default: 8080)')
+    parser.add_argument('--count', type=int, default=1, help='Number of devices on consecutive ports')
+    parser.add_argument('--latency', type=float, default=0.0, help='Added delay per request in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- variation of --latency in seconds')
+    parser.add_argument('--bandwidth', type=int, default=0,
+                        help='Link throughput in bytes/s for bodies (default: unlimited)')
+    parser.add_argument('--reboot-time', type=float, default=3.0,
+                        help='Seconds the device stays offline when rebooting (default: 3)')
+    parser.add_argument('--log-rate', type=float, default=1.0,
+                        help='Average background log entries per second (default: 1, 0 disables)')
+    parser.add_argument('--switch-rate', type=float, default=0.0,
+                        help='Average input switches per second, logged end to end (default: 0)')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='Close the connection after every response')
+    parser.add_argument('--firmware', help='Image the devices start out running (base for delta uploads)')
+    parser.add_argument('--encodings', default=','.join(ota_delta.ENCODINGS),
+                        help='OTA encodings to accept, comma-separated (raw = pre-encoding firmware)')
+    parser.add_argument('--drop-every', type=int, default=0,
+                        help='Drop each OTA upload connection after this many payload bytes')
+    parser.add_argument('--flash-rate', type=int, default=0,
+                        help='Decoded OTA bytes/s written to flash (default: unlimited)')
+    parser.add_argument('--version', dest='fw_version', default=None,
+                        help='Firmware version to report (default: from src/version.h)')
+    args = parser.parse_args()
+
+    firmware = b''
+    if args.firmware:
+        with open(args.firmware, 'rb') as f:
+            firmware = f.read()
+
+    devices = []
+    for i in range(args.count):
+        device = EmulatedDevice(
+            host=args.bind, port=args.port + i, name=f"tinklink-{i + 1}",
+            latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth,
+            reboot_time=args.reboot_time, log_rate=args.log_rate,
+            keep_alive=not args.no_keep_alive, version=args.fw_version,
+            firmware=firmware, encodings=args.encodings.split(','),
+            drop_every=args.drop_every, flash_rate=args.flash_rate,
+            switch_rate=args.switch_rate)
+        try:
+            device.start()
+        except OSError as e:
+            print(f"Error: Could not listen on {args.bind}:{args.port + i}: {e}", file=sys.stderr)
+            sys.exit(1)
+        devices.append(device)
+        print(f"Device {device.name} on http://{args.bind}:{device.port}")
+
+    print("Emulating (Ctrl+C to stop)...")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n[Stopped]")
+        for device in devices:
+            device.stop()
+
+
+if __name__ == '__main__':
+    main()
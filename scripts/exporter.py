@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB Prometheus Exporter
+
+Long-running daemon that scrapes /api/status and /api/logs from every
+device in a fleet and serves the results as Prometheus metrics (text
+format 0.0.4, or OpenMetrics when the scraper asks for it):
+
+    tinklink_up                        /api/status answered on the last scrape
+    tinklink_info                      Firmware version and switcher type
+    tinklink_wifi_connected / _rssi_dbm
+    tinklink_switcher_input            Current switcher input
+    tinklink_rt4k_connected            RT4K serial link up
+    tinklink_rt4k_power_state          1 for the RT4K's current power state
+    tinklink_avr_enabled / _connected
+    tinklink_log_rate                  Entries/s logged, from the device's counter
+    tinklink_log_entries_total         Entries at or above --min-level, by level
+    tinklink_log_entries_filtered_total  Entries below --min-level
+    tinklink_log_entries_lost_total    Entries overwritten before they were read
+    tinklink_reboots_total             Reboots seen through the log cursor
+    tinklink_scrape_errors_total       Failed requests, by endpoint
+    tinklink_scrape_duration_seconds   Request latency histogram, by endpoint
+
+Every device is scraped concurrently on one asyncio event loop over the
+shared keep-alive pool from logs.py. Status requests are conditional, so
+an unchanged status costs a 304 with no body. Logs are read through
+cursor paging and only counted, so memory per device is a fixed set of
+counters however busy it is. The first scrape only places the cursor:
+entries already in the buffer when the exporter starts are not counted.
+
+Usage:
+    exporter.py --hosts bay1.local bay2.local
+    exporter.py --hosts-file fleet.txt --listen 0.0.0.0:9877 --interval 15
+    curl http://localhost:9877/metrics
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logs
+from logs import (LOG_LEVELS, drain_logs_async, fetch_status_async, parse_host, parse_level,
+                  read_hosts_file)
+
+DEFAULT_LISTEN = '0.0.0.0:9877'
+
+# Seconds between scrapes of each device, and per request
+DEFAULT_INTERVAL = 15.0
+DEFAULT_TIMEOUT = 5.0
+
+# Devices scraped at the same time; the rest wait their turn
+DEFAULT_CONCURRENCY = 32
+
+# Scrape latency histogram bucket upper bounds (seconds)
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# RetroTink::getPowerStateString() values
+RT4K_POWER_STATES = ('unknown', 'waking', 'booting', 'on', 'sleeping')
+
+ENDPOINTS = ('status', 'logs')
+
+OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative histogram over fixed buckets."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class DeviceState:
+    """
+    Metrics for one device: the last status and running counters. Holds
+    no log entries, so its size doesn't grow with the device's log rate.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.up = False
+        self.status = None          # Last /api/status document, while up
+        self.cursor = None          # Log cursor; None until the first scrape
+        self.entries = [0] * len(LOG_LEVELS)
+        self.filtered = 0
+        self.lost = 0
+        self.reboots = 0
+        self.log_rate = None
+        self.last_total = None      # (total, now) from the previous log page
+        self.errors = dict.fromkeys(ENDPOINTS, 0)
+        self.durations = {endpoint: Histogram() for endpoint in ENDPOINTS}
+
+    def update_logs(self, result):
+        """Count one drain_logs_async() result."""
+        total, now = result['total'], result['now']
+        if self.cursor is not None:
+            if result['reset']:
+                self.reboots += 1
+            self.lost += result['lost']
+            self.filtered += result['filtered']
+            for entry in result['logs']:
+                self.entries[min(entry.get('lvl', 1), len(LOG_LEVELS) - 1)] += 1
+        # The device's lifetime counter gives the rate of every level
+        if self.last_total is not None and not result['reset'] and now > self.last_total[1]:
+            self.log_rate = (total - self.last_total[0]) * 1000.0 / (now - self.last_total[1])
+        elif result['reset']:
+            self.log_rate = None
+        self.last_total = (total, now)
+        self.cursor = result['cursor']
+
+
+async def scrape(device, lock, min_level, timeout):
+    """Scrape one device's status and new log entries."""
+    start = time.monotonic()
+    status = await fetch_status_async(device.host, timeout)
+    status_time = time.monotonic() - start
+
+    result = None
+    logs_time = 0.0
+    if status is not None:
+        start = time.monotonic()
+        result = await drain_logs_async(device.host, device.cursor or '', min_level, timeout)
+        logs_time = time.monotonic() - start
+
+    with lock:
+        device.durations['status'].observe(status_time)
+        device.up = status is not None
+        device.status = status
+        if status is None:
+            device.errors['status'] += 1
+            return
+        device.durations['logs'].observe(logs_time)
+        if result is None:
+            device.errors['logs'] += 1
+        else:
+            device.update_logs(result)
+
+
+async def scrape_loop(device, lock, semaphore, interval, min_level, timeout, offset=0.0):
+    # Spread the first scrapes over the interval so devices don't fire in step
+    await asyncio.sleep(offset)
+    while True:
+        started = time.monotonic()
+        async with semaphore:
+            await scrape(device, lock, min_level, timeout)
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def run_scrapers(devices, lock, interval, min_level, timeout, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        await asyncio.gather(*(scrape_loop(device, lock, semaphore, interval, min_level, timeout,
+                                           interval * i / len(devices))
+                               for i, device in enumerate(devices)))
+    finally:
+        logs._async_pool.close()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def render_metrics(devices, openmetrics=False):
+    """Metrics text for every device, grouped by metric family."""
+    families = {}
+
+    def add(name, kind, help_text, labels, value, suffix=''):
+        family = families.setdefault(name, (kind, help_text, []))
+        family[2].append((name + suffix, labels, value))
+
+    for device in devices:
+        host = [('host', device.host)]
+        add('tinklink_up', 'gauge', 'Device answered /api/status on the last scrape',
+            host, int(device.up))
+        status = device.status
+        if status is not None:
+            wifi = status.get('wifi', {})
+            tink = status.get('tink', {})
+            avr = status.get('avr', {})
+            switcher = status.get('switcher', {})
+            add('tinklink_info', 'gauge', 'Firmware version and switcher type',
+                host + [('version', status.get('version', '')),
+                        ('switcher', switcher.get('type', ''))], 1)
+            add('tinklink_wifi_connected', 'gauge', 'WiFi station connected',
+                host, int(bool(wifi.get('connected'))))
+            if 'rssi' in wifi:
+                add('tinklink_wifi_rssi_dbm', 'gauge', 'WiFi signal strength', host, wifi['rssi'])
+            if 'currentInput' in switcher:
+                add('tinklink_switcher_input', 'gauge', 'Current switcher input',
+                    host, switcher['currentInput'])
+            add('tinklink_rt4k_connected', 'gauge', 'RT4K serial link connected',
+                host, int(bool(tink.get('connected'))))
+            power = tink.get('powerState', 'unknown')
+            for state in RT4K_POWER_STATES:
+                add('tinklink_rt4k_power_state', 'gauge', 'RT4K power state (1 for the current one)',
+                    host + [('state', state)], int(state == power))
+            add('tinklink_avr_enabled', 'gauge', 'AVR control enabled',
+                host, int(bool(avr.get('enabled'))))
+            if avr.get('enabled'):
+                add('tinklink_avr_connected', 'gauge', 'AVR connected',
+                    host, int(bool(avr.get('connected'))))
+        if device.log_rate is not None:
+            add('tinklink_log_rate', 'gauge', 'Log entries per second over the last scrape',
+                host, round(device.log_rate, 3))
+        if device.cursor is not None:
+            for level, name in enumerate(LOG_LEVELS):
+                add('tinklink_log_entries', 'counter', 'Log entries read, by level',
+                    host + [('level', name)], device.entries[level])
+            add('tinklink_log_entries_filtered', 'counter',
+                'Log entries below the exporter --min-level', host, device.filtered)
+            add('tinklink_log_entries_lost', 'counter',
+                'Log entries overwritten in the device buffer before they were read',
+                host, device.lost)
+            add('tinklink_reboots', 'counter', 'Reboots seen since the exporter started',
+                host, device.reboots)
+        for endpoint in ENDPOINTS:
+            labels = host + [('endpoint', endpoint)]
+            add('tinklink_scrape_errors', 'counter', 'Failed scrape requests',
+                labels, device.errors[endpoint])
+            histogram = device.durations[endpoint]
+            bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+            for bound, count in zip(bounds, histogram.counts + [histogram.count]):
+                add('tinklink_scrape_duration_seconds', 'histogram', 'Scrape request latency',
+                    labels + [('le', bound)], count, '_bucket')
+            add('tinklink_scrape_duration_seconds', 'histogram', None,
+                labels, round(histogram.sum, 6), '_sum')
+            add('tinklink_scrape_duration_seconds', 'histogram', None,
+                labels, histogram.count, '_count')
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        # Counter samples end in _total; OpenMetrics names the family without it
+        family = name if openmetrics or kind != 'counter' else name + '_total'
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for sample, labels, value in samples:
+            if kind == 'counter':
+                sample += '_total'
+            lines.append(f"{sample}{format_labels(labels)} {value}")
+    if openmetrics:
+        lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics from the exporter's device states."""
+
+    devices = []
+    lock = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            body = b'<a href="/metrics">TinkLink-USB metrics</a>\n'
+            self.send_response(200 if self.path == '/' else 404)
+            self.send_header('Content-Type', 'text/html')
+        else:
+            openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+            with self.lock:
+                body = render_metrics(self.devices, openmetrics).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Prometheus exporter for a fleet of TinkLink-USB devices',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --hosts bay1.local bay2.local
+  %(prog)s --hosts-file fleet.txt --interval 30 --min-level INFO
+
+Prometheus scrape config:
+  - job_name: tinklink
+    static_configs:
+      - targets: ['exporter-host:9877']
+        """
+    )
+    hosts = parser.add_mutually_exclusive_group(required=True)
+    hosts.add_argument('--hosts', nargs='+', metavar='HOST', help='Devices to scrape')
+    hosts.add_argument('--hosts-file', metavar='FILE', help='Scrape every device listed in FILE')
+    parser.add_argument('--listen', default=DEFAULT_LISTEN,
+                        help=f'Address and port to serve /metrics on (default: {DEFAULT_LISTEN})')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'Seconds between scrapes of each device (default: {DEFAULT_INTERVAL:g})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'Seconds per request (default: {DEFAULT_TIMEOUT:g})')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Devices scraped at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--min-level', type=parse_level, default=LOG_LEVELS.index('WARN'),
+                        metavar='LEVEL',
+                        help='Lowest level fetched and counted by level; the rest are only '
+                             'counted as filtered (default: WARN)')
+    args = parser.parse_args()
+
+    hosts = args.hosts
+    if args.hosts_file:
+        try:
+            hosts = read_hosts_file(args.hosts_file)
+        except OSError as e:
+            print(f"Error: Could not read hosts file: {e}", file=sys.stderr)
+            sys.exit(1)
+    # A host scraped twice would repeat its samples and fail the scrape
+    hosts = list(dict.fromkeys(hosts or []))
+    if not hosts:
+        print("Error: No hosts to scrape", file=sys.stderr)
+        sys.exit(1)
+
+    devices = [DeviceState(host) for host in hosts]
+    lock = threading.Lock()
+    MetricsHandler.devices = devices
+    MetricsHandler.lock = lock
+    address, port = parse_host(args.listen)
+    try:
+        server = ThreadingHTTPServer((address, port), MetricsHandler)
+    except OSError as e:
+        print(f"Error: Could not listen on {args.listen}: {e}", file=sys.stderr)
+        sys.exit(1)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Scraping {len(devices)} device{'s' if len(devices) != 1 else ''} every "
+          f"{args.interval:g}s; metrics on http://{args.listen}/metrics (Ctrl+C to stop)")
+
+    try:
+        asyncio.run(run_scrapers(devices, lock, args.interval, args.min_level,
+                                 args.timeout, args.concurrency))
+    except KeyboardInterrupt:
+        print("\n[Stopped]")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB Log Archive
+
+On-disk store for log entries fetched by logs.py. The device only keeps the
+last 100 entries, so `logs.py --archive DIR` appends everything it fetches
+here, and this script searches the archive afterwards.
+
+The archive is a directory of SQLite segment files plus a catalog. Each
+segment covers a bounded size/time window and is indexed by time and level;
+the catalog records every segment's time range so searches open only the
+segments that can match.
+
+Usage:
+    log_archive.py search DIR                        # Everything, oldest first
+    log_archive.py search DIR --since 2h --level WARN
+    log_archive.py search DIR --host bay3.local --grep "Extron"
+    log_archive.py search DIR --since 2026-10-01 --until 2026-10-02T12:00
+    log_archive.py stats DIR                         # Segments, hosts, boots
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+# Default rotation limits for the active segment
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_AGE = 24 * 3600
+
+CATALOG_NAME = 'catalog.db'
+
+SEGMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    t    REAL    NOT NULL,  -- Wall-clock time of the entry (epoch s): aligned
+                            -- device time, or when it was fetched
+    host TEXT    NOT NULL,
+    boot INTEGER NOT NULL,  -- Boot session number for this host
+    seq  INTEGER NOT NULL,  -- Lifetime entry index on the device (1-based)
+    ts   INTEGER NOT NULL,  -- Device timestamp (ms since boot)
+    lvl  INTEGER NOT NULL,
+    msg  TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_t ON logs (t);
+CREATE INDEX IF NOT EXISTS logs_lvl_t ON logs (lvl, t);
+"""
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    name    TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    first_t REAL,
+    last_t  REAL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    lvl_mask INTEGER NOT NULL DEFAULT 0  -- Bit N set if any entry has level N
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    host     TEXT PRIMARY KEY,
+    boot     INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    last_ts  INTEGER NOT NULL
+);
+"""
+
+
+class LogArchive:
+    """
+    Append-only, rotating log store.
+
+    Entries are tagged with the host and a per-host boot session number.
+    A new session starts when the device's lifetime counter goes backwards
+    (the same reboot check logs.py uses while tailing) or when the last
+    stored entry comes back with a different timestamp, which also catches
+    reboots that happened while we were disconnected.
+    Entries already archived for the current session are skipped, so
+    overlapping fetches after a reconnect are not stored twice.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(path, exist_ok=True)
+
+        self.catalog = sqlite3.connect(os.path.join(path, CATALOG_NAME))
+        self.catalog.executescript(CATALOG_SCHEMA)
+
+        self.segment = None
+        self.segment_name = None
+        self.segment_created = 0.0
+
+        # Resume the newest segment if it is still within limits
+        row = self.catalog.execute(
+            "SELECT name, created FROM segments ORDER BY created DESC LIMIT 1").fetchone()
+        if row and not self._expired(*row):
+            self._open_segment(*row)
+
+    def _expired(self, name, created):
+        if time.time() - created >= self.max_age:
+            return True
+        try:
+            return os.path.getsize(os.path.join(self.path, name)) >= self.max_bytes
+        except OSError:
+            return True
+
+    def _open_segment(self, name, created):
+        self.segment = sqlite3.connect(os.path.join(self.path, name))
+        self.segment.executescript(SEGMENT_SCHEMA)
+        self.segment_name = name
+        self.segment_created = created
+
+    def rotate(self):
+        """Close the active segment and start a new one."""
+        if self.segment is not None:
+            self.segment.close()
+        created = time.time()
+        name = time.strftime('logs-%Y%m%d-%H%M%S.db', time.localtime(created))
+        # Rotations within the same second get a numeric suffix
+        base, n = name[:-3], 1
+        while os.path.exists(os.path.join(self.path, name)):
+            name = f"{base}-{n}.db"
+            n += 1
+        self.catalog.execute(
+            "INSERT INTO segments (name, created) VALUES (?, ?)", (name, created))
+        self.catalog.commit()
+        self._open_segment(name, created)
+
+    def _session(self, host):
+        row = self.catalog.execute(
+            "SELECT boot, last_seq, last_ts FROM hosts WHERE host = ?", (host,)).fetchone()
+        return row if row else (0, 0, 0)
+
+    def append(self, host, logs, total):
+        """
+        Store entries from one /api/logs response.
+
+        `logs` are the entries returned and `total` the device's lifetime
+        counter from the same response. Returns the number stored.
+        """
+        if not logs:
+            return 0
+
+        boot, last_seq, last_ts = self._session(host)
+        first_seq = total - len(logs) + 1
+        # Reboot: counter went backwards, or the entry we stored last has a
+        # different timestamp now
+        if boot == 0 or total < last_seq or (
+                first_seq <= last_seq and logs[last_seq - first_seq].get('ts', 0) != last_ts):
+            boot, last_seq = boot + 1, 0
+
+        now = time.time()
+        rows = []
+        for i, entry in enumerate(logs):
+            seq = first_seq + i
+            if seq <= last_seq:
+                continue  # Already archived in this session
+            rows.append((entry.get('wall', now), host, boot, seq, entry.get('ts', 0),
+                         entry.get('lvl', 1), entry.get('msg', '')))
+        if not rows:
+            return 0
+
+        if self.segment is None or self._expired(self.segment_name, self.segment_created):
+            self.rotate()
+
+        self.segment.executemany(
+            "INSERT INTO logs (t, host, boot, seq, ts, lvl, msg) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows)
+        self.segment.commit()
+
+        mask = 0
+        for row in rows:
+            mask |= 1 << row[5]
+        # Aligned entry times can precede the fetch, so widen the range to fit
+        first_t = min(row[0] for row in rows)
+        last_t = max(row[0] for row in rows)
+        self.catalog.execute(
+            "UPDATE segments SET first_t = MIN(COALESCE(first_t, ?), ?), "
+            "last_t = MAX(COALESCE(last_t, ?), ?), "
+            "entries = entries + ?, lvl_mask = lvl_mask | ? WHERE name = ?",
+            (first_t, first_t, last_t, last_t, len(rows), mask, self.segment_name))
+        self.catalog.execute(
+            "INSERT OR REPLACE INTO hosts (host, boot, last_seq, last_ts) VALUES (?, ?, ?, ?)",
+            (host, boot, rows[-1][3], rows[-1][4]))
+        self.catalog.commit()
+        return len(rows)
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.catalog.close()
+
+
+def search(path, since=None, until=None, min_level=0, host=None, grep=None):
+    """
+    Yield archived entries as dicts, oldest first.
+
+    The catalog narrows the scan to segments overlapping the time range
+    that contain a matching level; each segment is then queried through
+    its time/level indexes.
+    """
+    catalog = sqlite3.connect(os.path.join(path, CATALOG_NAME))
+    level_bits = sum(1 << lvl for lvl in range(min_level, 8))
+    query = "SELECT name FROM segments WHERE entries > 0 AND lvl_mask & ?"
+    params = [level_bits]
+    if since is not None:
+        query += " AND last_t >= ?"
+        params.append(since)
+    if until is not None:
+        query += " AND first_t <= ?"
+        params.append(until)
+    names = [r[0] for r in catalog.execute(query + " ORDER BY first_t", params)]
+    catalog.close()
+
+    where, params = ["lvl >= ?"], [min_level]
+    if since is not None:
+        where.append("t >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("t <= ?")
+        params.append(until)
+    if host:
+        where.append("host = ?")
+        params.append(host)
+    if grep:
+        where.append("instr(msg, ?) > 0")
+        params.append(grep)
+    sql = ("SELECT t, host, boot, seq, ts, lvl, msg FROM logs WHERE "
+           + " AND ".join(where) + " ORDER BY t, host, seq")
+
+    for name in names:
+        segment = sqlite3.connect(os.path.join(path, name))
+        try:
+            for t, h, boot, seq, ts, lvl, msg in segment.execute(sql, params):
+                yield {'t': t, 'host': h, 'boot': boot, 'seq': seq,
+                       'ts': ts, 'lvl': lvl, 'msg': msg}
+        finally:
+            segment.close()
+
+
+def parse_time(value):
+    """Parse an absolute ISO time or a relative age like 30m, 2h, 7d."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    if value[-1:] in units and value[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def parse_level(value):
+    """Parse a level name or number."""
+    from logs import LOG_LEVELS
+    if value.isdigit():
+        return int(value)
+    try:
+        return LOG_LEVELS.index(value.upper())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"unknown level: {value}")
+
+
+def show_search(args):
+    from logs import format_log
+
+    count = 0
+    for entry in search(args.dir, args.since, args.until, args.level, args.host, args.grep):
+        stamp = datetime.fromtimestamp(entry['t']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{stamp} {entry['host']}#{entry['boot']} {format_log(entry)}")
+        count += 1
+    print(f"{count} entries", file=sys.stderr)
+
+
+def show_stats(args):
+    catalog = sqlite3.connect(os.path.join(args.dir, CATALOG_NAME))
+    print(f"{'Segment':32} {'Entries':>9} {'Size':>10}  First / Last")
+    print("-" * 90)
+    for name, first_t, last_t, entries in catalog.execute(
+            "SELECT name, first_t, last_t, entries FROM segments ORDER BY created"):
+        try:
+            size = os.path.getsize(os.path.join(args.dir, name))
+        except OSError:
+            size = 0
+        span = ''
+        if first_t:
+            span = (datetime.fromtimestamp(first_t).strftime('%Y-%m-%d %H:%M') + ' / ' +
+                    datetime.fromtimestamp(last_t).strftime('%Y-%m-%d %H:%M'))
+        print(f"{name:32} {entries:9,} {size / 1024:8.0f}KB  {span}")
+    print()
+    for host, boot, last_seq in catalog.execute(
+            "SELECT host, boot, last_seq FROM hosts ORDER BY host"):
+        print(f"{host}: {boot} boot sessions, last entry #{last_seq}")
+    catalog.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Search logs archived by logs.py --archive',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s search logs/ --since 2h --level WARN
+  %(prog)s search logs/ --host bay3.local --grep Extron
+  %(prog)s stats logs/
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('search', help='Print matching entries, oldest first')
+    p.add_argument('dir', help='Archive directory')
+    p.add_argument('--since', type=parse_time, help='Start time (ISO or age like 2h, 7d)')
+    p.add_argument('--until', type=parse_time, help='End time (ISO or age like 30m)')
+    p.add_argument('--level', type=parse_level, default=0,
+                   help='Minimum level: DEBUG, INFO, WARN or ERROR (default: DEBUG)')
+    p.add_argument('--host', help='Only entries from this host')
+    p.add_argument('--grep', help='Only entries whose message contains this text')
+    p.set_defaults(func=show_search)
+
+    p = sub.add_parser('stats', help='Summarize segments and boot sessions')
+    p.add_argument('dir', help='Archive directory')
+    p.set_defaults(func=show_stats)
+
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(args.dir, CATALOG_NAME)):
+        print(f"Error: No archive found in {args.dir}", file=sys.stderr)
+        sys.exit(1)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,62 +11,469 @@ Usage:
     logs.py --follow            # Tail logs continuously (default)
     logs.py --clear             # Clear log buffer on device
     logs.py --host 192.168.1.100  # Use specific IP instead of mDNS
+    logs.py --hosts bay1.local bay2.local   # Tail several devices at once
+    logs.py --hosts-file fleet.txt          # Tail every device listed in a file
+    logs.py --archive logs/                 # Also store every entry on disk
+    logs.py --min-level WARN                # Only fetch warnings and errors
+    logs.py --catch-up --cursor-file c.txt  # Everything since the last run
+    logs.py --hosts a.local b.local --merge # One time-ordered fleet timeline
 
 Environment:
     TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
 """
 
 import argparse
+import asyncio
+import collections
+import heapq
+import http.client
+import itertools
 import json
+import math
 import os
+import struct
 import sys
 import time
+import urllib.parse
 import urllib.request
 import urllib.error
 
 # Log level names
 LOG_LEVELS = ['DEBUG', 'INFO', 'WARN', 'ERROR']
 
+# Seconds between "still waiting" reminders while a device is offline
+RECONNECT_REMINDER = 10
+
+# Entries requested per poll. Matches the firmware's MAX_LOG_ENTRIES ring
+# buffer size and the /api/logs count cap.
+FETCH_COUNT = 100
+
+# Adaptive polling bounds (seconds). A response at least FULL_RATIO of
+# FETCH_COUNT means the ring buffer is close to wrapping between polls.
+MIN_POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 5.0
+FULL_RATIO = 0.8
+
+# Server-sent events feed offered by newer firmware
+LOG_EVENTS_PATH = '/api/logs/events'
+
+# Seconds without stream traffic before checking the stream is still alive
+STREAM_IDLE_TIMEOUT = 15
+
+# Delivery latency samples kept per device and transport
+LATENCY_SAMPLES = 1000
+
+# Worst-case rate difference between a device's crystal and the host clock
+# (parts per million), used to widen clock alignment bounds over time
+CLOCK_DRIFT_PPM = 100
+
+# Merged timeline: longest an entry waits for quiet or offline hosts to
+# catch up (seconds), entries buffered per host before the oldest are
+# emitted regardless, and how often held entries are rechecked
+MERGE_MAX_DELAY = 2.0
+MERGE_BUFFER = 500
+MERGE_TICK = 0.25
+
+# Wall-clock time at time.monotonic() zero. Alignment is measured on the
+# monotonic clock and converted once, so host clock steps don't skew it.
+MONOTONIC_EPOCH = time.time() - time.monotonic()
+
+# Compact /api/logs encoding, requested through the Accept header. Firmware
+# without it ignores the header and answers with JSON, so responses are
+# decoded by their Content-Type. Layout (little-endian): "TLL1", u32 total,
+# u32 now, u16 count, u16 filtered, u32 boot id, u32 next, u16 lost, u8 flags
+# (bit 0 more, bit 1 reset), then count u32 timestamps, count u8 levels and
+# count NUL-terminated messages. Grouping by column keeps decoding to a few
+# calls.
+LOGS_BINARY_TYPE = 'application/x-tinklink-logs'
+LOGS_BINARY_MAGIC = b'TLL1'
+LOGS_HEADER = struct.Struct('<4sIIHHIIHB')
+LOGS_MORE, LOGS_RESET = 0x01, 0x02
+LOGS_ACCEPT = {'Accept': f'{LOGS_BINARY_TYPE}, application/json;q=0.5'}
+
+def parse_level(value):
+    """argparse type for a log level given by name (DEBUG..ERROR) or number."""
+    name = value.upper()
+    if name in LOG_LEVELS:
+        return LOG_LEVELS.index(name)
+    if value.isdigit() and int(value) < len(LOG_LEVELS):
+        return int(value)
+    raise argparse.ArgumentTypeError(
+        f"invalid level {value!r} (choose from {', '.join(LOG_LEVELS)})")
+
 def get_host():
     """Get device hostname from environment or default."""
     return os.environ.get('TINKLINK_HOST', 'tinklink.local')
 
+def parse_host(host):
+    """Split 'host[:port]' into (hostname, port)."""
+    hostname, _, port = host.partition(':')
+    return hostname, int(port) if port else 80
+
+class HttpPool:
+    """
+    Keep-alive HTTP connections, one per host.
+
+    On the ESP32's AsyncWebServer, TCP setup costs more than the small JSON
+    payloads we poll for, so requests reuse an open socket when the device
+    keeps it alive. A socket the server has closed in the meantime is
+    reopened transparently.
+    """
+
+    def __init__(self):
+        self._conns = {}
+
+    def _connection(self, host, timeout):
+        conn = self._conns.get(host)
+        if conn is None:
+            hostname, port = parse_host(host)
+            conn = http.client.HTTPConnection(hostname, port, timeout=timeout)
+            self._conns[host] = conn
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        return conn
+
+    def get(self, host, path, timeout=5):
+        """GET a path. Returns (status, body bytes); raises on network errors."""
+        status, _, body = self.request(host, path, timeout=timeout)
+        return status, body
+
+    def request(self, host, path, headers=None, timeout=5):
+        """GET a path with extra request headers. Returns (status, headers,
+        body bytes) with lower-cased header names; raises on network errors."""
+        for attempt in range(2):
+            conn = self._connection(host, timeout)
+            reused = conn.sock is not None
+            try:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                body = response.read()
+            except (ConnectionError, http.client.HTTPException):
+                self.close(host)
+                # A stale keep-alive socket fails on first use; retry once fresh
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                self.close(host)
+                raise
+            if response.will_close:
+                self.close(host)
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, body
+
+    def close(self, host=None):
+        """Close one host's connection, or all of them."""
+        hosts = [host] if host is not None else list(self._conns)
+        for h in hosts:
+            conn = self._conns.pop(h, None)
+            if conn is not None:
+                conn.close()
+
+class AsyncHttpPool:
+    """Keep-alive connections for fleet mode, on the asyncio event loop."""
+
+    def __init__(self):
+        self._conns = {}
+
+    async def get(self, host, path):
+        """GET a path. Returns (status, body bytes); raises on network errors."""
+        status, _, body = await self.request(host, path)
+        return status, body
+
+    async def request(self, host, path, headers=None):
+        """GET a path with extra request headers. Returns (status, headers,
+        body bytes) with lower-cased header names; raises on network errors."""
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        request = (f"GET {path} HTTP/1.1\r\n"
+                   f"Host: {host}\r\n{extra}\r\n").encode('ascii')
+        for attempt in range(2):
+            # Take the connection out of the pool while it is in use
+            conn = self._conns.pop(host, None)
+            reused = conn is not None
+            if conn is None:
+                conn = await asyncio.open_connection(*parse_host(host))
+            reader, writer = conn
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, body = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # A stale keep-alive socket fails on first use; retry once fresh
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                # Includes cancellation by a timeout mid-response
+                writer.close()
+                raise
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self._conns[host] = conn
+            return status, headers, body
+
+    def close(self):
+        """Close all pooled connections."""
+        for _, writer in self._conns.values():
+            writer.close()
+        self._conns.clear()
+
+class StatusCache:
+    """
+    Last /api/status document per host, with its ETag.
+
+    Requests carry If-None-Match, so a device whose status hasn't changed
+    answers 304 with no body and the cached document is reused. ETags
+    include the device's boot id, so a reboot always fetches afresh.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def headers(self, host):
+        """Conditional request headers for host."""
+        entry = self._entries.get(host)
+        return {'If-None-Match': entry[0]} if entry else {}
+
+    def boot_id(self, host):
+        """Boot id of host's last status (the ETag's first part), or None
+        if it was served without an ETag."""
+        entry = self._entries.get(host)
+        return entry[0].removeprefix('W/').strip('"').split('-')[0] if entry else None
+
+    def update(self, host, status, headers, body):
+        """Parsed status from a response, or None if it isn't one."""
+        if status == 304 and host in self._entries:
+            return self._entries[host][1]
+        if status != 200:
+            return None
+        doc = json.loads(body.decode('utf-8'))
+        if headers.get('etag'):
+            self._entries[host] = (headers['etag'], doc)
+        else:
+            self._entries.pop(host, None)
+        return doc
+
+# Shared connection pools and status cache for all device requests
+_pool = HttpPool()
+_async_pool = AsyncHttpPool()
+_status_cache = StatusCache()
+
+def fetch_status(host, timeout=5):
+    """GET /api/status through the cache. Returns the status dict, or
+    None on failure."""
+    try:
+        status, headers, body = _pool.request(
+            host, "/api/status", _status_cache.headers(host), timeout=timeout)
+        return _status_cache.update(host, status, headers, body)
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+
+async def fetch_status_async(host, timeout=5):
+    """fetch_status() without blocking the event loop."""
+    try:
+        status, headers, body = await asyncio.wait_for(
+            _async_pool.request(host, "/api/status", _status_cache.headers(host)), timeout)
+        return _status_cache.update(host, status, headers, body)
+    except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError):
+        return None
+
 def check_connectivity(host, timeout=3):
     """Check if device is reachable."""
-    url = f"http://{host}/api/status"
+    return fetch_status(host, timeout) is not None
+
+def decode_logs_binary(body):
+    """
+    Decode a binary /api/logs body into the same dict as the JSON response.
+    Raises ValueError if the body is malformed.
+    """
     try:
-        req = urllib.request.Request(url, method='GET')
-        with urllib.request.urlopen(req, timeout=timeout) as response:
-            return response.status == 200
-    except Exception:
-        return False
+        (magic, total, now, count, filtered,
+         boot, next_index, lost, flags) = LOGS_HEADER.unpack_from(body)
+    except struct.error:
+        raise ValueError("binary logs response is truncated")
+    if magic != LOGS_BINARY_MAGIC:
+        raise ValueError("not a binary logs response")
+
+    levels = LOGS_HEADER.size + 4 * count
+    messages = levels + count
+    if len(body) < messages:
+        raise ValueError("binary logs response is truncated")
+    timestamps = struct.unpack_from(f'<{count}I', body, LOGS_HEADER.size)
+    # Every message ends in a NUL, so a complete body splits into count
+    # messages and an empty tail
+    texts = body[messages:].decode('utf-8', 'replace').split('\0')
+    if len(texts) != count + 1 or texts[-1]:
+        raise ValueError("binary logs response is truncated")
 
-def fetch_logs(host, since=0, count=50, timeout=5):
+    logs = [{'ts': ts, 'lvl': lvl, 'msg': msg}
+            for ts, lvl, msg in zip(timestamps, body[levels:messages], texts)]
+    return {'total': total, 'now': now, 'count': count, 'filtered': filtered,
+            'cursor': f"{boot:08x}-{next_index}", 'more': bool(flags & LOGS_MORE),
+            'lost': lost, 'reset': bool(flags & LOGS_RESET), 'logs': logs}
+
+def decode_logs(headers, body):
+    """Decode an /api/logs body in whichever encoding the device sent."""
+    content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type == LOGS_BINARY_TYPE:
+        return decode_logs_binary(body)
+    return json.loads(body.decode('utf-8'))
+
+def logs_path(since, count, min_level=0, cursor=None):
+    """/api/logs query. Entries below min_level are filtered on the device
+    (firmware without the filter ignores the parameter). A cursor pages
+    forward from an earlier response instead of `since`."""
+    if cursor is not None:
+        path = f"/api/logs?cursor={urllib.parse.quote(cursor)}&count={count}"
+    else:
+        path = f"/api/logs?since={since}&count={count}"
+    return path + f"&level={min_level}" if min_level else path
+
+def fetch_logs(host, since=0, count=50, timeout=5, min_level=0, cursor=None):
     """Fetch logs from device API."""
-    url = f"http://{host}/api/logs?since={since}&count={count}"
     try:
-        req = urllib.request.Request(url, method='GET')
-        with urllib.request.urlopen(req, timeout=timeout) as response:
-            return json.loads(response.read().decode('utf-8'))
-    except urllib.error.URLError as e:
-        return None
-    except json.JSONDecodeError:
-        return None
-    except Exception:
+        status, headers, body = _pool.request(
+            host, logs_path(since, count, min_level, cursor), LOGS_ACCEPT, timeout=timeout)
+        if status != 200:
+            return None
+        return decode_logs(headers, body)
+    except (OSError, http.client.HTTPException, ValueError):
         return None
 
+def drain_logs(host, cursor='', min_level=0, timeout=5, clock=None):
+    """
+    Page through every entry the device still holds after `cursor` (''
+    for the whole buffer), in as few requests as the device allows.
+
+    Returns a dict with the entries, the cursor to resume from next time,
+    and how far behind `cursor` was: entries filtered by level, entries
+    already overwritten (lost), and whether the cursor predates a reboot.
+    Returns None if a request fails or the firmware has no cursor paging.
+    Each page also aligns `clock` (a DeviceClock), if given.
+    """
+    result = {'logs': [], 'requests': 0, 'filtered': 0, 'lost': 0, 'reset': False}
+    while True:
+        sent = time.monotonic()
+        data = fetch_logs(host, count=FETCH_COUNT, timeout=timeout,
+                          min_level=min_level, cursor=cursor)
+        if data is None or 'cursor' not in data:
+            return None
+        if clock is not None and data.get('now') is not None:
+            clock.sample(data['now'], time.monotonic(), sent)
+        result['requests'] += 1
+        result['logs'] += data.get('logs', [])
+        result['filtered'] += data.get('filtered', 0)
+        # Later pages only report entries overwritten while draining
+        result['lost'] += data.get('lost', 0)
+        result['reset'] = result['reset'] or data.get('reset', False)
+        result['total'] = data.get('total', 0)
+        result['now'] = data.get('now', 0)
+        cursor = data['cursor']
+        if not data.get('more'):
+            break
+    result['cursor'] = cursor
+    result['behind'] = len(result['logs']) + result['filtered'] + result['lost']
+    return result
+
+def set_buffer_level(host, level):
+    """Set which levels the device stores, until it reboots. Returns True
+    if the firmware supports it."""
+    info = fetch_status(host)
+    if info is None or 'levelFilter' not in info.get('logs', {}):
+        return False
+    try:
+        status, _ = _pool.get(host, f"/api/logs?bufferLevel={level}&count=1", timeout=5)
+        return status == 200
+    except (OSError, http.client.HTTPException, ValueError):
+        return False
+
 def clear_logs(host):
     """Clear log buffer on device."""
-    url = f"http://{host}/api/logs?clear=1"
     try:
-        req = urllib.request.Request(url, method='GET')
-        with urllib.request.urlopen(req, timeout=10) as response:
-            return response.status == 200
+        status, _ = _pool.get(host, "/api/logs?clear=1", timeout=10)
+        return status == 200
     except Exception:
         return False
 
-def format_log(entry):
-    """Format a single log entry for display."""
+def parse_head(head):
+    """Parse a response status line and headers. Returns (status, headers)
+    with lower-cased header names."""
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response. Returns (status, headers, body bytes)."""
+    status, headers = parse_head(await reader.readuntil(b'\r\n\r\n'))
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = bytearray()
+        while True:
+            size_line = await reader.readuntil(b'\r\n')
+            size = int(size_line.split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                await reader.readuntil(b'\r\n')  # Trailer terminator
+                break
+            body += (await reader.readexactly(size + 2))[:-2]
+        return status, headers, bytes(body)
+    if 'content-length' in headers:
+        return status, headers, await reader.readexactly(int(headers['content-length']))
+
+    # No framing: body runs to EOF and the connection cannot be reused
+    headers['connection'] = 'close'
+    return status, headers, await reader.read()
+
+async def fetch_logs_async(host, since=0, count=50, timeout=5, min_level=0, cursor=None):
+    """Fetch logs without blocking the event loop. Returns None on failure."""
+    path = logs_path(since, count, min_level, cursor)
+    try:
+        status, headers, body = await asyncio.wait_for(
+            _async_pool.request(host, path, LOGS_ACCEPT), timeout)
+        if status != 200:
+            return None
+        return decode_logs(headers, body)
+    except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError,
+            ValueError, IndexError):
+        return None
+
+async def drain_logs_async(host, cursor='', min_level=0, timeout=5):
+    """drain_logs() without blocking the event loop, and without clock
+    alignment. Returns None if a request fails or the firmware has no
+    cursor paging."""
+    result = {'logs': [], 'requests': 0, 'filtered': 0, 'lost': 0, 'reset': False}
+    while True:
+        data = await fetch_logs_async(host, count=FETCH_COUNT, timeout=timeout,
+                                      min_level=min_level, cursor=cursor)
+        if data is None or 'cursor' not in data:
+            return None
+        result['requests'] += 1
+        result['logs'] += data.get('logs', [])
+        result['filtered'] += data.get('filtered', 0)
+        result['lost'] += data.get('lost', 0)
+        result['reset'] = result['reset'] or data.get('reset', False)
+        result['total'] = data.get('total', 0)
+        result['now'] = data.get('now', 0)
+        cursor = data['cursor']
+        if not data.get('more'):
+            break
+    result['cursor'] = cursor
+    return result
+
+def format_time(t):
+    """Local wall-clock time of day with milliseconds."""
+    return time.strftime('%H:%M:%S', time.localtime(t)) + f".{int(t % 1 * 1000):03d}"
+
+def format_log(entry, wall=False):
+    """Format a single log entry for display. With `wall`, entries aligned
+    by DeviceClock show wall-clock time and its error bound."""
     ts = entry.get('ts', 0) / 1000.0  # Convert ms to seconds
     lvl_idx = entry.get('lvl', 1)
     lvl = LOG_LEVELS[lvl_idx] if lvl_idx < len(LOG_LEVELS) else '?'
@@ -82,82 +489,798 @@ def format_log(entry):
     reset = '\033[0m'
 
     color = colors.get(lvl, '')
+    if wall and 'wall' in entry:
+        stamp = f"{format_time(entry['wall'])} +/-{entry['err'] * 1000:3.0f}ms"
+        return f"{color}[{stamp}] [{lvl:5}] {msg}{reset}"
     return f"{color}[{ts:8.2f}s] [{lvl:5}] {msg}{reset}"
 
-def print_logs(logs):
+def print_logs(logs, prefix='', wall=False):
     """Print formatted log entries."""
     for entry in logs:
-        print(format_log(entry))
+        print(prefix + format_log(entry, wall))
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list, p in 0..1."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+class LossStats:
+    """
+    Running loss accounting for one device.
+
+    Counts entries received against entries the ring buffer overwrote
+    before a poll reached them, and tracks the peak log rate seen between
+    polls. At that rate the FETCH_COUNT-entry buffer wraps after
+    FETCH_COUNT / peak_rate seconds, which is the longest poll interval
+    that deployment can afford without losing entries.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.lost = 0
+        self.polls = 0
+        self.lossy_polls = 0
+        self.peak_rate = 0.0
+        self.last_poll = None
+
+    def record(self, returned, dropped, new_entries, measure_rate=True):
+        """Account for one poll that produced new_entries on the device.
+        Streamed entries arrive one at a time, so they skip the rate."""
+        now = time.monotonic()
+        if measure_rate:
+            if self.last_poll is not None and now > self.last_poll:
+                self.peak_rate = max(self.peak_rate, new_entries / (now - self.last_poll))
+            self.last_poll = now
+
+        self.polls += 1
+        self.received += returned
+        self.lost += dropped
+        if dropped:
+            self.lossy_polls += 1
+
+    def loss_rate(self):
+        """Fraction of entries produced by the device that were lost."""
+        produced = self.received + self.lost
+        return self.lost / produced if produced else 0.0
+
+    def summary(self):
+        """One-line report for the end of a session."""
+        line = (f"{self.received} received, {self.lost} lost "
+                f"({self.loss_rate():.1%}) in {self.polls} updates, "
+                f"{self.lossy_polls} with loss")
+        if self.peak_rate > 0:
+            line += (f"; peak {self.peak_rate:.1f} entries/s "
+                     f"(buffer wraps in {FETCH_COUNT / self.peak_rate:.1f}s)")
+        return line
+
+class LatencyStats:
+    """
+    End-to-end delivery latency for one device and transport.
+
+    Each sample is how long an entry waited on the device before being sent
+    (the response's `now` minus the entry's `ts`, both device millis) plus
+    half the request round trip for the network leg.
+    """
+
+    def __init__(self):
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, data, rtt):
+        now = data.get('now')
+        if now is None:
+            return  # Firmware predates the `now` field
+        for entry in data.get('logs', []):
+            self.samples.append(max(0, now - entry.get('ts', now)) / 1000.0 + rtt / 2)
+
+    def summary(self):
+        if not self.samples:
+            return "no samples"
+        def pct(p):
+            return percentile(self.samples, p) * 1000.0
+        return (f"p50 {pct(0.50):.0f} ms, p95 {pct(0.95):.0f} ms, "
+                f"max {max(self.samples) * 1000.0:.0f} ms over {len(self.samples)} entries")
+
+class DeviceClock:
+    """
+    Maps a device's millis() timestamps to wall-clock time.
+
+    A poll brackets the response's `now`: the device read its clock after
+    the request went out and before the response came back, so it booted
+    between sent - now and received - now. That is the NTP midpoint method,
+    with half the round trip as the error bound. Intersecting the brackets
+    keeps the tightest bounds seen so far. A streamed event only has an
+    arrival time, so it can only lower the upper bound. Bounds widen by
+    CLOCK_DRIFT_PPM between samples, and start over on a reboot.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget the alignment (the device rebooted)."""
+        self.low = None   # Boot time bounds, monotonic seconds
+        self.high = None
+        self.updated = 0.0  # Device seconds at the last sample
+        self.samples = 0
+
+    @property
+    def aligned(self):
+        return self.low is not None
+
+    def _slack(self, device_s):
+        return abs(device_s - self.updated) * CLOCK_DRIFT_PPM / 1e6
+
+    def sample(self, now_ms, received, sent=None):
+        """
+        Add a sample: the device reported `now_ms` in a response that was
+        received at `received` (time.monotonic()). `sent` is when the
+        request went out, or None for a pushed event.
+        """
+        device_s = now_ms / 1000.0
+        high = received - device_s
+        low = sent - device_s if sent is not None else None
+
+        if not self.aligned:
+            if low is None:
+                return  # Need a bracketed sample to start from
+            self.low, self.high = low, high
+        else:
+            slack = self._slack(device_s)
+            cur_low, cur_high = self.low - slack, self.high + slack
+            new_low = cur_low if low is None else max(cur_low, low)
+            new_high = min(cur_high, high)
+            if new_low <= new_high:
+                self.low, self.high = new_low, new_high
+            elif low is not None:
+                # Contradicts earlier samples (a missed reboot, or the host
+                # suspended): start over from this one
+                self.low, self.high = low, high
+            else:
+                # An event arrived sooner than the bounds allow; keep the
+                # width and move them down to fit it
+                self.low, self.high = high - (cur_high - cur_low), high
+        self.updated = device_s
+        self.samples += 1
+
+    def to_wall(self, ts_ms):
+        """Return (wall-clock time, error bound) in seconds for a device
+        timestamp, or None before the first bracketed sample."""
+        if not self.aligned:
+            return None
+        device_s = ts_ms / 1000.0
+        boot = (self.low + self.high) / 2
+        error = (self.high - self.low) / 2 + self._slack(device_s)
+        return MONOTONIC_EPOCH + boot + device_s, error
+
+    def annotate(self, logs):
+        """Add `wall` and `err` (seconds) to entries once aligned."""
+        if not self.aligned:
+            return
+        for entry in logs:
+            entry['wall'], entry['err'] = self.to_wall(entry.get('ts', 0))
+
+    def summary(self):
+        if not self.aligned:
+            return "not aligned"
+        boot, error = self.to_wall(self.updated * 1000.0)
+        boot -= self.updated
+        stamp = time.strftime('%Y-%m-%d ', time.localtime(boot)) + format_time(boot)
+        return f"booted {stamp} +/- {error * 1000:.1f} ms ({self.samples} samples)"
+
+class Timeline:
+    """
+    K-way merge of several devices' entries into one host-tagged stream
+    ordered by aligned wall-clock time (see DeviceClock).
+
+    Each host's entries arrive in order, so only the head of each host's
+    queue competes, through a heap. The earliest head is emitted once no
+    other host could still deliver something earlier: every other host
+    either has a later entry queued or has answered a request whose `now`
+    is past it (its watermark). A quiet or offline host holds an entry
+    back by at most MERGE_MAX_DELAY after it was queued, and each queue
+    holds at most MERGE_BUFFER entries, so memory stays constant however
+    long it runs.
+    """
+
+    def __init__(self, hosts):
+        width = max(len(h) for h in hosts)
+        self.prefixes = {h: host_prefix(h, width) for h in hosts}
+        self.queues = {h: collections.deque() for h in hosts}  # (queued at, entry)
+        self.watermarks = {h: 0.0 for h in hosts}
+        self.heap = []  # (time, order, host) for the head of each non-empty queue
+        self.order = itertools.count()
+
+    def add(self, host, logs, watermark=None):
+        """Queue a host's new entries (annotated with `wall` where aligned)
+        and note that it has delivered everything up to `watermark`."""
+        queue = self.queues[host]
+        arrived = time.time()
+        for entry in logs:
+            entry.setdefault('wall', arrived)  # Not aligned yet
+            if not queue:
+                heapq.heappush(self.heap, (entry['wall'], next(self.order), host))
+            queue.append((arrived, entry))
+        if watermark is not None:
+            self.watermarks[host] = max(self.watermarks[host], watermark)
+        while len(queue) > MERGE_BUFFER:
+            self._emit()
+        self.flush()
+
+    def _emit(self):
+        _, _, host = heapq.heappop(self.heap)
+        queue = self.queues[host]
+        _, entry = queue.popleft()
+        print(self.prefixes[host] + format_log(entry, wall=True))
+        if queue:
+            heapq.heappush(self.heap, (queue[0][1]['wall'], next(self.order), host))
+
+    def flush(self, force=False):
+        """Emit every entry that can no longer be preceded (all of them
+        with `force`)."""
+        deadline = time.time() - MERGE_MAX_DELAY
+        while self.heap:
+            t, _, host = self.heap[0]
+            if not force and self.queues[host][0][0] > deadline and any(
+                    not queue and self.watermarks[h] < t for h, queue in self.queues.items()):
+                return
+            self._emit()
+
+class LogTail:
+    """
+    Incremental tail state for a single device.
+
+    Tracks the device's lifetime `total` counter between polls and handles
+    disconnects and reboots. Shared by the single-host loop and fleet mode
+    so both report connection changes the same way.
+    """
+
+    def __init__(self, host, prefix='', archive=None, min_level=0, wall_clock=False,
+                 timeline=None):
+        self.host = host
+        self.prefix = prefix
+        self.archive = archive
+        self.min_level = min_level
+        self.wall_clock = wall_clock
+        self.timeline = timeline
+        self.clock = DeviceClock()
+        self.last_total = 0
+        self.connected = True
+        self.disconnect_time = None
+        self.from_boot = False
+        self.stats = LossStats()
+        self.latency = {}  # Transport ('poll' or 'stream') -> LatencyStats
+
+    def notice(self, message, color):
+        """Print a bracketed status line."""
+        print(f"{self.prefix}{color}[{message}]\033[0m")
 
-def tail_logs(host, interval=1.0):
+    def since(self):
+        """Index to request next. After a disconnect, fetch from the
+        beginning to catch boot logs."""
+        return 0 if not self.connected else self.last_total
+
+    def failed(self):
+        """Record a failed poll."""
+        if self.connected:
+            # Just lost connection
+            self.connected = False
+            self.disconnect_time = time.time()
+            self.notice("Connection lost - waiting for device...", '\033[31m')
+        elif time.time() - self.disconnect_time > RECONNECT_REMINDER:
+            # Periodic reminder while the device stays offline
+            self.notice("Still waiting for device...", '\033[31m')
+            self.disconnect_time = time.time()
+
+    def rebooted(self, data):
+        """Check a response for a reboot while connected (total went
+        backwards). Handles reconnection as a side effect."""
+        if not self.connected:
+            self.notice("Device reconnected", '\033[32m')
+            self.connected = True
+            self.clock.reset()  # It may have rebooted while we were away
+            return False
+        if data.get('total', 0) < self.last_total:
+            self.notice("Device rebooted - fetching boot logs", '\033[33m')
+            self.from_boot = True
+            self.clock.reset()
+            return True
+        return False
+
+    def received(self, data, since, rtt=None, path='poll', sent=None):
+        """
+        Print new entries from a response and advance the cursor.
+
+        `rtt` is the request round trip in seconds, used for latency
+        samples when the entries are new (not a backlog). With `sent`, the
+        time.monotonic() the request went out, the response also aligns
+        the device clock. Returns
+        (returned, dropped): the number of entries the response covered
+        (including any the device filtered out by level) and how many were
+        overwritten in the device's ring buffer before this poll could
+        fetch them.
+        """
+        logs = data.get('logs', [])
+        total = data.get('total', 0)
+        filtered = data.get('filtered', 0)
+        if sent is not None and rtt is not None and data.get('now') is not None:
+            self.clock.sample(data['now'], sent + rtt, sent)
+
+        # `total` counts every entry since boot, so anything between our
+        # cursor and the oldest returned entry fell out of the buffer, unless
+        # the device skipped it for the level filter. A fresh tail (since=0)
+        # has no cursor unless the device just rebooted. Entries removed by
+        # an explicit clear count as lost too.
+        dropped = 0
+        if since > 0 or self.from_boot:
+            dropped = max(0, total - since - len(logs) - filtered)
+            self.stats.record(len(logs), dropped, total - since,
+                              measure_rate=(path == 'poll'))
+            if rtt is not None and not self.from_boot:
+                self.latency.setdefault(path, LatencyStats()).record(data, rtt)
+        self.from_boot = False
+        returned = len(logs) + filtered
+
+        if dropped:
+            self.notice(f"{dropped} entries lost "
+                        f"({self.stats.loss_rate():.1%} lost so far)", '\033[33m')
+        # Older firmware and the live stream send every level
+        if self.min_level:
+            logs = [entry for entry in logs if entry.get('lvl', 1) >= self.min_level]
+        self.clock.annotate(logs)
+        if self.timeline is not None:
+            # Even an empty response shows nothing earlier is still to come
+            watermark = None
+            if data.get('now') is not None and self.clock.aligned:
+                watermark = self.clock.to_wall(data['now'])[0]
+            self.timeline.add(self.host, logs, watermark)
+        elif logs:
+            print_logs(logs, self.prefix, self.wall_clock)
+        if logs and self.archive is not None:
+            self.archive.append(self.host, logs, total)
+        self.last_total = total
+        return returned, dropped
+
+    def summary(self):
+        """Print loss and latency reports for the end of a session."""
+        print(f"{self.prefix}Loss: {self.stats.summary()}")
+        for path, latency in sorted(self.latency.items()):
+            print(f"{self.prefix}Latency ({path}): {latency.summary()}")
+        print(f"{self.prefix}Clock: {self.clock.summary()}")
+
+class PollScheduler:
+    """
+    Adaptive delay between log polls.
+
+    The device only keeps FETCH_COUNT entries, so a full (or nearly full)
+    response means entries may be overwritten before the next poll: drop
+    straight to the minimum interval. Empty responses back off exponentially
+    up to the maximum, and ordinary traffic eases back to the base interval.
+    """
+
+    def __init__(self, interval=1.0, adaptive=True,
+                 min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+        self.base = interval
+        self.adaptive = adaptive
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.interval = interval
+
+    def next_delay(self, returned, dropped):
+        """Delay before the next poll, given the last poll's result."""
+        if not self.adaptive:
+            return self.base
+
+        if dropped or returned >= FETCH_COUNT * FULL_RATIO:
+            # Burst in progress - keep up with the ring buffer
+            self.interval = self.min_interval
+        elif returned == 0:
+            # Idle - back off
+            self.interval = min(self.interval * 2, self.max_interval)
+        elif self.interval < self.base:
+            # Burst easing off - relax gradually
+            self.interval = min(self.interval * 2, self.base)
+        else:
+            self.interval = self.base
+        return self.interval
+
+    def failed(self):
+        """Delay after a failed poll. Offline devices are retried at the
+        base interval so reconnects are noticed promptly."""
+        self.interval = self.base
+        return self.base
+
+def tail_logs(host, scheduler=None, archive=None, min_level=0, wall_clock=False):
     """Continuously tail logs from device."""
-    last_total = 0
-    connected = True
-    disconnect_time = None
+    tail = LogTail(host, archive=archive, min_level=min_level, wall_clock=wall_clock)
+    scheduler = scheduler or PollScheduler()
 
     print(f"Tailing logs from {host} (Ctrl+C to stop)...")
     print("-" * 60)
 
     try:
         while True:
-            # If we were disconnected, fetch from beginning to catch boot logs
-            fetch_since = 0 if not connected else last_total
-            data = fetch_logs(host, since=fetch_since, count=100, timeout=3)
+            since = tail.since()
+            start = time.monotonic()
+            data = fetch_logs(host, since=since, count=FETCH_COUNT, timeout=3,
+                              min_level=min_level)
+            rtt = time.monotonic() - start
 
             if data is None:
-                if connected:
-                    # Just lost connection
-                    connected = False
-                    disconnect_time = time.time()
-                    print(f"\033[31m[Connection lost - waiting for device...]\033[0m")
-                elif time.time() - disconnect_time > 10:
-                    # Periodic reminder every 10 seconds
-                    print(f"\033[31m[Still waiting for device...]\033[0m")
-                    disconnect_time = time.time()
-                time.sleep(interval)
+                tail.failed()
+                time.sleep(scheduler.failed())
                 continue
 
-            total = data.get('total', 0)
-            logs = data.get('logs', [])
-
-            # Handle reconnection after disconnect
-            if not connected:
-                print(f"\033[32m[Device reconnected]\033[0m")
-                connected = True
-            # Detect device reboot while connected: total count went backwards
-            elif total < last_total:
-                print(f"\033[33m[Device rebooted - fetching boot logs]\033[0m")
+            if tail.rebooted(data):
                 # Fetch from beginning to get boot logs
-                data = fetch_logs(host, since=0, count=100, timeout=3)
-                if data:
-                    logs = data.get('logs', [])
-                    total = data.get('total', 0)
+                since = 0
+                start = None  # Timings belong to the first response
+                data = fetch_logs(host, since=0, count=FETCH_COUNT, timeout=3,
+                                  min_level=min_level) or data
+
+            returned, dropped = tail.received(data, since, rtt, sent=start)
+            time.sleep(scheduler.next_delay(returned, dropped))
+
+    except KeyboardInterrupt:
+        print("\n[Stopped]")
+        tail.summary()
+
+def host_prefix(host, width):
+    """Colored, padded host tag used to interleave fleet output."""
+    return f"\033[36m{host:<{width}}\033[0m | "
+
+async def poll_once_async(tail, scheduler):
+    """Poll one device once. Returns (delay before next poll, rebooted)."""
+    since = tail.since()
+    start = time.monotonic()
+    data = await fetch_logs_async(tail.host, since=since, count=FETCH_COUNT, timeout=3,
+                                  min_level=tail.min_level)
+    rtt = time.monotonic() - start
+
+    if data is None:
+        tail.failed()
+        return scheduler.failed(), False
+
+    rebooted = tail.rebooted(data)
+    if rebooted:
+        since = 0
+        start = None  # Timings belong to the first response
+        data = await fetch_logs_async(tail.host, since=0, count=FETCH_COUNT, timeout=3,
+                                      min_level=tail.min_level) or data
+
+    returned, dropped = tail.received(data, since, rtt, sent=start)
+    return scheduler.next_delay(returned, dropped), rebooted
+
+async def open_event_stream(host, last_id):
+    """
+    Request the device's log event stream.
+
+    Returns (reader, writer, rtt), or None if the device does not offer
+    the stream (older firmware answers 404). Raises on network errors.
+    """
+    reader, writer = await asyncio.open_connection(*parse_host(host))
+    try:
+        request = (f"GET {LOG_EVENTS_PATH} HTTP/1.1\r\n"
+                   f"Host: {host}\r\n"
+                   f"Accept: text/event-stream\r\n")
+        if last_id:
+            request += f"Last-Event-ID: {last_id}\r\n"
+        start = time.monotonic()
+        writer.write((request + "\r\n").encode('ascii'))
+        await writer.drain()
+        status, headers = parse_head(await reader.readuntil(b'\r\n\r\n'))
+        rtt = time.monotonic() - start
+    except BaseException:
+        writer.close()
+        raise
+
+    if (status != 200
+            or not headers.get('content-type', '').startswith('text/event-stream')
+            or headers.get('transfer-encoding', '').lower() == 'chunked'):
+        writer.close()
+        return None
+    return reader, writer, rtt
+
+def handle_log_event(tail, event, payload, rtt, requested=None):
+    """Feed one server-sent event into the tail. `backlog` events carry an
+    /api/logs style batch; `log` events carry a single new entry.
+    `requested` is the time.monotonic() the stream request was sent."""
+    arrived = time.monotonic()
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return
+    if event == 'log':
+        data = {'total': data.get('seq', 0), 'now': data.get('now'), 'logs': [data]}
+    elif event == 'backlog':
+        rtt = None  # Replayed entries say nothing about delivery latency
+    else:
+        return
+
+    since = tail.since()
+    if tail.rebooted(data):
+        since = 0  # A backlog after reboot already holds the boot logs
+    if data.get('now') is not None:
+        # The backlog answers the stream request, so it is bracketed like a
+        # poll; a pushed entry only has its arrival time
+        tail.clock.sample(data['now'], arrived, requested if event == 'backlog' else None)
+    tail.received(data, since, rtt, 'stream')
+
+async def stream_host_async(tail):
+    """
+    Follow the device's log event stream until it ends.
+
+    Returns False if the device has no event stream, True when the stream
+    closed or could not be opened (the caller reconnects).
+    """
+    try:
+        last_id = tail.last_total if tail.connected else 0
+        requested = time.monotonic()
+        opened = await asyncio.wait_for(open_event_stream(tail.host, last_id), 5)
+    except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError,
+            ValueError, IndexError):
+        tail.failed()
+        return True
+    if opened is None:
+        return False
+
+    reader, writer, rtt = opened
+    event, payload = 'message', []
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), STREAM_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Quiet device or dead socket (a reboot sends no FIN). A cheap
+                # poll tells them apart; reconnecting replays any gap.
+                probe = await fetch_logs_async(tail.host, since=tail.last_total, count=1, timeout=3)
+                if probe is None or probe.get('total', 0) != tail.last_total:
+                    return True
+                continue
+            if not line:
+                return True
+
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if not line:
+                # Blank line dispatches the event
+                if payload:
+                    handle_log_event(tail, event, '\n'.join(payload), rtt, requested)
+                event, payload = 'message', []
+            elif not line.startswith(':'):
+                field, _, value = line.partition(':')
+                value = value[1:] if value.startswith(' ') else value
+                if field == 'event':
+                    event = value
+                elif field == 'data':
+                    payload.append(value)
+    except (OSError, EOFError, asyncio.LimitOverrunError):
+        return True
+    finally:
+        writer.close()
+
+async def follow_host_async(tail, scheduler, stream=True):
+    """
+    Tail one device forever on the shared event loop.
+
+    Uses the push-based event stream when the device offers it and falls
+    back to `since` polling otherwise. A polling host retries the stream
+    after a reboot, since the reboot may have been a firmware update.
+    """
+    allow_stream = stream
+    while True:
+        if stream:
+            if await stream_host_async(tail):
+                # Stream dropped - reconnect after a short pause
+                await asyncio.sleep(scheduler.failed())
+                continue
+            tail.notice("Log streaming not supported - polling", '\033[33m')
+            stream = False
+
+        delay, rebooted = await poll_once_async(tail, scheduler)
+        if rebooted:
+            stream = allow_stream
+        await asyncio.sleep(delay)
 
-            if logs:
-                print_logs(logs)
+async def flush_timeline_async(timeline):
+    """Release held timeline entries as their MERGE_MAX_DELAY runs out."""
+    while True:
+        await asyncio.sleep(MERGE_TICK)
+        timeline.flush()
 
-            last_total = total
-            time.sleep(interval)
+async def tail_fleet_async(tails, new_scheduler, stream=True, timeline=None):
+    """Tail every host concurrently. Each device polls on its own schedule,
+    so a slow or offline unit only delays its own output."""
+    tasks = [follow_host_async(t, new_scheduler(), stream) for t in tails]
+    if timeline is not None:
+        tasks.append(flush_timeline_async(timeline))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        _async_pool.close()
 
+def tail_fleet(hosts, new_scheduler=PollScheduler, archive=None, stream=True, min_level=0,
+               wall_clock=False, merge=False):
+    """Continuously tail logs from one or more devices on an asyncio event
+    loop. Output is tagged by host when there is more than one, and with
+    `merge` interleaved into one timeline by aligned time.
+    new_scheduler() is called once per host."""
+    timeline = Timeline(hosts) if merge else None
+    if len(hosts) > 1:
+        width = max(len(h) for h in hosts)
+        tails = [LogTail(h, host_prefix(h, width), archive, min_level, wall_clock, timeline)
+                 for h in hosts]
+        mode = "merged timeline of" if merge else "logs from"
+        print(f"Tailing {mode} {len(hosts)} devices (Ctrl+C to stop)...")
+    else:
+        tails = [LogTail(hosts[0], archive=archive, min_level=min_level, wall_clock=wall_clock,
+                         timeline=timeline)]
+        print(f"Tailing logs from {hosts[0]} (Ctrl+C to stop)...")
+    print("-" * 60)
+
+    try:
+        asyncio.run(tail_fleet_async(tails, new_scheduler, stream, timeline))
     except KeyboardInterrupt:
+        if timeline is not None:
+            timeline.flush(force=True)
         print("\n[Stopped]")
+        for tail in tails:
+            tail.summary()
+
+def read_hosts_file(path):
+    """Read hostnames from a file, one per line. Blank lines and # comments
+    are ignored."""
+    hosts = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                hosts.append(line)
+    return hosts
+
+def bench_polls(host, count):
+    """
+    Measure per-poll latency of a fresh connection per request (urllib, the
+    previous behavior) against the keep-alive pool.
+    """
+    path = "/api/logs?since=0&count=100"
+
+    def fresh():
+        with urllib.request.urlopen(f"http://{host}{path}", timeout=5) as response:
+            response.read()
+
+    def pooled():
+        _pool.get(host, path, timeout=5)
+
+    print(f"Benchmarking {count} polls of {path} on {host}...")
+    print("-" * 60)
+    for label, poll in (('fresh', fresh), ('pooled', pooled)):
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                poll()
+            except Exception as e:
+                print(f"Error: {label} poll failed: {e}", file=sys.stderr)
+                return False
+            samples.append((time.perf_counter() - start) * 1000.0)
+        print(f"{label:7} mean {sum(samples) / len(samples):7.2f} ms   "
+              f"p50 {percentile(samples, 0.5):7.2f} ms   p95 {percentile(samples, 0.95):7.2f} ms")
+    return True
+
+def bench_formats(host, count):
+    """
+    Compare the JSON and binary /api/logs encodings: response size, fetch
+    time and client-side decode time over `count` full-buffer polls.
+    """
+    path = f"/api/logs?since=0&count={FETCH_COUNT}"
+    formats = (('json', {'Accept': 'application/json'}), ('binary', LOGS_ACCEPT))
+
+    print(f"Benchmarking {count} polls of each log encoding on {host}...")
+    print("-" * 60)
+    results = {}
+    for label, headers in formats:
+        sizes, fetches, decodes = [], [], []
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                status, response_headers, body = _pool.request(host, path, headers, timeout=5)
+            except Exception as e:
+                print(f"Error: {label} poll failed: {e}", file=sys.stderr)
+                return False
+            fetched = time.perf_counter()
+            if status != 200:
+                print(f"Error: {label} poll returned HTTP {status}", file=sys.stderr)
+                return False
+            if (label == 'binary' and response_headers.get('content-type', '')
+                    .split(';')[0].strip().lower() != LOGS_BINARY_TYPE):
+                print("Error: Device does not offer binary logs (firmware too old?)",
+                      file=sys.stderr)
+                return False
+            data = decode_logs(response_headers, body)
+            decoded = time.perf_counter()
+            sizes.append(len(body))
+            fetches.append((fetched - start) * 1000.0)
+            decodes.append((decoded - fetched) * 1e6)
+        fetches.sort()
+        decodes.sort()
+        results[label] = (sum(sizes) / len(sizes), decodes[len(decodes) // 2])
+        print(f"{label:7} {results[label][0]:8.0f} B/poll ({data.get('count', 0)} entries)   "
+              f"fetch p50 {fetches[len(fetches) // 2]:6.2f} ms   "
+              f"decode p50 {decodes[len(decodes) // 2]:7.1f} us")
+
+    json_size, json_decode = results['json']
+    bin_size, bin_decode = results['binary']
+    print("-" * 60)
+    print(f"binary is {bin_size / max(1, json_size):.0%} of the JSON size, "
+          f"decodes {json_decode / max(bin_decode, 1e-3):.1f}x faster")
+    return True
 
-def show_recent(host, count):
+def apply_buffer_level(host, level):
+    """Set the device's buffer level and report the outcome."""
+    if set_buffer_level(host, level):
+        print(f"{host}: storing {LOG_LEVELS[level]} and above until reboot")
+        return True
+    print(f"Error: {host} does not support changing the buffer level (firmware too old?)",
+          file=sys.stderr)
+    return False
+
+def catch_up(host, cursor='', min_level=0, cursor_file=None, wall_clock=False):
+    """Print everything logged since `cursor` (or the cursor saved in
+    cursor_file), report how far behind it was, and save the new cursor."""
+    if cursor_file and not cursor and os.path.exists(cursor_file):
+        with open(cursor_file) as f:
+            cursor = f.read().strip()
+
+    print(f"Catching up on {host}" + (f" from {cursor}" if cursor else "") + "...")
+    print("-" * 60)
+    clock = DeviceClock()
+    result = drain_logs(host, cursor, min_level, clock=clock)
+    if result is None:
+        print(f"Error: Could not page logs from {host} (firmware without cursor support?)",
+              file=sys.stderr)
+        return False
+
+    logs = result['logs']
+    if logs:
+        clock.annotate(logs)
+        print_logs(logs, wall=wall_clock)
+    print("-" * 60)
+    if result['reset']:
+        print("Cursor is from an earlier boot - started at the oldest buffered entry")
+    behind = f"{result['behind']} entries behind"
+    if logs:
+        behind += f", oldest {(result['now'] - logs[0]['ts']) / 1000.0:.1f}s ago"
+    print(f"{behind}: {len(logs)} shown, {result['filtered']} filtered, "
+          f"{result['lost']} lost to the ring buffer "
+          f"({result['requests']} request{'s' if result['requests'] != 1 else ''})")
+
+    if cursor_file:
+        with open(cursor_file, 'w') as f:
+            f.write(result['cursor'] + '\n')
+    else:
+        print(f"Resume with: --catch-up {result['cursor']}")
+    return True
+
+def show_recent(host, count, min_level=0, wall_clock=False):
     """Show recent logs and exit."""
     print(f"Fetching {count} recent logs from {host}...")
     print("-" * 60)
 
-    data = fetch_logs(host, since=0, count=count)
+    clock = DeviceClock()
+    sent = time.monotonic()
+    data = fetch_logs(host, since=0, count=count, min_level=min_level)
+    if data is not None and data.get('now') is not None:
+        clock.sample(data['now'], time.monotonic(), sent)
 
     if data is None:
         print(f"Error: Could not connect to {host}", file=sys.stderr)
         return False
 
-    logs = data.get('logs', [])
+    logs = [entry for entry in data.get('logs', []) if entry.get('lvl', 1) >= min_level]
     total = data.get('total', 0)
 
     if logs:
-        print_logs(logs)
+        clock.annotate(logs)
+        print_logs(logs, wall=wall_clock)
         print("-" * 60)
         print(f"Showing {len(logs)} of {total} total log entries")
     else:
@@ -176,6 +1299,17 @@ Examples:
   %(prog)s -f                   # Tail logs (same as default)
   %(prog)s --clear              # Clear device log buffer
   %(prog)s --host 192.168.1.100 # Use specific IP
+  %(prog)s --hosts a.local b.local      # Tail several devices
+  %(prog)s --hosts-file fleet.txt       # Tail devices listed in a file
+  %(prog)s --fixed-interval -i 0.5      # Poll every 0.5s regardless of load
+  %(prog)s --no-stream                  # Poll even if live streaming is available
+  %(prog)s --archive logs/              # Archive entries (search with log_archive.py)
+  %(prog)s --min-level WARN             # Only fetch warnings and errors
+  %(prog)s --buffer-level INFO          # Stop the device storing DEBUG entries
+  %(prog)s --catch-up                   # Drain the whole buffer, print a resume cursor
+  %(prog)s --catch-up --cursor-file c   # Only what is new since the last run
+  %(prog)s --hosts a.local b.local -w   # Wall-clock times, comparable across devices
+  %(prog)s --hosts a.local b.local --merge  # One stream ordered by aligned time
 
 Environment:
   TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
@@ -190,13 +1324,96 @@ Environment:
                         help='Clear log buffer on device')
     parser.add_argument('--host', type=str, default=None,
                         help='Device hostname or IP (default: tinklink.local or $TINKLINK_HOST)')
+    parser.add_argument('--hosts', nargs='+', metavar='HOST', default=[],
+                        help='Tail several devices concurrently (fleet mode)')
+    parser.add_argument('--hosts-file', type=str, metavar='FILE',
+                        help='Read fleet hostnames from FILE, one per line')
     parser.add_argument('-i', '--interval', type=float, default=1.0,
-                        help='Polling interval in seconds for tail mode (default: 1.0)')
+                        help='Base polling interval in seconds for tail mode (default: 1.0)')
+    parser.add_argument('--max-interval', type=float, default=MAX_POLL_INTERVAL,
+                        help=f'Longest idle back-off in seconds (default: {MAX_POLL_INTERVAL})')
+    parser.add_argument('--fixed-interval', action='store_true',
+                        help='Poll at exactly --interval instead of adapting to log volume')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='Always poll, even if the device offers a live log stream')
+    parser.add_argument('--min-level', type=parse_level, default=0, metavar='LEVEL',
+                        help='Only fetch entries at or above LEVEL (DEBUG, INFO, WARN, ERROR); '
+                             'filtered on the device, so tailing polls instead of streaming')
+    parser.add_argument('--buffer-level', type=parse_level, metavar='LEVEL',
+                        help='Set the lowest level the device stores (until it reboots)')
+    parser.add_argument('-w', '--wall-clock', action='store_true',
+                        help='Show wall-clock times (aligned from request timings, with '
+                             'their error bound) instead of seconds since boot')
+    parser.add_argument('--merge', action='store_true',
+                        help='Interleave fleet output into one timeline ordered by '
+                             'wall-clock time (implies --wall-clock)')
+    parser.add_argument('--catch-up', nargs='?', const='', metavar='CURSOR',
+                        help='Print every buffered entry after CURSOR (default: all), '
+                             'report how far behind it was, and exit')
+    parser.add_argument('--cursor-file', type=str, metavar='FILE',
+                        help='Read the --catch-up cursor from FILE and save the new one there')
+    parser.add_argument('--archive', type=str, metavar='DIR',
+                        help='Append every fetched entry to an on-disk archive in DIR')
+    parser.add_argument('--archive-max-mb', type=float, default=16,
+                        help='Rotate archive segments at this size (default: 16)')
+    parser.add_argument('--archive-max-hours', type=float, default=24,
+                        help='Rotate archive segments at this age (default: 24)')
+    parser.add_argument('--bench-polls', type=int, metavar='N',
+                        help='Compare N fresh-connection polls against N keep-alive polls and exit')
+    parser.add_argument('--bench-format', type=int, metavar='N',
+                        help='Compare N JSON polls against N binary polls and exit')
 
     args = parser.parse_args()
+    if args.cursor_file and args.catch_up is None:
+        args.catch_up = ''
+
+    def new_scheduler():
+        return PollScheduler(args.interval, adaptive=not args.fixed_interval,
+                             max_interval=args.max_interval)
+
+    # The archive numbers entries by their position in the device buffer,
+    # which a level-filtered response no longer tells us
+    if args.archive and args.min_level:
+        parser.error("--archive stores every level and cannot be combined with --min-level")
+
+    archive = None
+    if args.archive:
+        from log_archive import LogArchive
+        archive = LogArchive(args.archive,
+                             max_bytes=int(args.archive_max_mb * 1024 * 1024),
+                             max_age=args.archive_max_hours * 3600)
+
+    # Fleet mode: several hosts from the command line and/or a hosts file
+    hosts = list(args.hosts)
+    if args.hosts_file:
+        try:
+            hosts += read_hosts_file(args.hosts_file)
+        except OSError as e:
+            print(f"Error: Could not read hosts file: {e}", file=sys.stderr)
+            sys.exit(1)
+    if args.host:
+        hosts.insert(0, args.host)
+    hosts = list(dict.fromkeys(hosts))
+
+    # The live stream carries every level, so a level filter means polling
+    stream = not args.no_stream and not args.min_level
+
+    if len(hosts) > 1:
+        if (args.clear or args.recent or args.catch_up is not None
+                or args.bench_polls or args.bench_format):
+            parser.error("--clear, --recent, --catch-up and the benchmarks take a single --host")
+        if args.buffer_level is not None:
+            for h in hosts:
+                apply_buffer_level(h, args.buffer_level)
+        # Offline units are reported inline rather than failing up front
+        tail_fleet(hosts, new_scheduler, archive, stream, args.min_level, args.wall_clock,
+                   args.merge)
+        if archive:
+            archive.close()
+        return
 
     # Determine host
-    host = args.host or get_host()
+    host = hosts[0] if hosts else get_host()
 
     # Check connectivity
     sys.stdout.write(f"Connecting to {host}... ")
@@ -210,6 +1427,9 @@ Environment:
 
     print("OK")
 
+    if args.buffer_level is not None and not apply_buffer_level(host, args.buffer_level):
+        sys.exit(1)
+
     # Handle clear request
     if args.clear:
         if clear_logs(host):
@@ -219,14 +1439,37 @@ Environment:
             sys.exit(1)
         return
 
+    # Handle latency benchmark request
+    if args.bench_polls:
+        if not bench_polls(host, args.bench_polls):
+            sys.exit(1)
+        return
+    if args.bench_format:
+        if not bench_formats(host, args.bench_format):
+            sys.exit(1)
+        return
+
+    # Handle catch-up request
+    if args.catch_up is not None:
+        if not catch_up(host, args.catch_up, args.min_level, args.cursor_file,
+                        args.wall_clock):
+            sys.exit(1)
+        return
+
     # Handle recent logs request
     if args.recent:
-        if not show_recent(host, args.recent):
+        if not show_recent(host, args.recent, args.min_level, args.wall_clock):
             sys.exit(1)
         return
 
-    # Default: tail logs
-    tail_logs(host, interval=args.interval)
+    # Default: tail logs, streamed when the device supports it
+    if not stream and not args.merge:
+        tail_logs(host, new_scheduler(), archive, args.min_level, args.wall_clock)
+    else:
+        tail_fleet([host], new_scheduler, archive, stream, args.min_level, args.wall_clock,
+                   args.merge)
+    if archive:
+        archive.close()
 
 if __name__ == '__main__':
     main()
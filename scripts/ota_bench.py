@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB OTA Benchmark
+
+Repeated OTA uploads against a device or scripts/emulator.py, sweeping
+chunk size, transfer encoding, image size and the number of devices
+uploading at once. Prints per-configuration percentiles, and can save
+them as JSON (with every run) or CSV. --compare checks a run against an
+earlier JSON file to catch regressions between firmware versions.
+
+Every accepted upload reboots the device, and the next run waits for it
+to come back. Synthetic sizes (--sizes) are tiled or cut from the given
+image, so they keep its header and compressibility. The firmware rejects
+them at Update.end(), after every byte has been written, so they time the
+whole upload path without rebooting or replacing the firmware. They are
+firmware-only: a filesystem update has no image check, and a synthetic
+image would be flashed over LittleFS.
+
+Usage:
+    ota_bench.py firmware bin/firmware.bin --host 127.0.0.1:8080 --repeat 5
+    ota_bench.py firmware bin/firmware.bin --chunk-sizes 1024,4096,16384 --encodings raw,deflate
+    ota_bench.py firmware bin/firmware.bin --sizes 256K,1M --json bench.json --csv bench.csv
+    ota_bench.py firmware bin/firmware.bin --hosts bay1.local bay2.local --concurrency 1,2
+    ota_bench.py firmware bin/firmware.bin --compare bench-1.10.0.json
+
+Environment:
+    TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import percentile
+from ota_upload import (DEFAULT_CHUNK_SIZE, OtaStatusMonitor, describe_readiness, get_status,
+                        post_image, prepare_payload, wait_for_reboot)
+
+import requests
+
+# Percentiles reported for upload time and rate
+PERCENTILES = (0.50, 0.90, 0.99)
+
+# A p50 rate drop beyond this (percent) against --compare is a regression
+DEFAULT_THRESHOLD = 10.0
+
+# Columns of the CSV output, in order
+SUMMARY_FIELDS = [
+    'image', 'image_size', 'encoding', 'chunk_size', 'concurrency', 'runs', 'failed',
+    'payload_size', 'time_p50', 'time_p90', 'time_p99',
+    'rate_min', 'rate_mean', 'rate_max', 'rate_p50', 'rate_p90', 'rate_p99',
+    'aggregate_rate_p50', 'flash_busy_p50',
+]
+
+
+def parse_size(text):
+    """'256K', '1M' or '65536' -> bytes."""
+    text = text.strip().upper()
+    scale = {'K': 1024, 'M': 1024 * 1024}.get(text[-1:], 1)
+    return int(float(text.rstrip('KM')) * scale)
+
+
+def parse_list(text, convert=str):
+    return [convert(item) for item in text.split(',') if item.strip()]
+
+
+def make_images(filepath, sizes, workdir):
+    """
+    [(label, path, synthetic)] for the real image and one synthetic image
+    per size, tiled or cut from the real one.
+    """
+    with open(filepath, 'rb') as f:
+        image = f.read()
+    images = [(os.path.basename(filepath), filepath, False)]
+    for size in sizes:
+        if size == len(image):
+            continue
+        data = (image * (size // len(image) + 1))[:size]
+        path = os.path.join(workdir, f"synthetic-{size}.bin")
+        with open(path, 'wb') as f:
+            f.write(data)
+        images.append((f"synthetic-{size // 1024}K", path, True))
+    return images
+
+
+def upload_progress(host):
+    """Payload bytes the device took in its last upload (/api/ota/status),
+    or None if it doesn't answer."""
+    try:
+        resp = requests.get(f"http://{host}/api/ota/status", timeout=3)
+        if resp.status_code == 200:
+            return int(resp.json().get('progress', 0))
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+    return None
+
+
+def run_upload(host, filepath, mode, payload, chunk_size, timeout, synthetic, monitor):
+    """One timed upload; waits out the reboot if the device accepted it."""
+    run = {'host': host, 'status': None, 'error': '', 'time': None, 'flash_busy': None,
+           'reboot_time': None}
+    status_monitor = OtaStatusMonitor(host) if monitor else None
+    if status_monitor:
+        status_monitor.start()
+    start = time.perf_counter()
+    try:
+        resp = post_image(host, filepath, mode, timeout, chunk_size, payload=payload)
+        run['time'] = time.perf_counter() - start
+        run['status'] = resp.status_code
+        if resp.status_code != 200:
+            try:
+                run['error'] = resp.json().get('error', resp.text)
+            except ValueError:
+                run['error'] = resp.text
+    except requests.exceptions.RequestException as e:
+        run['error'] = e.__class__.__name__
+    finally:
+        if status_monitor:
+            status_monitor.stop()
+            rates = status_monitor.rates()
+            if rates and rates['busy'] is not None:
+                run['flash_busy'] = rates['busy']
+
+    # Synthetic images are meant to be rejected at Update.end(), after every
+    # byte was written; a 400 before then (Update.begin(), a delta base
+    # mismatch, a bad field) is a failed run
+    run['ok'] = run['status'] == 200 or (synthetic and run['status'] == 400
+                                         and upload_progress(host) == payload.size)
+    if synthetic and run['status'] == 400 and not run['ok']:
+        run['error'] = f"rejected before the end: {run['error']}"
+    if run['status'] == 200:
+        ready = wait_for_reboot(host)
+        run['reboot_time'] = ready.ready_after if ready.rebooted else None
+        if not ready.rebooted:
+            run['ok'] = False
+            run['error'] = describe_readiness(ready)
+    return run
+
+
+def summarize(config, runs, rounds):
+    """Percentiles for one configuration."""
+    ok = [r for r in runs if r['ok']]
+    row = dict(config, runs=len(runs), failed=len(runs) - len(ok))
+    if not ok:
+        return row
+    times = [r['time'] for r in ok]
+    rates = [config['payload_size'] / r['time'] / 1024 for r in ok]
+    for p in PERCENTILES:
+        row[f"time_p{int(p * 100)}"] = round(percentile(times, p), 3)
+        row[f"rate_p{int(p * 100)}"] = round(percentile(rates, p), 1)
+    row['rate_min'] = round(min(rates), 1)
+    row['rate_mean'] = round(sum(rates) / len(rates), 1)
+    row['rate_max'] = round(max(rates), 1)
+    if rounds:
+        row['aggregate_rate_p50'] = round(percentile(rounds, 0.5), 1)
+    busy = [r['flash_busy'] for r in ok if r['flash_busy'] is not None]
+    if busy:
+        row['flash_busy_p50'] = round(percentile(busy, 0.5), 3)
+    return row
+
+
+def config_key(row):
+    return (row['image'], row['encoding'], row['chunk_size'], row['concurrency'])
+
+
+def run_bench(hosts, filepath, mode, chunk_sizes, encodings, concurrencies, sizes,
+              repeat, timeout, base, monitor):
+    """Run every configuration; returns (runs, summary rows, device info)."""
+    devices = {}
+    for host in hosts:
+        status = get_status(host)
+        if status is None:
+            print(f"Error: {host} is not reachable")
+            return None
+        devices[host] = {'version': status.get('version', ''),
+                         'encodings': status.get('ota', {}).get('encodings', ['raw'])}
+    supported = tuple(e for e in devices[hosts[0]]['encodings']
+                      if all(e in d['encodings'] for d in devices.values()))
+
+    all_runs, summary = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, path, synthetic in make_images(filepath, sizes, workdir):
+            image_size = os.path.getsize(path)
+            for encoding in encodings:
+                try:
+                    payload = prepare_payload(path, mode, supported, encoding, base)
+                except (ValueError, OSError) as e:
+                    print(f"Skipping {label} {encoding}: {e}")
+                    continue
+                for chunk_size in chunk_sizes:
+                    for concurrency in concurrencies:
+                        if concurrency > len(hosts):
+                            print(f"Skipping concurrency {concurrency}: only {len(hosts)} host(s)")
+                            continue
+                        config = {'image': label, 'image_size': image_size,
+                                  'encoding': payload.encoding, 'chunk_size': chunk_size,
+                                  'concurrency': concurrency, 'payload_size': payload.size}
+                        print(f"{label} ({image_size / 1024:.0f} KB), {payload.encoding}, "
+                              f"chunk {chunk_size}, {concurrency} at once: ", end='', flush=True)
+                        runs, rounds = [], []
+                        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                            for n in range(repeat):
+                                batch = list(pool.map(
+                                    lambda host: run_upload(host, path, mode, payload, chunk_size,
+                                                            timeout, synthetic, monitor),
+                                    hosts[:concurrency]))
+                                wall = max((r['time'] or 0) for r in batch)
+                                if all(r['ok'] for r in batch) and wall > 0:
+                                    rounds.append(payload.size * concurrency / wall / 1024)
+                                for r in batch:
+                                    r.update(config, round=n)
+                                runs += batch
+                                print('.' if all(r['ok'] for r in batch) else 'x',
+                                      end='', flush=True)
+                        row = summarize(config, runs, rounds)
+                        print(f"  p50 {row.get('rate_p50', 0):.1f} KB/s" if 'rate_p50' in row
+                              else "  all runs failed")
+                        for r in runs:
+                            if not r['ok'] and r['error']:
+                                print(f"    {r['host']}: {r['error']}")
+                        all_runs += runs
+                        summary.append(row)
+    return all_runs, summary, devices
+
+
+def print_summary(summary):
+    print(f"\n{'Image':<18} {'Encoding':<13} {'Chunk':>6} {'Conc':>4} {'Runs':>4}  "
+          f"{'p50 s':>7} {'p90 s':>7} {'p99 s':>7}  {'p50 KB/s':>9} {'p90 KB/s':>9} "
+          f"{'p99 KB/s':>9} {'Aggr KB/s':>9}")
+    print('-' * 121)
+    for row in summary:
+        def col(name, fmt):
+            return format(row[name], fmt) if name in row else '-'
+        runs = f"{row['runs'] - row['failed']}/{row['runs']}"
+        print(f"{row['image']:<18} {row['encoding']:<13} {row['chunk_size']:>6} "
+              f"{row['concurrency']:>4} {runs:>4}  {col('time_p50', '7.2f'):>7} "
+              f"{col('time_p90', '7.2f'):>7} {col('time_p99', '7.2f'):>7}  "
+              f"{col('rate_p50', '9.1f'):>9} {col('rate_p90', '9.1f'):>9} "
+              f"{col('rate_p99', '9.1f'):>9} {col('aggregate_rate_p50', '9.1f'):>9}")
+
+
+def compare(summary, baseline_path, threshold):
+    """Print p50 rate changes against an earlier JSON run; returns the regression count."""
+    try:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: Cannot read baseline {baseline_path}: {e}")
+        return 1
+    old_rows = {config_key(row): row for row in baseline.get('summary', [])}
+    versions = sorted({d.get('version', '?') for d in baseline.get('devices', {}).values()})
+    print(f"\nCompared with {baseline_path} (firmware {', '.join(versions) or '?'}):")
+
+    regressions = matched = 0
+    for row in summary:
+        old = old_rows.get(config_key(row))
+        if not old or 'rate_p50' not in old or 'rate_p50' not in row:
+            continue
+        matched += 1
+        change = (row['rate_p50'] - old['rate_p50']) / old['rate_p50'] * 100
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"  {row['image']:<18} {row['encoding']:<13} chunk {row['chunk_size']:>6} "
+              f"x{row['concurrency']}: {old['rate_p50']:8.1f} -> {row['rate_p50']:8.1f} KB/s "
+              f"({change:+.1f}%){flag}")
+    if not matched:
+        print("  No configurations in common")
+    if regressions:
+        print(f"{regressions} configuration(s) more than {threshold:.0f}% slower")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark TinkLink-USB OTA uploads',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s firmware bin/firmware.bin --host 127.0.0.1:8080 --repeat 10
+  %(prog)s firmware bin/firmware.bin --chunk-sizes 1024,4096,16384 --encodings raw,deflate
+  %(prog)s firmware bin/firmware.bin --sizes 256K,1M,2M --json bench.json --csv bench.csv
+  %(prog)s firmware bin/firmware.bin --hosts-file fleet.txt --concurrency 1,2,4,8
+  %(prog)s firmware bin/firmware.bin --json new.json --compare bench-1.10.0.json
+
+Environment:
+  TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
+        """
+    )
+    parser.add_argument('mode', choices=['firmware', 'fs', 'filesystem'],
+                        help='Upload mode: firmware or fs/filesystem')
+    parser.add_argument('file', help='Image to upload, and the source of synthetic sizes')
+    parser.add_argument('--host', default=os.environ.get('TINKLINK_HOST', 'tinklink.local'),
+                        help='Device hostname or IP (default: tinklink.local or $TINKLINK_HOST)')
+    parser.add_argument('--hosts', nargs='+', metavar='HOST',
+                        help='Several devices, for --concurrency above 1')
+    parser.add_argument('--hosts-file', help='Read hostnames from a file, one per line')
+    parser.add_argument('--chunk-sizes', default=str(DEFAULT_CHUNK_SIZE),
+                        help=f'Comma-separated chunk sizes (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--encodings', default='raw',
+                        help='Comma-separated encodings: raw, deflate, delta, delta+deflate '
+                             '(default: raw)')
+    parser.add_argument('--concurrency', default='1',
+                        help='Comma-separated numbers of devices uploading at once (default: 1)')
+    parser.add_argument('--sizes', default='',
+                        help='Comma-separated synthetic image sizes, e.g. 256K,1M (firmware only)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Uploads per configuration (default: 5)')
+    parser.add_argument('--timeout', type=int, default=120,
+                        help='Upload timeout in seconds (default: 120)')
+    parser.add_argument('--base', help='Image the device is running, for delta encodings')
+    parser.add_argument('--monitor', action='store_true',
+                        help='Poll /api/ota/status during uploads to record flash busy time')
+    parser.add_argument('--json', metavar='FILE', help='Write runs and percentiles as JSON')
+    parser.add_argument('--csv', metavar='FILE', help='Write percentiles as CSV')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='Earlier --json output to compare p50 rates against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'p50 rate drop in percent that counts as a regression '
+                             f'(default: {DEFAULT_THRESHOLD:.0f})')
+    args = parser.parse_args()
+
+    mode = 'fs' if args.mode in ('fs', 'filesystem') else 'firmware'
+    if not os.path.exists(args.file):
+        print(f"Error: File not found: {args.file}")
+        sys.exit(1)
+
+    hosts = list(args.hosts or [])
+    if args.hosts_file:
+        from logs import read_hosts_file
+        try:
+            hosts += read_hosts_file(args.hosts_file)
+        except OSError as e:
+            print(f"Error: Cannot read hosts file: {e}")
+            sys.exit(1)
+    hosts = list(dict.fromkeys(hosts)) or [args.host]
+
+    try:
+        chunk_sizes = parse_list(args.chunk_sizes, parse_size)
+        concurrencies = parse_list(args.concurrency, int)
+        sizes = parse_list(args.sizes, parse_size)
+    except ValueError as e:
+        parser.error(str(e))
+    if sizes and mode == 'fs':
+        parser.error("--sizes is firmware-only: the device would flash a synthetic image "
+                     "over LittleFS")
+
+    if mode == 'fs':
+        print("Warning: every accepted filesystem upload replaces the device's config")
+
+    result = run_bench(hosts, args.file, mode, chunk_sizes, parse_list(args.encodings),
+                       concurrencies, sizes, args.repeat, args.timeout, args.base, args.monitor)
+    if result is None:
+        sys.exit(1)
+    runs, summary, devices = result
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'mode': mode,
+                       'file': os.path.basename(args.file), 'devices': devices,
+                       'summary': summary, 'runs': runs}, f, indent=1)
+        print(f"\nWrote {args.json}")
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(summary)
+        print(f"Wrote {args.csv}")
+
+    failed = any(row['failed'] for row in summary)
+    if args.compare and compare(summary, args.compare, args.threshold):
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
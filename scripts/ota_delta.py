@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB OTA Payload Encoding
+
+Builds and checks the compressed and delta payloads that /api/ota/upload
+accepts through its "encoding" form field (see src/OtaStream.h), and
+hashes images the way /api/status reports the installed ones:
+
+    raw            - Image as-is
+    deflate        - zlib-compressed image
+    delta          - Delta against the firmware the device is running
+    delta+deflate  - zlib-compressed delta
+
+Delta format (little-endian):
+    "TLD1", u32 base size, u8[32] SHA-256 of base, u32 target size
+    then ops:
+        0x01 COPY   u32 offset, u32 length  - bytes from the base image
+        0x02 INSERT u32 length, data        - literal bytes
+        0x00 END    u8[32] SHA-256 of target
+
+Usage:
+    ota_delta.py make old/firmware.bin firmware.bin firmware.tld
+    ota_delta.py apply old/firmware.bin firmware.tld rebuilt.bin
+    ota_delta.py hash firmware.bin
+"""
+
+import argparse
+import hashlib
+import struct
+import sys
+import zlib
+
+ENCODINGS = ('raw', 'deflate', 'delta', 'delta+deflate')
+
+DELTA_MAGIC = b'TLD1'
+OP_END, OP_COPY, OP_INSERT = 0x00, 0x01, 0x02
+
+# ESP32 app image header: magic byte, and the offset of the hash_appended
+# flag (end of esp_image_header_t); esptool then appends a SHA-256
+ESP_IMAGE_MAGIC = 0xE9
+ESP_HASH_APPENDED_OFFSET = 23
+
+# Shortest run worth a COPY op; base offsets are indexed every
+# DELTA_INDEX_STEP bytes and matches are extended both ways from there
+DELTA_MIN_MATCH = 32
+DELTA_INDEX_STEP = 16
+
+
+def _match_length(a, ai, b, bi):
+    """Length of the common run starting at a[ai] and b[bi]."""
+    limit = min(len(a) - ai, len(b) - bi)
+    length = 0
+    while length < limit:
+        n = min(256, limit - length)
+        if a[ai + length:ai + length + n] == b[bi + length:bi + length + n]:
+            length += n
+            continue
+        while a[ai + length] == b[bi + length]:
+            length += 1
+        break
+    return length
+
+
+def make_delta(base, target):
+    """Build a delta that turns `base` into `target`."""
+    index = {}
+    for offset in range(0, len(base) - DELTA_MIN_MATCH + 1, DELTA_INDEX_STEP):
+        index.setdefault(base[offset:offset + DELTA_MIN_MATCH], offset)
+
+    out = bytearray(DELTA_MAGIC)
+    out += struct.pack('<I', len(base)) + hashlib.sha256(base).digest()
+    out += struct.pack('<I', len(target))
+
+    def insert(data):
+        if data:
+            out.extend(struct.pack('<BI', OP_INSERT, len(data)))
+            out.extend(data)
+
+    literal = 0  # Start of target bytes not yet emitted
+    i = 0
+    while i + DELTA_MIN_MATCH <= len(target):
+        src = index.get(target[i:i + DELTA_MIN_MATCH])
+        if src is None:
+            i += 1
+            continue
+        # Grow the match backwards into the pending literal run
+        back = 0
+        while back < i - literal and back < src and base[src - back - 1] == target[i - back - 1]:
+            back += 1
+        start, src = i - back, src - back
+        length = _match_length(base, src, target, start)
+        insert(target[literal:start])
+        out.extend(struct.pack('<BII', OP_COPY, src, length))
+        i = literal = start + length
+    insert(target[literal:])
+
+    out.append(OP_END)
+    out.extend(hashlib.sha256(target).digest())
+    return bytes(out)
+
+
+def apply_delta(base, delta):
+    """
+    Rebuild the target image from `base` and `delta`, with the same
+    checks the firmware makes. Raises ValueError on any mismatch.
+    """
+    if len(delta) < 44 or delta[:4] != DELTA_MAGIC:
+        raise ValueError("not a delta image")
+    base_size, = struct.unpack_from('<I', delta, 4)
+    target_size, = struct.unpack_from('<I', delta, 40)
+    if base_size > len(base) or hashlib.sha256(base[:base_size]).digest() != delta[8:40]:
+        raise ValueError("delta base mismatch")
+    base = base[:base_size]
+
+    out = bytearray()
+    pos = 44
+    try:
+        while True:
+            op = delta[pos]
+            pos += 1
+            if op == OP_COPY:
+                offset, length = struct.unpack_from('<II', delta, pos)
+                pos += 8
+                if offset + length > base_size:
+                    raise ValueError("delta copy outside the base image")
+                out += base[offset:offset + length]
+            elif op == OP_INSERT:
+                length, = struct.unpack_from('<I', delta, pos)
+                pos += 4
+                if pos + length > len(delta):
+                    raise ValueError("delta is truncated")
+                out += delta[pos:pos + length]
+                pos += length
+            elif op == OP_END:
+                digest = delta[pos:pos + 32]
+                pos += 32
+                break
+            else:
+                raise ValueError(f"bad delta op {op}")
+    except (IndexError, struct.error):
+        raise ValueError("delta is truncated")
+
+    if len(digest) != 32:
+        raise ValueError("delta is truncated")
+    if pos != len(delta):
+        raise ValueError("data after end of delta")
+    if len(out) != target_size or hashlib.sha256(out).digest() != digest:
+        raise ValueError("delta result does not match target hash")
+    return bytes(out)
+
+
+def encode(image, encoding, base=None):
+    """Encode an image for upload. Delta encodings need the base image."""
+    if encoding == 'raw':
+        return image
+    if encoding == 'deflate':
+        return zlib.compress(image, 9)
+    if encoding in ('delta', 'delta+deflate'):
+        if base is None:
+            raise ValueError(f"{encoding} needs a base image")
+        delta = make_delta(base, image)
+        return zlib.compress(delta, 9) if encoding == 'delta+deflate' else delta
+    raise ValueError(f"unknown encoding: {encoding}")
+
+
+def decode(payload, encoding, base=None):
+    """Decode an uploaded payload back to the image, as the firmware does."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"unknown encoding: {encoding}")
+    if encoding in ('deflate', 'delta+deflate'):
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ValueError(f"inflate failed: {e}")
+    if encoding in ('delta', 'delta+deflate'):
+        if base is None:
+            raise ValueError("no base image to apply the delta to")
+        payload = apply_delta(base, payload)
+    return payload
+
+
+def image_sha256(image, mode='firmware'):
+    """
+    Hex SHA-256 of an image as the device reports it once installed.
+
+    For firmware that is esp_partition_get_sha256(): the digest esptool
+    appends when the header's hash_appended flag is set, which covers the
+    image without its last 32 bytes. Otherwise the whole image is hashed.
+    """
+    if (mode == 'firmware' and len(image) > ESP_HASH_APPENDED_OFFSET + 32
+            and image[0] == ESP_IMAGE_MAGIC and image[ESP_HASH_APPENDED_OFFSET] == 1):
+        return hashlib.sha256(image[:-32]).hexdigest()
+    return hashlib.sha256(image).hexdigest()
+
+
+def cmd_make(args):
+    with open(args.base, 'rb') as f:
+        base = f.read()
+    with open(args.target, 'rb') as f:
+        target = f.read()
+    encoding = 'delta+deflate' if args.deflate else 'delta'
+    payload = encode(target, encoding, base)
+    if decode(payload, encoding, base) != target:
+        print("Error: Delta does not reproduce the target image", file=sys.stderr)
+        sys.exit(1)
+    with open(args.out, 'wb') as f:
+        f.write(payload)
+    print(f"{encoding}: {len(target):,} -> {len(payload):,} bytes "
+          f"({len(payload) * 100 / max(1, len(target)):.1f}%)")
+
+
+def cmd_apply(args):
+    with open(args.base, 'rb') as f:
+        base = f.read()
+    with open(args.patch, 'rb') as f:
+        payload = f.read()
+    encoding = 'delta' if payload[:4] == DELTA_MAGIC else 'delta+deflate'
+    try:
+        image = decode(payload, encoding, base)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    with open(args.out, 'wb') as f:
+        f.write(image)
+    print(f"Wrote {len(image):,} bytes to {args.out}")
+
+
+def cmd_hash(args):
+    with open(args.image, 'rb') as f:
+        print(image_sha256(f.read(), args.mode))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build and check TinkLink-USB OTA delta payloads',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s make bin/firmware-1.10.0.bin .pio/build/esp32s3/firmware.bin update.tld
+  %(prog)s apply bin/firmware-1.10.0.bin update.tld rebuilt.bin
+  %(prog)s hash --mode fs bin/littlefs.bin
+
+ota_upload.py builds these itself with --base; this tool is for
+inspecting sizes and checking patches offline.
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('make', help='Build a delta from BASE to TARGET')
+    p.add_argument('base', help='Image the device is running')
+    p.add_argument('target', help='New image')
+    p.add_argument('out', help='Output patch file')
+    p.add_argument('--deflate', action='store_true', help='Compress the delta (delta+deflate)')
+    p.set_defaults(func=cmd_make)
+
+    p = sub.add_parser('apply', help='Rebuild TARGET from BASE and a patch')
+    p.add_argument('base', help='Base image')
+    p.add_argument('patch', help='Patch from "make"')
+    p.add_argument('out', help='Output image')
+    p.set_defaults(func=cmd_apply)
+
+    p = sub.add_parser('hash', help='Print the hash /api/status reports once IMAGE is installed')
+    p.add_argument('image', help='Firmware or filesystem image')
+    p.add_argument('--mode', choices=['firmware', 'fs'], default='firmware',
+                   help='Image type (default: firmware)')
+    p.set_defaults(func=cmd_hash)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,16 +15,288 @@ Environment variables:
 
 import sys
 import os
+import io
+import json
 import time
+import uuid
+import socket
+import hashlib
 import argparse
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection
 except ImportError:
     print("Error: 'requests' module not found.")
     print("Install it with: pip install requests")
     sys.exit(1)
 
+# Bytes read from the image per send, also used as the socket send buffer.
+# handleOtaUpload() writes whatever arrives per TCP segment (~1.4KB) to
+# flash, so this sets how much is queued ahead of the device rather than
+# the flash write size.
+DEFAULT_CHUNK_SIZE = 4096
+
+# Weight of the newest sample in the smoothed throughput
+SMOOTHING = 0.2
+
+# Minimum seconds between progress line updates
+PROGRESS_INTERVAL = 0.25
+
+
+class ThroughputMeter:
+    """
+    Upload progress with instantaneous and smoothed throughput.
+
+    Instantaneous rate is measured over each progress interval; the
+    smoothed rate is an exponential moving average of those samples and
+    drives the ETA, so one stalled or bursty interval doesn't swing it.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.sent = 0
+        self.start = time.monotonic()
+        self.sample_time = self.start
+        self.sample_sent = 0
+        self.rate = 0.0
+        self.smoothed = 0.0
+        self.peak = 0.0
+        self.tty = sys.stdout.isatty()
+        self.last_decile = 0
+        self.annotate = None  # Optional callable adding text to the progress line
+
+    def update(self, sent: int):
+        if sent == self.sent and sent >= self.total:
+            return  # Multipart trailer and end-of-body reads
+        self.sent = sent
+        now = time.monotonic()
+        elapsed = now - self.sample_time
+        if elapsed < PROGRESS_INTERVAL and sent < self.total:
+            return
+        self.rate = (sent - self.sample_sent) / elapsed if elapsed > 0 else 0.0
+        self.smoothed = self.rate if self.smoothed == 0 else (
+            SMOOTHING * self.rate + (1 - SMOOTHING) * self.smoothed)
+        self.peak = max(self.peak, self.rate)
+        self.sample_time, self.sample_sent = now, sent
+        self.show()
+
+    def rewind(self, sent: int):
+        """Continue from `sent` bytes after a resume, without a rate sample
+        spanning the outage."""
+        self.sent = self.sample_sent = sent
+        self.sample_time = time.monotonic()
+
+    def eta(self) -> float | None:
+        if self.smoothed <= 0:
+            return None
+        return (self.total - self.sent) / self.smoothed
+
+    def show(self):
+        percent = self.sent * 100 / self.total if self.total else 100.0
+        eta = self.eta()
+        line = (f"  {percent:5.1f}%  {self.sent/1024:8.1f}/{self.total/1024:.1f} KB"
+                f"  {self.rate/1024:7.1f} KB/s (avg {self.smoothed/1024:.1f} KB/s)"
+                f"  ETA {f'{eta:.0f}s' if eta is not None else '--'}")
+        if self.annotate:
+            line += self.annotate()
+        if self.tty:
+            print(f"\r{line:<78}", end="", flush=True)
+        elif int(percent // 10) > self.last_decile or self.sent >= self.total:
+            # Piped output: one line per 10% instead of a redrawn line
+            self.last_decile = int(percent // 10)
+            print(line, flush=True)
+
+    def finish(self):
+        if self.tty:
+            print()
+
+
+# How often OtaStatusMonitor polls /api/ota/status during an upload
+MONITOR_INTERVAL = 0.5
+
+# Share of the upload the device spends decoding and writing flash above
+# which flash, not the network, limits the transfer
+FLASH_BOUND_BUSY = 0.8
+
+
+class OtaStatusMonitor:
+    """
+    Polls /api/ota/status in the background during an upload.
+
+    The device reports payload bytes received (progress), decoded bytes
+    written to flash (written) and the time spent decoding and writing
+    them (writeMs). Comparing these shows whether the link or the flash
+    limits the upload: time not spent writing is time spent waiting for
+    the network. Firmware without writeMs only yields the receive rate.
+    """
+
+    def __init__(self, host: str, interval: float = MONITOR_INTERVAL):
+        self.host = host
+        self.interval = interval
+        self.samples = []  # (monotonic time, progress, written, writeMs or None)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        with requests.Session() as session:
+            while not self._stop.is_set():
+                try:
+                    status = session.get(f"http://{self.host}/api/ota/status",
+                                         timeout=max(1.0, self.interval * 2)).json()
+                except (requests.exceptions.RequestException, ValueError):
+                    status = None
+                if status and status.get('inProgress'):
+                    self.samples.append((time.monotonic(), int(status.get('progress', 0)),
+                                         int(status.get('written', 0)), status.get('writeMs')))
+                self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def rates(self, window: int = 0) -> dict | None:
+        """
+        Device-side rates over the last `window` samples (0 = all): receive
+        (payload bytes/s), write (decoded bytes/s while writing) and busy
+        (share of the time spent writing). None until two samples are in.
+        """
+        samples = self.samples[-window - 1:] if window else self.samples
+        if len(samples) < 2:
+            return None
+        (t0, p0, w0, ms0), (t1, p1, w1, ms1) = samples[0], samples[-1]
+        elapsed = t1 - t0
+        if elapsed <= 0:
+            return None
+        result = {'receive': (p1 - p0) / elapsed, 'write': None, 'busy': None}
+        if ms0 is not None and ms1 is not None:
+            busy_time = (ms1 - ms0) / 1000
+            result['busy'] = min(1.0, busy_time / elapsed)
+            if busy_time > 0:
+                result['write'] = (w1 - w0) / busy_time
+        return result
+
+    def annotate(self) -> str:
+        """Progress line suffix with the recent device-side rates."""
+        rates = self.rates(window=4)
+        if rates is None:
+            return ''
+        text = f"  | device {rates['receive']/1024:.1f} KB/s"
+        if rates['busy'] is not None:
+            text += f", flash busy {rates['busy']*100:.0f}%"
+        return text
+
+    def report(self, network_rate: float):
+        """Print network vs. flash rates and which one limited the upload."""
+        rates = self.rates()
+        if rates is None:
+            print("Device monitor: not enough /api/ota/status samples (upload too short?)")
+            return
+        print(f"Device monitor ({len(self.samples)} samples of /api/ota/status):")
+        print(f"  Network (client send):    {network_rate/1024:8.1f} KB/s")
+        print(f"  Device receive:           {rates['receive']/1024:8.1f} KB/s")
+        if rates['busy'] is None:
+            print("  Flash write rate not reported (firmware too old)")
+            return
+        if rates['write'] is not None:
+            print(f"  Flash write (while busy): {rates['write']/1024:8.1f} KB/s of image")
+        print(f"  Flash busy:               {rates['busy']*100:8.0f}% of the upload")
+        if rates['busy'] >= FLASH_BOUND_BUSY:
+            print("  Bottleneck: flash writes. The device is rarely waiting for data, so "
+                  "network tuning won't help.")
+        else:
+            print("  Bottleneck: network. The device waits for data "
+                  f"{(1 - rates['busy'])*100:.0f}% of the time; try --chunk-size, "
+                  "a compressed/delta --encoding or a better link.")
+
+
+class SendBufferAdapter(HTTPAdapter):
+    """
+    Transport adapter with a capped socket send buffer.
+
+    With the default buffer the kernel accepts hundreds of KB at once,
+    so an upload looks instant until it stalls. Capping it keeps reads
+    from the file paced by what the device has actually taken.
+    """
+
+    def __init__(self, send_buffer: int, **kwargs):
+        self.send_buffer = send_buffer
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class MultipartStream:
+    """
+    multipart/form-data body that reads the file part as it is sent.
+
+    The form fields and part headers are built up front so the exact
+    Content-Length is known; the device needs it for _otaTotal and
+    progress. requests sends any object with read() and __len__ in
+    pieces instead of buffering it, and each read() returns at most
+    chunk_size bytes.
+    """
+
+    def __init__(self, fields: dict, file_field: str, filename: str, fileobj, size: int,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, on_progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+
+        head = b''
+        for name, value in fields.items():
+            head += (f"--{self.boundary}\r\n"
+                     f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                     f"{value}\r\n").encode('utf-8')
+        head += (f"--{self.boundary}\r\n"
+                 f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode('utf-8')
+        self.head = head
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode('utf-8')
+        self.file = fileobj
+        self.filesize = size
+        self.length = len(self.head) + self.filesize + len(self.tail)
+        self.sent = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.sent < len(self.head):
+            data = self.head[self.sent:]
+        else:
+            data = self.file.read(self.chunk_size)
+            if not data and self.sent < self.length:
+                data = self.tail[self.sent - len(self.head) - self.filesize:]
+        self.sent += len(data)
+        if self.on_progress:
+            self.on_progress(self.sent)
+        return data
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 def backup_config(host: str) -> dict | None:
     """Back up device config before filesystem flash."""
@@ -40,8 +312,9 @@ def backup_config(host: str) -> dict | None:
 
 
 def restore_config(host: str, backup: dict, retries: int = 5) -> bool:
-    """Restore device config after filesystem flash."""
-    import json
+    """Restore device config after filesystem flash. Meant to be called
+    once the device answers again; retries back off from 0.25s."""
+    delay = 0.25
     for attempt in range(retries):
         try:
             resp = requests.post(
@@ -53,11 +326,385 @@ def restore_config(host: str, backup: dict, retries: int = 5) -> bool:
                 return True
         except Exception:
             pass
-        time.sleep(3)
+        if attempt < retries - 1:
+            time.sleep(delay)
+            delay *= 2
     return False
 
 
-def upload_ota(host: str, filepath: str, mode: str, timeout: int = 120) -> bool:
+# Readiness probing after a reboot. The device drops off about 500ms after
+# answering the upload (delay(500) then ESP.restart()); probes start fast
+# and back off so a slow boot costs few requests
+REBOOT_GRACE = 5.0     # Give up waiting for the drop after this long
+READY_TIMEOUT = 60.0   # Give up waiting for /api/status after this long
+DOWN_PROBE_INTERVAL = 0.1
+PROBE_INITIAL = 0.1
+PROBE_BACKOFF = 1.5
+PROBE_MAX = 2.0
+
+
+@dataclass
+class Readiness:
+    """Result of waiting for a device to reboot."""
+    status: dict | None       # First /api/status after the reboot, None on timeout
+    went_down: bool           # Whether the device was seen offline
+    down_after: float = 0.0   # Seconds from start until it stopped answering
+    ready_after: float = 0.0  # Seconds from start until /api/status answered
+    probes: int = 0
+    rebooted: bool = False    # Answered with a new boot id (or came back after a drop)
+
+    @property
+    def boot_to_ready(self) -> float | None:
+        """Seconds the device was offline, from going down to answering."""
+        if self.status is None or not self.went_down:
+            return None
+        return self.ready_after - self.down_after
+
+
+# Last /api/status per host (logs.StatusCache), for conditional requests
+# and the boot id. Created on first use: SCons loads this module before its
+# siblings are importable.
+_status_cache = None
+
+
+def status_cache():
+    global _status_cache
+    if _status_cache is None:
+        from logs import StatusCache
+        _status_cache = StatusCache()
+    return _status_cache
+
+
+def get_status(host: str, timeout: float = 3) -> dict | None:
+    """GET /api/status, or None if the device doesn't answer with 200 or 304."""
+    cache = status_cache()
+    try:
+        resp = requests.get(f"http://{host}/api/status", headers=cache.headers(host),
+                            timeout=timeout)
+        return cache.update(host, resp.status_code,
+                            {k.lower(): v for k, v in resp.headers.items()}, resp.content)
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def wait_for_reboot(host: str, ready_timeout: float = READY_TIMEOUT,
+                    boot_id: str | None = None) -> Readiness:
+    """
+    Wait for the device to go down and come back up.
+
+    Probes /api/status every DOWN_PROBE_INTERVAL until a probe fails,
+    then with exponential backoff (PROBE_INITIAL * PROBE_BACKOFF^n,
+    capped at PROBE_MAX) until it answers again.
+
+    The reboot counts only once the device answers with a boot id other
+    than `boot_id` (default: that of the last get_status() answer). A
+    reboot too quick to see the drop is still caught this way, and a
+    device that keeps answering with the old boot id did not reboot.
+    Firmware without status ETags has no boot id; there the device must
+    be seen going down.
+    """
+    if boot_id is None:
+        boot_id = status_cache().boot_id(host)
+    start = time.monotonic()
+    result = Readiness(status=None, went_down=False)
+
+    def answered(status: dict) -> bool:
+        result.status = status
+        result.ready_after = time.monotonic() - start
+        current = status_cache().boot_id(host)
+        result.rebooted = (current != boot_id) if boot_id and current else result.went_down
+        return result.rebooted
+
+    while time.monotonic() - start < REBOOT_GRACE:
+        result.probes += 1
+        status = get_status(host, timeout=0.5)
+        if status is None:
+            result.went_down = True
+            result.down_after = time.monotonic() - start
+            break
+        if boot_id and answered(status):
+            return result  # Rebooted between probes
+        time.sleep(DOWN_PROBE_INTERVAL)
+    else:
+        # Never went down, nor answered with a new boot id
+        answered(status)
+        return result
+
+    delay = PROBE_INITIAL
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        result.probes += 1
+        status = get_status(host, timeout=min(2.0, max(0.5, delay)))
+        if status is not None and answered(status):
+            break
+        time.sleep(delay)
+        delay = min(PROBE_MAX, delay * PROBE_BACKOFF)
+    return result
+
+
+def describe_readiness(ready: Readiness) -> str:
+    """One-line summary of a reboot for progress output."""
+    if ready.status is None:
+        return "not back online"
+    if not ready.rebooted:
+        return "did not reboot"
+    if ready.boot_to_ready is None:
+        return f"back online after {ready.ready_after:.1f}s"
+    return (f"down after {ready.down_after:.1f}s, ready {ready.boot_to_ready:.1f}s later, "
+            f"{ready.probes} probes")
+
+
+# Image hashes by path, size and mtime, so unchanged builds aren't rehashed
+HASH_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                          'tinklink', 'image-hashes.json')
+_hash_cache_lock = threading.Lock()
+
+
+def image_hash(filepath: str, mode: str) -> str:
+    """
+    Hash of an image as /api/status reports it once installed (see
+    ota_delta.image_sha256), cached in HASH_CACHE. A cache that can't be
+    read or written is ignored.
+    """
+    from ota_delta import image_sha256
+
+    stat = os.stat(filepath)
+    key = f"{mode}:{os.path.realpath(filepath)}"
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    with _hash_cache_lock:
+        try:
+            with open(HASH_CACHE) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        cached = cache.get(key)
+        if isinstance(cached, dict) and all(cached.get(k) == v for k, v in entry.items()):
+            return cached['sha256']
+
+        with open(filepath, 'rb') as f:
+            entry['sha256'] = image_sha256(f.read(), mode)
+        cache[key] = entry
+        try:
+            os.makedirs(os.path.dirname(HASH_CACHE), exist_ok=True)
+            tmp = f"{HASH_CACHE}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(cache, f, indent=1)
+            os.replace(tmp, HASH_CACHE)
+        except OSError:
+            pass
+        return entry['sha256']
+
+
+def installed_hash(status: dict, mode: str) -> str:
+    """
+    Hash of the installed image from /api/status ('' if not known).
+
+    Always '' for the filesystem: filesystemSha256 is only the last image
+    flashed over OTA, and a USB uploadfs since then leaves it stale, so it
+    can't show that an upload would be redundant.
+    """
+    if mode == 'fs':
+        return ''
+    return str(status.get('ota', {}).get('firmwareSha256') or '')
+
+
+# Resuming a dropped upload: retries per upload, and how long to wait for
+# /api/ota/status to answer again (WiFi reassociation takes a few seconds)
+RESUME_ATTEMPTS = 5
+RESUME_WAIT = 30.0
+
+
+@dataclass(frozen=True)
+class Payload:
+    """What to send for an image: the encoding and the encoded bytes
+    (None to stream the file as-is)."""
+    encoding: str
+    data: bytes | None
+    size: int
+    image_size: int
+    fallback: 'Payload | None' = None  # Used if the device rejects the delta base
+
+
+@functools.lru_cache(maxsize=8)
+def prepare_payload(filepath: str, mode: str, supported: tuple = ('raw',),
+                    encoding: str = 'auto', base: str | None = None) -> Payload:
+    """
+    Encode an image for a device that accepts the `supported` encodings.
+
+    'auto' picks the smallest payload the device can decode; delta
+    encodings are only tried for firmware with a base image. Every
+    encoded payload is decoded again and compared to the image before
+    it is used. Raises ValueError if the requested encoding can't be
+    used.
+    """
+    image_size = os.path.getsize(filepath)
+    raw = Payload('raw', None, image_size, image_size)
+    if encoding == 'raw':
+        return raw
+
+    import ota_delta
+
+    delta_ok = mode == 'firmware' and base is not None
+    if encoding == 'auto':
+        candidates = [e for e in ('deflate', 'delta', 'delta+deflate')
+                      if e in supported and (delta_ok or not e.startswith('delta'))]
+    else:
+        if encoding not in supported:
+            raise ValueError(f"device does not accept {encoding} uploads (firmware too old?)")
+        if encoding.startswith('delta') and not delta_ok:
+            raise ValueError(f"{encoding} needs firmware mode and --base")
+        candidates = [encoding]
+    if not candidates:
+        return raw
+
+    with open(filepath, 'rb') as f:
+        image = f.read()
+    base_image = None
+    if delta_ok:
+        with open(base, 'rb') as f:
+            base_image = f.read()
+
+    best = None
+    for name in candidates:
+        data = ota_delta.encode(image, name, base_image)
+        if ota_delta.decode(data, name, base_image) != image:
+            raise ValueError(f"{name} payload does not decode to the image")
+        if best is None or len(data) < best.size:
+            best = Payload(name, data, len(data), image_size)
+
+    if encoding == 'auto' and best.size >= image_size:
+        return raw
+    if encoding == 'auto' and best.encoding.startswith('delta'):
+        fallback = prepare_payload(filepath, mode, supported, 'auto')
+        best = Payload(best.encoding, best.data, best.size, image_size, fallback)
+    return best
+
+
+def is_base_mismatch(resp: requests.Response) -> bool:
+    """True if the device refused a delta because it runs a different image."""
+    return resp.status_code == 400 and 'Delta base mismatch' in resp.text
+
+
+def post_image(host: str, filepath: str, mode: str, timeout: int = 120,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, on_progress=None,
+               payload: Payload | None = None, offset: int = 0,
+               upload: str | None = None) -> requests.Response:
+    """
+    Stream an image to /api/ota/upload and return the device's response.
+
+    payload selects an encoded form of the image (see prepare_payload);
+    by default the file is sent as-is. upload names the payload so the
+    device can resume it, and offset continues a dropped upload of it.
+    on_progress(sent) is called with the number of payload bytes sent so
+    far, counting from the start of the payload. Raises
+    requests.exceptions.RequestException on transport errors.
+    """
+    fields = {'mode': mode}
+    if payload is not None and payload.data is not None:
+        fields['encoding'] = payload.encoding
+        fileobj, size = io.BytesIO(payload.data), payload.size
+    else:
+        fileobj, size = open(filepath, 'rb'), os.path.getsize(filepath)
+    if upload is not None:
+        fields.update(upload=upload, size=size, offset=offset)
+    fileobj.seek(offset)
+    body = MultipartStream(fields, 'file', os.path.basename(filepath), fileobj,
+                           size - offset, chunk_size)
+    if on_progress:
+        # Count only file bytes, as the device does
+        body.on_progress = lambda sent: on_progress(
+            offset + min(size - offset, max(0, sent - len(body.head))))
+
+    with body, requests.Session() as session:
+        session.mount('http://', SendBufferAdapter(chunk_size))
+        return session.post(
+            f"http://{host}/api/ota/upload",
+            data=body,
+            headers={'Content-Type': body.content_type},
+            timeout=timeout
+        )
+
+
+@functools.lru_cache(maxsize=8)
+def upload_id(filepath: str, payload: Payload) -> str:
+    """Name for a payload, so the device only resumes the same bytes."""
+    digest = hashlib.sha256()
+    if payload.data is not None:
+        digest.update(payload.data)
+    else:
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def resume_offset(host: str, upload: str, size: int) -> int | None:
+    """
+    Wait for the device to answer after a dropped upload and return the
+    offset to continue from: the progress in /api/ota/status if the
+    device still has this upload open, otherwise 0. None if it doesn't
+    answer within RESUME_WAIT.
+    """
+    delay = PROBE_INITIAL
+    deadline = time.monotonic() + RESUME_WAIT
+    while time.monotonic() < deadline:
+        try:
+            resp = requests.get(f"http://{host}/api/ota/status", timeout=2)
+            if resp.status_code == 200:
+                status = resp.json()
+                if status.get('inProgress') and status.get('upload') == upload:
+                    return min(int(status.get('progress', 0)), size)
+                return 0
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        time.sleep(delay)
+        delay = min(PROBE_MAX, delay * PROBE_BACKOFF)
+    return None
+
+
+def send_image(host: str, filepath: str, mode: str, timeout: int = 120,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, on_progress=None,
+               payload: Payload | None = None, resumable: bool = False,
+               on_resume=None) -> requests.Response:
+    """
+    post_image(), resuming after a dropped connection.
+
+    resumable is for firmware that lists ota.resume in /api/status: if
+    the transfer fails part-way, it continues from the offset the device
+    acknowledges rather than from byte zero, up to RESUME_ATTEMPTS
+    times. on_resume(offset, reason) is called before each retry.
+    """
+    if payload is None:
+        payload = prepare_payload(filepath, mode)
+    upload = upload_id(filepath, payload) if resumable else None
+    offset = 0
+    for attempt in range(RESUME_ATTEMPTS + 1):
+        last = upload is None or attempt == RESUME_ATTEMPTS
+        try:
+            resp = post_image(host, filepath, mode, timeout, chunk_size, on_progress,
+                              payload, offset, upload)
+        except requests.exceptions.RequestException as e:
+            if last:
+                raise
+            reason = e.__class__.__name__
+        else:
+            # Data still in flight at the drop can move the device past the
+            # offset it reported; ask again (409, or 400 from
+            # firmware that shared the error with the open upload)
+            if last or not (resp.status_code in (400, 409) and 'Cannot resume' in resp.text):
+                return resp
+            reason = 'resume offset rejected'
+        offset = resume_offset(host, upload, payload.size)
+        if offset is None:
+            raise requests.exceptions.ConnectionError(
+                f"{host} did not answer within {RESUME_WAIT:.0f}s of the upload dropping")
+        if on_resume:
+            on_resume(offset, reason)
+
+
+def upload_ota(host: str, filepath: str, mode: str, timeout: int = 120,
+               chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = 'auto',
+               base: str | None = None, force: bool = False, monitor: bool = False) -> bool:
     """
     Upload a binary file to the device via OTA.
 
@@ -66,12 +713,16 @@ def upload_ota(host: str, filepath: str, mode: str, timeout: int = 120) -> bool:
         filepath: Path to the .bin file
         mode: 'firmware' or 'fs' (filesystem)
         timeout: Upload timeout in seconds
+        chunk_size: Bytes read from the file per send
+        encoding: 'auto', 'raw', 'deflate', 'delta' or 'delta+deflate'
+        base: Image the device is running, for delta encodings
+        force: Upload even if the device reports the same image installed
+        monitor: Poll /api/ota/status during the upload and report whether
+            the network or flash writes were the bottleneck
 
     Returns:
         True if successful, False otherwise
     """
-    url = f"http://{host}/api/ota/upload"
-
     # Validate file exists
     if not os.path.exists(filepath):
         print(f"Error: File not found: {filepath}")
@@ -91,20 +742,38 @@ def upload_ota(host: str, filepath: str, mode: str, timeout: int = 120) -> bool:
     print()
 
     # Check device is reachable
+    # Through get_status(), so the reboot check knows the current boot id
     print("Checking device connectivity...", end=" ", flush=True)
-    try:
-        status_url = f"http://{host}/api/status"
-        resp = requests.get(status_url, timeout=5)
-        if resp.status_code != 200:
-            print("FAILED")
-            print(f"Error: Device returned status {resp.status_code}")
-            return False
-        print("OK")
-    except requests.exceptions.RequestException as e:
+    status = get_status(host, timeout=5)
+    if status is None:
         print("FAILED")
-        print(f"Error: Cannot connect to {host}")
-        print(f"       {e}")
+        print(f"Error: Cannot get /api/status from {host}")
         return False
+    print("OK")
+
+    # Filesystem uploads are never skipped (see installed_hash)
+    if not force and mode != 'fs':
+        try:
+            digest = image_hash(filepath, mode)
+        except (ValueError, OSError) as e:
+            print(f"Error: {e}")
+            return False
+        if installed_hash(status, mode) == digest:
+            print(f"Device already has this image (sha256 {digest[:12]}) - nothing to do.")
+            print("Use --force to upload anyway.")
+            return True
+
+    try:
+        ota_info = status.get('ota', {})
+        supported = tuple(ota_info.get('encodings', ['raw']))
+        resumable = bool(ota_info.get('resume'))
+        payload = prepare_payload(filepath, mode, supported, encoding, base)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        return False
+    if payload.encoding != 'raw':
+        print(f"Encoding: {payload.encoding} ({filesize:,} -> {payload.size:,} bytes, "
+              f"{payload.size * 100 / filesize:.1f}%)")
 
     # Back up config before filesystem flash
     config_backup = None
@@ -120,62 +789,94 @@ def upload_ota(host: str, filepath: str, mode: str, timeout: int = 120) -> bool:
     print(f"Uploading {filename}...")
 
     try:
-        with open(filepath, 'rb') as f:
-            files = {'file': (filename, f, 'application/octet-stream')}
-            data = {'mode': mode}
+        while True:
+            meter = ThroughputMeter(payload.size)
+            resumes = []
 
-            start_time = time.time()
-
-            # Use a session for connection reuse
-            session = requests.Session()
-
-            resp = session.post(
-                url,
-                files=files,
-                data=data,
-                timeout=timeout
-            )
+            def on_resume(offset: int, reason: str):
+                meter.finish()
+                resumes.append(offset)
+                print(f"Connection lost ({reason}) - resuming at {offset:,} of "
+                      f"{payload.size:,} bytes")
+                meter.rewind(offset)
 
+            status_monitor = OtaStatusMonitor(host) if monitor else None
+            if status_monitor:
+                meter.annotate = status_monitor.annotate
+                status_monitor.start()
+            start_time = time.time()
+            try:
+                resp = send_image(host, filepath, mode, timeout, chunk_size, meter.update,
+                                  payload, resumable, on_resume)
+            finally:
+                if status_monitor:
+                    status_monitor.stop()
             elapsed = time.time() - start_time
+            meter.finish()
+            if not (payload.fallback and is_base_mismatch(resp)):
+                break
+            payload = payload.fallback
+            print(f"Device is not running the base image - resending as {payload.encoding}")
 
-            if resp.status_code == 200:
-                print(f"\nUpload complete! ({elapsed:.1f}s)")
-                print(f"Transfer rate: {filesize/elapsed/1024:.1f} KB/s")
-
-                try:
-                    result = resp.json()
-                    print(f"Response: {result.get('message', 'OK')}")
-                except:
-                    pass
+        if resp.status_code == 200:
+            print(f"\nUpload complete! ({elapsed:.1f}s)")
+            print(f"Transfer rate: {payload.size/elapsed/1024:.1f} KB/s "
+                  f"(peak {meter.peak/1024:.1f} KB/s)")
+            if payload.encoding != 'raw':
+                print(f"Effective rate: {filesize/elapsed/1024:.1f} KB/s of image")
+            if status_monitor:
+                status_monitor.report(payload.size / elapsed)
+            if resumes:
+                print(f"Resumed {len(resumes)} time(s); "
+                      f"{sum(r == 0 for r in resumes)} restarted from the beginning")
 
-                print("\nDevice is rebooting...")
+            try:
+                result = resp.json()
+                print(f"Response: {result.get('message', 'OK')}")
+            except:
+                pass
 
-                # Restore config after filesystem flash
+            print("\nDevice is rebooting...")
+            print("Waiting for device to come back online...", end=" ", flush=True)
+            ready = wait_for_reboot(host)
+            if ready.status is None:
+                print("TIMEOUT")
+                print(f"WARNING: Device did not answer within {READY_TIMEOUT:.0f}s. "
+                      "Check if it comes back online.")
                 if config_backup:
-                    print("Waiting for device to come back online...", flush=True)
-                    time.sleep(8)
-                    print("Restoring config...", end=" ", flush=True)
-                    if restore_config(host, config_backup):
-                        print("OK")
-                        print("Rebooting to apply restored config...")
-                        try:
-                            requests.post(f"http://{host}/api/system/reboot", timeout=5)
-                        except Exception:
-                            pass  # Connection drops on reboot
-                    else:
-                        print("FAILED")
-                        print("WARNING: Could not restore config. You may need to reconfigure manually.")
-                else:
-                    print("Wait a few seconds, then reconnect.")
+                    print("WARNING: Config was not restored. You may need to reconfigure manually.")
                 return True
-            else:
-                print(f"\nUpload failed! Status: {resp.status_code}")
-                try:
-                    result = resp.json()
-                    print(f"Error: {result.get('error', resp.text)}")
-                except:
-                    print(f"Response: {resp.text}")
+            if not ready.rebooted:
+                print("FAILED")
+                print("Error: Device is still running the same boot - the update was not applied")
                 return False
+            print(f"OK ({describe_readiness(ready)})")
+
+            # Restore config after filesystem flash
+            if config_backup:
+                print("Restoring config...", end=" ", flush=True)
+                if restore_config(host, config_backup):
+                    print("OK")
+                    print("Rebooting to apply restored config...", end=" ", flush=True)
+                    try:
+                        requests.post(f"http://{host}/api/system/reboot", timeout=5)
+                    except Exception:
+                        pass  # Connection drops on reboot
+                    ready = wait_for_reboot(host)
+                    print(f"OK ({describe_readiness(ready)})" if ready.rebooted
+                          else describe_readiness(ready).upper())
+                else:
+                    print("FAILED")
+                    print("WARNING: Could not restore config. You may need to reconfigure manually.")
+            return True
+        else:
+            print(f"\nUpload failed! Status: {resp.status_code}")
+            try:
+                result = resp.json()
+                print(f"Error: {result.get('error', resp.text)}")
+            except:
+                print(f"Response: {resp.text}")
+            return False
 
     except requests.exceptions.Timeout:
         print("\nError: Upload timed out")
@@ -187,6 +888,215 @@ def upload_ota(host: str, filepath: str, mode: str, timeout: int = 120) -> bool:
         return False
 
 
+@dataclass
+class HostResult:
+    """Outcome of a rollout to one host."""
+    host: str
+    wave: int
+    result: str = 'pending'   # ok, failed or skipped
+    detail: str = ''
+    upload_time: float = 0.0
+    reboot_time: float = 0.0         # Upload response to final /api/status
+    boot_to_ready: float | None = None  # Offline time of the update reboot
+    total_time: float = 0.0
+    resumes: int = 0                 # Uploads continued after a dropped connection
+    size: int = 0
+    encoding: str = 'raw'
+    version: str = ''
+
+
+def rollout_host(result: HostResult, filepath: str, mode: str, timeout: int,
+                 chunk_size: int, expect_version: str | None, report,
+                 encoding: str = 'auto', base: str | None = None,
+                 digest: str = '') -> HostResult:
+    """
+    Update one host: upload, wait for the reboot, restore config after a
+    filesystem flash, and check /api/status. A host whose installed image
+    hash is `digest` is left alone ('' to always upload).
+    """
+    host = result.host
+    start = time.monotonic()
+    result.size = os.path.getsize(filepath)
+
+    def finish(outcome: str, detail: str) -> HostResult:
+        result.result, result.detail = outcome, detail
+        result.total_time = time.monotonic() - start
+        report(f"[{host}] {outcome.upper()}: {detail}" if outcome != 'ok' else f"[{host}] OK {detail}")
+        return result
+
+    status = get_status(host)
+    if status is None:
+        return finish('failed', 'not reachable')
+
+    if digest and installed_hash(status, mode) == digest:
+        result.version = str(status.get('version', ''))
+        if expect_version and result.version != expect_version:
+            return finish('failed', f"running {result.version or '?'}, expected {expect_version}")
+        return finish('ok', f"v{result.version}, already has this image" if result.version
+                      else 'already has this image')
+
+    try:
+        supported = tuple(status.get('ota', {}).get('encodings', ['raw']))
+        resumable = bool(status.get('ota', {}).get('resume'))
+        payload = prepare_payload(filepath, mode, supported, encoding, base)
+    except (ValueError, OSError) as e:
+        return finish('failed', str(e))
+
+    def on_resume(offset: int, reason: str):
+        result.resumes += 1
+        report(f"[{host}] Connection lost ({reason}) - resuming at {offset:,} bytes")
+
+    config_backup = backup_config(host) if mode == 'fs' else None
+
+    report(f"[{host}] Uploading ({payload.encoding}, {payload.size/1024:.1f} KB)...")
+    upload_start = time.monotonic()
+    try:
+        resp = send_image(host, filepath, mode, timeout, chunk_size, payload=payload,
+                          resumable=resumable, on_resume=on_resume)
+        if payload.fallback and is_base_mismatch(resp):
+            payload = payload.fallback
+            report(f"[{host}] Not running the base image - resending as {payload.encoding}")
+            resp = send_image(host, filepath, mode, timeout, chunk_size, payload=payload,
+                              resumable=resumable, on_resume=on_resume)
+    except requests.exceptions.RequestException as e:
+        return finish('failed', f"upload error: {e.__class__.__name__}")
+    result.upload_time = time.monotonic() - upload_start
+    result.size, result.encoding = payload.size, payload.encoding
+    if resp.status_code != 200:
+        try:
+            error = resp.json().get('error', resp.text)
+        except ValueError:
+            error = resp.text
+        return finish('failed', f"upload rejected ({resp.status_code}): {error}")
+
+    reboot_start = time.monotonic()
+    ready = wait_for_reboot(host)
+    result.boot_to_ready = ready.boot_to_ready
+    if ready.rebooted and config_backup:
+        if not restore_config(host, config_backup):
+            return finish('failed', 'config restore failed')
+        try:
+            requests.post(f"http://{host}/api/system/reboot", timeout=5)
+        except requests.exceptions.RequestException:
+            pass  # Connection drops on reboot
+        ready = wait_for_reboot(host)
+    result.reboot_time = time.monotonic() - reboot_start
+    if ready.status is None:
+        return finish('failed', 'no /api/status after reboot')
+    if not ready.rebooted:
+        return finish('failed', 'did not reboot')
+    status = ready.status
+
+    result.version = str(status.get('version', ''))
+    if expect_version and result.version != expect_version:
+        return finish('failed', f"running {result.version or '?'}, expected {expect_version}")
+    detail = f"v{result.version}" if result.version else ''
+    if result.resumes:
+        detail += f" (resumed {result.resumes}x)"
+    return finish('ok', detail.strip())
+
+
+def plan_waves(hosts: list[str], canary: int, wave_size: int) -> list[list[str]]:
+    """Split hosts into a canary wave followed by waves of wave_size
+    (0 = everything remaining in one wave)."""
+    waves = []
+    if canary > 0:
+        waves.append(hosts[:canary])
+        hosts = hosts[canary:]
+    size = wave_size if wave_size > 0 else max(1, len(hosts))
+    for i in range(0, len(hosts), size):
+        waves.append(hosts[i:i + size])
+    return waves
+
+
+def rollout(hosts: list[str], filepath: str, mode: str, parallel: int = 4,
+            canary: int = 1, wave_size: int = 0, timeout: int = 120,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            expect_version: str | None = None, encoding: str = 'auto',
+            base: str | None = None, force: bool = False) -> list[HostResult]:
+    """
+    Update a fleet in waves, at most `parallel` uploads at a time.
+    Hosts that already have the image are counted as ok without an upload.
+
+    The first `canary` hosts form their own wave. A wave with any failed
+    host stops the rollout, and the hosts in later waves are skipped.
+    """
+    waves = plan_waves(hosts, canary, wave_size)
+    results = [HostResult(host, n) for n, wave in enumerate(waves) for host in wave]
+    lock = threading.Lock()
+
+    # Hashed once here rather than by every worker; filesystem uploads are
+    # never skipped (see installed_hash)
+    digest = ''
+    if not force and mode != 'fs':
+        try:
+            digest = image_hash(filepath, mode)
+        except (ValueError, OSError) as e:
+            print(f"Error: {e}")
+            for r in results:
+                r.result, r.detail = 'failed', 'image not readable'
+            return results
+
+    def report(message: str):
+        with lock:
+            print(message, flush=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        for n, wave in enumerate(waves):
+            label = 'Canary' if n == 0 and canary > 0 else f"Wave {n}"
+            print(f"\n{label}: {len(wave)} host{'s' if len(wave) != 1 else ''}")
+            batch = [r for r in results if r.wave == n]
+            list(pool.map(lambda r: rollout_host(
+                r, filepath, mode, timeout, chunk_size, expect_version, report,
+                encoding, base, digest), batch))
+
+            failed = [r for r in batch if r.result != 'ok']
+            if failed:
+                for r in results:
+                    if r.wave > n:
+                        r.result, r.detail = 'skipped', f"{label.lower()} failed"
+                print(f"\n{label} failed on {len(failed)} host(s) - aborting remaining waves")
+                break
+    return results
+
+
+def print_rollout_table(results: list[HostResult]):
+    """Per-host timing and result table."""
+    # (heading, left-aligned); widths fit the widest cell, so fast LAN
+    # rates can't push the later columns out of line
+    columns = [('Host', True), ('Wave', False), ('Result', True), ('Encoding', True),
+               ('Sent', False), ('Upload', False), ('Rate', False), ('Reboot', False),
+               ('Boot', False), ('Total', False), ('Detail', True)]
+    rows = []
+    for r in results:
+        uploaded = bool(r.upload_time)
+        rows.append([
+            r.host, str(r.wave), r.result,
+            r.encoding if uploaded else '',
+            f"{r.size / 1024:.1f}KB" if uploaded else '',
+            f"{r.upload_time:.1f}s" if uploaded else '',
+            f"{r.size / r.upload_time / 1024:.1f}KB/s" if uploaded else '',
+            f"{r.reboot_time:.1f}s" if r.reboot_time else '',
+            f"{r.boot_to_ready:.1f}s" if r.boot_to_ready is not None else '',
+            f"{r.total_time:.1f}s" if r.total_time else '',
+            r.detail,
+        ])
+    widths = [max(len(heading), *(len(row[i]) for row in rows))
+              for i, (heading, _) in enumerate(columns)]
+
+    def line(cells: list[str]) -> str:
+        return '  '.join(f"{cell:{'<' if left else '>'}{width}}"
+                         for cell, width, (_, left) in zip(cells, widths, columns)).rstrip()
+
+    header = line([heading for heading, _ in columns])
+    print(f"\n{header}")
+    print('-' * max(len(header), *(len(line(row)) for row in rows)))
+    for row in rows:
+        print(line(row))
+    counts = {k: sum(1 for r in results if r.result == k) for k in ('ok', 'failed', 'skipped')}
+    print(f"\n{counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} skipped")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Upload firmware or filesystem to TinkLink-USB via OTA',
@@ -196,6 +1106,11 @@ Examples:
   %(prog)s firmware .pio/build/esp32s3/firmware.bin
   %(prog)s fs .pio/build/esp32s3/littlefs.bin
   %(prog)s firmware firmware.bin --host 192.168.1.100
+  %(prog)s firmware firmware.bin --base bin/firmware-1.10.0.bin   # Send a delta
+
+Fleet rollout (one canary, then the rest 4 at a time):
+  %(prog)s firmware firmware.bin --hosts bay1.local bay2.local bay3.local
+  %(prog)s firmware firmware.bin --hosts-file fleet.txt --parallel 8 --canary 2 --wave-size 10
 
 Environment:
   TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
@@ -226,12 +1141,105 @@ Environment:
         help='Upload timeout in seconds (default: 120)'
     )
 
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Bytes read and queued per send (default: {DEFAULT_CHUNK_SIZE})'
+    )
+
+    parser.add_argument(
+        '--encoding',
+        choices=['auto', 'raw', 'deflate', 'delta', 'delta+deflate'],
+        default='auto',
+        help='Transfer encoding (default: auto = smallest the device accepts)'
+    )
+
+    parser.add_argument(
+        '--base',
+        help='Firmware image the device is running, to send only a delta against it'
+    )
+
+    parser.add_argument(
+        '--monitor',
+        action='store_true',
+        help='Poll /api/ota/status during the upload and compare flash-write and network rates'
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Upload even if the device reports this exact image installed'
+    )
+
+    parser.add_argument(
+        '--hosts',
+        nargs='+',
+        metavar='HOST',
+        help='Roll out to several devices (fleet mode)'
+    )
+
+    parser.add_argument(
+        '--hosts-file',
+        help='Read fleet hostnames from a file, one per line (# comments allowed)'
+    )
+
+    parser.add_argument(
+        '--parallel',
+        type=int,
+        default=4,
+        help='Fleet mode: maximum concurrent uploads (default: 4)'
+    )
+
+    parser.add_argument(
+        '--canary',
+        type=int,
+        default=1,
+        help='Fleet mode: hosts updated first, on their own; a failure aborts the rollout (default: 1)'
+    )
+
+    parser.add_argument(
+        '--wave-size',
+        type=int,
+        default=0,
+        help='Fleet mode: hosts per wave after the canary (default: all remaining)'
+    )
+
+    parser.add_argument(
+        '--expect-version',
+        help='Fleet mode: version /api/status must report after the reboot'
+    )
+
     args = parser.parse_args()
 
     # Normalize mode
     mode = 'fs' if args.mode in ('fs', 'filesystem') else 'firmware'
 
-    success = upload_ota(args.host, args.file, mode, args.timeout)
+    hosts = list(args.hosts or [])
+    if args.hosts_file:
+        from logs import read_hosts_file
+        try:
+            hosts += read_hosts_file(args.hosts_file)
+        except OSError as e:
+            print(f"Error: Cannot read hosts file: {e}")
+            sys.exit(1)
+
+    if hosts:
+        if not os.path.exists(args.file):
+            print(f"Error: File not found: {args.file}")
+            sys.exit(1)
+        hosts = list(dict.fromkeys(hosts))
+        size = os.path.getsize(args.file)
+        print(f"Rolling out {os.path.basename(args.file)} ({size/1024:.1f} KB, {mode}) "
+              f"to {len(hosts)} hosts, {args.parallel} at a time")
+        results = rollout(hosts, args.file, mode, args.parallel, args.canary, args.wave_size,
+                          args.timeout, args.chunk_size, args.expect_version,
+                          args.encoding, args.base, args.force)
+        print_rollout_table(results)
+        sys.exit(0 if all(r.result == 'ok' for r in results) else 1)
+
+    success = upload_ota(args.host, args.file, mode, args.timeout, args.chunk_size,
+                         args.encoding, args.base, args.force, args.monitor)
     sys.exit(0 if success else 1)
 
 
@@ -276,6 +1284,9 @@ def copy_binaries_post_build(source, target, env):
         firmware_dst = os.path.join(bin_dir, "firmware.bin")
         shutil.copy2(firmware_src, firmware_dst)
         print(f"Copied firmware.bin to bin/")
+        # Hash now so OTA uploads can check the device without reading the image
+        image_hash(firmware_src, 'firmware')
+        image_hash(firmware_dst, 'firmware')
 
 
 def copy_filesystem_post_build(source, target, env):
@@ -303,6 +1314,9 @@ try:
     from SCons.Script import Import
     Import("env")
 
+    # Sibling modules (ota_delta) aren't on the path when loaded by SCons
+    sys.path.insert(0, os.path.join(env.subst("$PROJECT_DIR"), "scripts"))
+
     # Register post-build actions to copy binaries to bin/ folder
     env.AddPostAction("$BUILD_DIR/firmware.bin", copy_binaries_post_build)
     env.AddPostAction("$BUILD_DIR/littlefs.bin", copy_filesystem_post_build)
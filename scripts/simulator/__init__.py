@@ -0,0 +1,27 @@
+"""
+TinkLink-USB Protocol Simulator
+
+Fakes of the three devices the firmware controls, for testing the bridge
+and the tooling without the gear:
+
+    FakeRT4K    - RetroTINK 4K serial console on a pty (rt4k.py)
+    FakeExtron  - Extron SW VGA RS-232 control on a pty (extron.py)
+    FakeDenon   - Denon/Marantz AVR telnet control on TCP port 23 (denon.py)
+
+Each takes latency and jitter (seconds) that delay what it sends without
+reordering it, and the serial fakes pace their output at the line's baud
+rate. Run them from the command line with `python -m scripts.simulator`,
+or use the classes directly:
+
+    from scripts.simulator import FakeExtron
+    extron = FakeExtron(sig_rate=0.5, latency=0.01)
+    serial.Serial(extron.path, 9600)   # Talk to it like the real switcher
+"""
+
+from .denon import FakeDenon
+from .extron import FakeExtron
+from .link import FakeDevice, Link, PtyPort, Scheduler, SerialDevice
+from .rt4k import FakeRT4K
+
+__all__ = ['FakeDenon', 'FakeDevice', 'FakeExtron', 'FakeRT4K', 'Link', 'PtyPort',
+           'Scheduler', 'SerialDevice']
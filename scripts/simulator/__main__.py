@@ -0,0 +1,143 @@
+"""
+Run the fake RT4K, Extron and Denon until Ctrl+C.
+
+Usage:
+    python -m scripts.simulator                       # All three, traffic printed
+    python -m scripts.simulator --sig-rate 0.2 --glitch-rate 0.1
+    python -m scripts.simulator --no-rt4k --no-extron --denon-port 2323
+"""
+
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime
+
+from . import extron, rt4k, denon
+from .denon import FakeDenon
+from .extron import FakeExtron
+from .rt4k import FakeRT4K
+
+_print_lock = threading.Lock()
+
+
+def print_traffic(device, direction, line):
+    stamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+    clean = ''.join(c if ' ' <= c < '\x7f' else '?' for c in line)
+    with _print_lock:
+        print(f"{stamp} {device.name:<6} {direction} {clean}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m scripts.simulator',
+        description='Simulate the RT4K, Extron and Denon protocols for hardware-free testing',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                    # All three, printing traffic
+  %(prog)s --latency 0.02 --jitter 0.01       # Uneven links everywhere
+  %(prog)s --sig-rate 0.2 --glitch-rate 0.5   # Noisy signal detection
+  %(prog)s --rt4k-power sleeping --rt4k-boot-time 12
+  %(prog)s --denon-port 2323                  # Port 23 needs root
+
+Serial clients open the printed /dev/pts paths. To drive a real
+TinkLink's Extron UART from the fake, bridge the pty to a USB serial
+adapter: socat /dev/pts/N /dev/ttyUSB0,b9600,raw
+        """
+    )
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Reply delay for every device in seconds (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Random +/- variation of --latency in seconds (default: 0)')
+    parser.add_argument('--quiet', action='store_true', help="Don't print traffic")
+
+    group = parser.add_argument_group('RetroTINK 4K')
+    group.add_argument('--no-rt4k', action='store_true', help="Don't start the fake RT4K")
+    group.add_argument('--rt4k-latency', type=float, help='Override --latency for the RT4K')
+    group.add_argument('--rt4k-jitter', type=float, help='Override --jitter for the RT4K')
+    group.add_argument('--rt4k-power', choices=[rt4k.ON, rt4k.SLEEPING], default=rt4k.ON,
+                       help='Power state at start (default: on)')
+    group.add_argument('--rt4k-boot-time', type=float, default=rt4k.BOOT_TIME,
+                       help=f'Seconds from wake to boot complete (default: {rt4k.BOOT_TIME:g})')
+    group.add_argument('--rt4k-sleep-after', type=float, default=0.0,
+                       help='Go to sleep after this many idle seconds (default: never)')
+    group.add_argument('--rt4k-no-noise', action='store_true',
+                       help="Don't send garbage bytes when powering up")
+
+    group = parser.add_argument_group('Extron')
+    group.add_argument('--no-extron', action='store_true', help="Don't start the fake Extron")
+    group.add_argument('--extron-latency', type=float, help='Override --latency for the Extron')
+    group.add_argument('--extron-jitter', type=float, help='Override --jitter for the Extron')
+    group.add_argument('--extron-baud', type=int, default=extron.BAUD,
+                       help=f'Line rate to pace output at, 0 for none (default: {extron.BAUD})')
+    group.add_argument('--inputs', type=int, default=4, help='Number of inputs (default: 4)')
+    group.add_argument('--sig-rate', type=float, default=0.0,
+                       help='Average console power changes per second (default: 0)')
+    group.add_argument('--glitch-rate', type=float, default=0.0,
+                       help='Average brief signal glitches per second (default: 0)')
+    group.add_argument('--switch-rate', type=float, default=0.0,
+                       help='Average front-panel input selections per second (default: 0)')
+
+    group = parser.add_argument_group('Denon AVR')
+    group.add_argument('--no-denon', action='store_true', help="Don't start the fake Denon")
+    group.add_argument('--denon-latency', type=float, help='Override --latency for the Denon')
+    group.add_argument('--denon-jitter', type=float, help='Override --jitter for the Denon')
+    group.add_argument('--denon-bind', default='127.0.0.1',
+                       help='Address to listen on (default: 127.0.0.1; 0.0.0.0 for a real TinkLink)')
+    group.add_argument('--denon-port', type=int, default=denon.PORT,
+                       help=f'Control port (default: {denon.PORT})')
+    group.add_argument('--denon-power-on-time', type=float, default=denon.POWER_ON_TIME,
+                       help=f'Seconds after PWON that input selection is ignored '
+                            f'(default: {denon.POWER_ON_TIME:g})')
+    args = parser.parse_args()
+
+    def link(device):
+        latency = getattr(args, f'{device}_latency')
+        jitter = getattr(args, f'{device}_jitter')
+        return {'latency': args.latency if latency is None else latency,
+                'jitter': args.jitter if jitter is None else jitter}
+
+    traffic = None if args.quiet else print_traffic
+    devices = []
+    if not args.no_rt4k:
+        device = FakeRT4K(power=args.rt4k_power, boot_time=args.rt4k_boot_time,
+                          sleep_after=args.rt4k_sleep_after, noise=not args.rt4k_no_noise,
+                          on_traffic=traffic, **link('rt4k'))
+        devices.append(device)
+        print(f"RT4K on {device.path}")
+    if not args.no_extron:
+        device = FakeExtron(baud=args.extron_baud, inputs=args.inputs, sig_rate=args.sig_rate,
+                            glitch_rate=args.glitch_rate, switch_rate=args.switch_rate,
+                            on_traffic=traffic, **link('extron'))
+        devices.append(device)
+        print(f"Extron on {device.path}")
+    if not args.no_denon:
+        device = FakeDenon(host=args.denon_bind, port=args.denon_port,
+                           power_on_time=args.denon_power_on_time, on_traffic=traffic,
+                           **link('denon'))
+        try:
+            device.start()
+        except OSError as e:
+            print(f"Error: Could not listen on {args.denon_bind}:{args.denon_port}: {e}",
+                  file=sys.stderr)
+            for other in devices:
+                other.close()
+            sys.exit(1)
+        devices.append(device)
+        print(f"Denon on {args.denon_bind}:{device.port}")
+    if not devices:
+        parser.error("nothing to simulate")
+
+    print("Simulating (Ctrl+C to stop)...")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n[Stopped]")
+        for device in devices:
+            device.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Fake Denon/Marantz AVR on the telnet control port.
+
+Speaks the CR-terminated protocol src/DenonAvr.cpp and the web UI's AVR
+console use: PWON/PWSTANDBY/PW?, SI<source>/SI?, MV<nn>/MVUP/MVDOWN/MV?
+and MUON/MUOFF/MU?. Like the real receiver, every change is announced
+to all connected clients and unknown commands get no reply.
+
+An AVR coming out of standby ignores input selection for a moment.
+power_on_time models that, and is why the firmware waits
+DenonAvr::SI_DELAY_MS between PWON and SI. Receivers accept a single
+control connection; further ones are refused while it is open
+(max_clients).
+"""
+
+import re
+import socket
+import socketserver
+import threading
+import time
+
+from .link import FakeDevice, Link
+
+# DenonAvr::configure(): TelnetSerial(ip, 23)
+PORT = 23
+
+# Seconds after PWON during which SI commands are ignored
+POWER_ON_TIME = 0.5
+
+MAX_VOLUME = 98
+
+VOLUME_COMMAND = re.compile(r'MV(\d\d)$')
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeDenon(FakeDevice):
+    """Power, source, volume and mute state behind a TCP control port."""
+
+    name = 'denon'
+
+    def __init__(self, host='127.0.0.1', port=PORT, latency=0.0, jitter=0.0,
+                 power_on_time=POWER_ON_TIME, source='CD', max_clients=1, on_traffic=None):
+        super().__init__(latency, jitter, on_traffic)
+        self.host = host
+        self.port = port
+        self.power_on_time = power_on_time
+        self.max_clients = max_clients
+        self.power = 'STANDBY'
+        self.source = source
+        self.volume = 40
+        self.mute = False
+        self.dropped = 0  # Commands ignored while powering on
+        self._powered_at = 0.0
+        self._clients = []  # Links to connected clients
+        self.server = None
+
+    def start(self):
+        device = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                device._serve(self.request)
+
+        self.server = ControlServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        super().close()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        with self.lock:
+            for link in self._clients:
+                link.close()
+
+    def send(self, line):
+        """Announce a line to every connected client."""
+        self.trace('>', line)
+        data = (line + '\r').encode('latin-1')
+        for link in self._clients:
+            link.send(data)
+
+    def handle(self, line):
+        command = line.strip().upper()
+        if command == 'PW?':
+            self.send('PW' + self.power)
+        elif command == 'PWON':
+            if self.power != 'ON':
+                self.power = 'ON'
+                self._powered_at = time.monotonic()
+            self.send('PWON')
+            self.send('ZMON')
+        elif command == 'PWSTANDBY':
+            self.power = 'STANDBY'
+            self.send('PWSTANDBY')
+            self.send('ZMOFF')
+        elif command == 'SI?':
+            self.send('SI' + self.source)
+        elif command.startswith('SI'):
+            if self.power != 'ON' or time.monotonic() - self._powered_at < self.power_on_time:
+                self.dropped += 1
+                return
+            self.source = command[2:]
+            self.send('SI' + self.source)
+        elif command == 'MV?':
+            self.send(f"MV{self.volume:02d}")
+            self.send(f"MVMAX {MAX_VOLUME}")
+        elif command in ('MVUP', 'MVDOWN') or VOLUME_COMMAND.match(command):
+            if command == 'MVUP':
+                self.volume = min(MAX_VOLUME, self.volume + 1)
+            elif command == 'MVDOWN':
+                self.volume = max(0, self.volume - 1)
+            else:
+                self.volume = min(MAX_VOLUME, int(command[2:]))
+            self.send(f"MV{self.volume:02d}")
+        elif command == 'MU?':
+            self.send('MUON' if self.mute else 'MUOFF')
+        elif command in ('MUON', 'MUOFF'):
+            self.mute = command == 'MUON'
+            self.send(command)
+
+    def _serve(self, sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        link = Link(sock.sendall, self.latency, self.jitter)
+        with self.lock:
+            if len(self._clients) >= self.max_clients:
+                link.close()
+                sock.close()
+                return
+            self._clients.append(link)
+        buffer = b''
+        try:
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                # Commands end with CR; LF is ignored
+                *lines, buffer = (buffer + data.replace(b'\n', b'')).split(b'\r')
+                for line in lines:
+                    if line:
+                        line = line.decode('ascii', 'replace')
+                        self.trace('<', line)
+                        with self.lock:
+                            self.handle(line)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self._clients.remove(link)
+            link.close()
@@ -0,0 +1,101 @@
+"""
+Fake Extron SW VGA switcher on a pty.
+
+Speaks the SIS subset src/ExtronSwVgaSwitcher.cpp uses: "<N>!" selects
+an input and is answered "In<N> All" ("<N>&" selects video only and
+answers "In<N> Vid"). Front-panel selections send the same reply
+unprompted. Whenever the set of inputs carrying a signal changes, the
+switcher sends "Sig" with one 0/1 per input, e.g. "Sig 0 1 0 0".
+
+Three background processes, each a Poisson process with an average
+rate per second, drive the traffic:
+    sig_rate      - a console on a random input turns on or off
+    glitch_rate   - a random input's signal flips for glitch_time seconds
+                    and then flips back, the noise SIG_DEBOUNCE_MS filters
+    switch_rate   - someone presses a front-panel input button
+"""
+
+import random
+import re
+
+from .link import SerialDevice
+
+# ExtronSwVgaSwitcher::configure(): 9600 baud
+BAUD = 9600
+
+# Seconds a glitch lasts: uniformly between these
+GLITCH_TIME = (0.05, 1.0)
+
+SELECT_COMMAND = re.compile(r'(\d+)([!&])$')
+
+# SIS error replies
+ERROR_INVALID_INPUT = 'E01'
+ERROR_INVALID_COMMAND = 'E10'
+
+
+class FakeExtron(SerialDevice):
+    """Input selection and signal reporting for an `inputs`-input switcher."""
+
+    name = 'extron'
+
+    def __init__(self, latency=0.0, jitter=0.0, baud=BAUD, inputs=4, sig_rate=0.0,
+                 glitch_rate=0.0, switch_rate=0.0, glitch_time=GLITCH_TIME, on_traffic=None):
+        super().__init__(latency, jitter, baud, on_traffic)
+        self.inputs = inputs
+        self.input = 1
+        self.signals = [0] * inputs
+        self.sig_rate = sig_rate
+        self.glitch_rate = glitch_rate
+        self.switch_rate = switch_rate
+        self.glitch_time = glitch_time
+        self._start(self.sig_rate, self._console)
+        self._start(self.glitch_rate, self._glitch)
+        self._start(self.switch_rate, self._front_panel)
+
+    def handle(self, line):
+        match = SELECT_COMMAND.match(line.strip())
+        if not match:
+            self.send(ERROR_INVALID_COMMAND)
+            return
+        number = int(match.group(1))
+        if not 1 <= number <= self.inputs:
+            self.send(ERROR_INVALID_INPUT)
+            return
+        self.select(number, 'All' if match.group(2) == '!' else 'Vid')
+
+    def select(self, number, tie='All'):
+        """Switch to an input and report it, as a command or the front panel does."""
+        with self.lock:
+            self.input = number
+            self.send(f"In{number} {tie}")
+
+    def set_signal(self, number, present):
+        """Turn an input's signal on or off, reporting the change."""
+        with self.lock:
+            value = 1 if present else 0
+            if self.signals[number - 1] != value:
+                self.signals[number - 1] = value
+                self.send("Sig " + " ".join(str(v) for v in self.signals))
+
+    def _start(self, rate, event):
+        if rate > 0:
+            self.after(random.expovariate(rate), self._repeat, rate, event)
+
+    def _repeat(self, rate, event):
+        event()
+        self.after(random.expovariate(rate), self._repeat, rate, event)
+
+    def _console(self):
+        number = random.randint(1, self.inputs)
+        self.set_signal(number, not self.signals[number - 1])
+
+    def _glitch(self):
+        number = random.randint(1, self.inputs)
+        present = self.signals[number - 1]
+        self.set_signal(number, not present)
+        self.after(random.uniform(*self.glitch_time), self.set_signal, number, present)
+
+    def _front_panel(self):
+        others = [n for n in range(1, self.inputs + 1) if n != self.input]
+        if others:
+            self.select(random.choice(others))
@@ -0,0 +1,250 @@
+"""
+Transport plumbing shared by the fake devices.
+
+Link delays what a device sends by latency +/- jitter and paces it at the
+line's baud rate, without ever reordering it: a serial line or a TCP
+stream delivers in order, however uneven the delays. Scheduler runs the
+devices' own timelines (boot sequences, glitches, spontaneous traffic) on
+one thread per device. PtyPort gives a device a pseudo-terminal that a
+client opens like a USB or RS-232 serial port, and SerialDevice puts the
+three together for the fakes that sit behind one.
+"""
+
+import collections
+import heapq
+import itertools
+import os
+import random
+import re
+import select
+import threading
+import time
+import tty
+
+# Bits on the wire per byte at 8N1: start + 8 data + stop
+BITS_PER_BYTE = 10
+
+
+class Link:
+    """
+    In-order delivery of one device's output to a writer.
+
+    Each send() is due latency +/- jitter after it was made, but never
+    before the previous one has gone out. With a baud rate, data arrives
+    when its last byte would have, so a burst queues behind the line.
+    """
+
+    def __init__(self, write, latency=0.0, jitter=0.0, baud=0):
+        self.write = write
+        self.latency = latency
+        self.jitter = jitter
+        self.baud = baud
+        self._queue = collections.deque()
+        self._lock = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def delay(self):
+        if not (self.latency or self.jitter):
+            return 0.0
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def send(self, data):
+        with self._lock:
+            if not self._closed:
+                self._queue.append((time.monotonic() + self.delay(), data))
+                self._lock.notify()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                due, data = self._queue.popleft()
+            time.sleep(max(0.0, due - time.monotonic()))
+            if self.baud:
+                # Delivered when the last byte would be, and the line is busy until then
+                time.sleep(len(data) * BITS_PER_BYTE / self.baud)
+            try:
+                self.write(data)
+            except OSError:
+                pass  # Peer went away; what it missed is lost, as on a real line
+
+
+class Scheduler:
+    """Run callbacks after a delay on one background thread, cancellable."""
+
+    def __init__(self):
+        self._heap = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+        self._lock = threading.Condition()
+        self._closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def after(self, delay, callback, *args):
+        """Schedule callback(*args) in `delay` seconds. Returns a handle for cancel()."""
+        with self._lock:
+            handle = next(self._ids)
+            heapq.heappush(self._heap, (time.monotonic() + delay, handle, callback, args))
+            self._lock.notify()
+            return handle
+
+    def cancel(self, handle):
+        with self._lock:
+            if handle is not None:
+                self._cancelled.add(handle)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._lock.wait(wait)
+                    else:
+                        self._lock.wait()
+                if self._closed:
+                    return
+                _, handle, callback, args = heapq.heappop(self._heap)
+                if handle in self._cancelled:
+                    self._cancelled.discard(handle)
+                    continue
+            callback(*args)
+
+
+class PtyPort:
+    """
+    A pseudo-terminal standing in for a serial port.
+
+    Clients open `path` (e.g. /dev/pts/7) as they would /dev/ttyACM0. The
+    port stays usable across client opens and closes. Received bytes are
+    split into lines on any of `terminators` and passed to on_line;
+    empty lines are dropped.
+    """
+
+    def __init__(self, on_line, terminators=b'\r\n'):
+        self.on_line = on_line
+        self._split = re.compile(b'[' + re.escape(terminators) + b']')
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # No echo or newline translation, like a UART
+        # With no reader the bytes are dropped rather than blocking, as on a UART
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        self._closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def write(self, data):
+        os.write(self._master, data)
+
+    def close(self):
+        self._closed = True
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _run(self):
+        buffer = b''
+        while not self._closed:
+            try:
+                ready, _, _ = select.select([self._master], [], [], 0.5)
+                if not ready:
+                    continue
+                data = os.read(self._master, 4096)
+            except OSError:
+                if self._closed:
+                    return
+                time.sleep(0.1)  # No client has the port open
+                continue
+            *lines, buffer = self._split.split(buffer + data)
+            for line in lines:
+                if line:
+                    self.on_line(line.decode('ascii', 'replace'))
+
+
+class FakeDevice:
+    """
+    Base for the fakes: a name, a timeline, and a traffic hook.
+
+    on_traffic(device, direction, line) sees every line, '<' for what the
+    device received and '>' for what it sent, at the time it was sent or
+    received rather than when it reaches the peer.
+    """
+
+    name = 'device'
+
+    def __init__(self, latency=0.0, jitter=0.0, on_traffic=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.on_traffic = on_traffic
+        self.scheduler = Scheduler()
+        self.lock = threading.RLock()
+
+    def after(self, delay, callback, *args):
+        """Run callback(*args) in `delay` seconds, holding the device lock."""
+        return self.scheduler.after(delay, self._locked, callback, args)
+
+    def _locked(self, callback, args):
+        with self.lock:
+            callback(*args)
+
+    def trace(self, direction, line):
+        if self.on_traffic:
+            self.on_traffic(self, direction, line)
+
+    def handle(self, line):
+        """Process one received line (subclasses)."""
+
+    def close(self):
+        self.scheduler.close()
+
+
+class SerialDevice(FakeDevice):
+    """A fake behind a pty, replying over a Link at the line's baud rate."""
+
+    newline = '\r\n'
+    terminators = b'\r\n'
+
+    def __init__(self, latency=0.0, jitter=0.0, baud=0, on_traffic=None):
+        super().__init__(latency, jitter, on_traffic)
+        self.port = PtyPort(self._received, self.terminators)
+        self.link = Link(self.port.write, latency, jitter, baud)
+
+    @property
+    def path(self):
+        return self.port.path
+
+    def send(self, line):
+        self.trace('>', line)
+        self.link.send((line + self.newline).encode('latin-1'))
+
+    def send_raw(self, data):
+        """Bytes with no framing, e.g. line noise."""
+        self.link.send(data)
+
+    def _received(self, line):
+        self.trace('<', line)
+        with self.lock:
+            self.handle(line)
+
+    def close(self):
+        super().close()
+        self.link.close()
+        self.port.close()
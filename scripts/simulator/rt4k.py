@@ -0,0 +1,120 @@
+"""
+Fake RetroTINK 4K on a pty.
+
+Speaks what src/RetroTink.cpp relies on: commands framed as
+"\\r<command>\\r", "Powering Up" when woken from sleep followed by
+"[MCU] Boot Sequence Complete" once booted, and "Entering Sleep" /
+"Power Off" when it goes to sleep. An RT4K that is already on says
+nothing to "pwr on", which is how the firmware tells the two apart
+(WAKE_RESPONSE_TIMEOUT_MS).
+
+Commands that reach an RT4K that is on are acknowledged with
+"ACK <command>" (ACK_FORMAT) so tooling can time them. This is the
+simulator's own convention: the firmware only logs it as
+"RetroTink RX". Commands sent while it sleeps or boots are ignored,
+as the real unit ignores them, and counted in `dropped`.
+"""
+
+import collections
+import random
+import re
+import time
+
+from .link import SerialDevice
+
+# RetroTink::configure(): the RT4K's UART runs at 115200 (USB CDC ignores it)
+BAUD = 115200
+
+# Seconds from "pwr on" to "[MCU] Boot Sequence Complete"
+BOOT_TIME = 8.0
+
+ACK_FORMAT = "ACK {command}"
+
+PROFILE_COMMAND = re.compile(r'remote prof(\d+)$|SVS (?:NEW|CURRENT) INPUT=(\d+)$')
+
+ON, BOOTING, SLEEPING = 'on', 'booting', 'sleeping'
+
+
+class FakeRT4K(SerialDevice):
+    """
+    RT4K power states and command handling.
+
+    power is the state at start ('on' or 'sleeping'). sleep_after puts
+    it to sleep after that many idle seconds (0 = never). noise sends a
+    burst of garbage bytes ahead of "Powering Up", as the real unit's
+    USB serial does during power transitions.
+    """
+
+    name = 'rt4k'
+    terminators = b'\r\n'
+
+    def __init__(self, latency=0.0, jitter=0.0, baud=BAUD, power=ON, boot_time=BOOT_TIME,
+                 sleep_after=0.0, noise=True, on_traffic=None):
+        super().__init__(latency, jitter, baud, on_traffic)
+        self.power = power
+        self.boot_time = boot_time
+        self.sleep_after = sleep_after
+        self.noise = noise
+        self.profile = 0
+        self.commands = collections.deque(maxlen=1000)  # (time, command) accepted
+        self.dropped = 0
+        self._sleep_timer = None
+        self._idle()
+
+    def handle(self, line):
+        command = line.strip()
+        if command == 'pwr on':
+            if self.power == SLEEPING:
+                self.power_up()
+            return
+        if self.power != ON:
+            self.dropped += 1
+            return
+
+        self.commands.append((time.time(), command))
+        self.send(ACK_FORMAT.format(command=command))
+        if command == 'pwr off':
+            self.power_down("Power Off")
+            return
+        match = PROFILE_COMMAND.match(command)
+        if match:
+            self.profile = int(match.group(1) or match.group(2))
+        self._idle()
+
+    def power_up(self):
+        """Wake from sleep, as "pwr on" or the power button does."""
+        if self.power != SLEEPING:
+            return
+        self.power = BOOTING
+        if self.noise:
+            self.send_raw(bytes(random.randint(0x80, 0xff) for _ in range(random.randint(4, 16))))
+        self.send("Powering Up")
+        self.after(self.boot_time, self._booted)
+
+    def power_down(self, message="Entering Sleep"):
+        """Go to sleep, as the idle timer or the power button does."""
+        if self.power != ON:
+            return
+        self.power = SLEEPING
+        self.scheduler.cancel(self._sleep_timer)
+        self.send(message)
+
+    def press_power(self):
+        """The front power button: toggles between on and sleeping."""
+        with self.lock:
+            if self.power == SLEEPING:
+                self.power_up()
+            else:
+                self.power_down("Power Off")
+
+    def _booted(self):
+        if self.power == BOOTING:
+            self.power = ON
+            self.send("[MCU] Boot Sequence Complete")
+            self._idle()
+
+    def _idle(self):
+        """Restart the sleep timer."""
+        self.scheduler.cancel(self._sleep_timer)
+        if self.sleep_after and self.power == ON:
+            self._sleep_timer = self.after(self.sleep_after, self.power_down)
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB Input Switch Latency
+
+Pairs the log lines of an input switch into one transaction - the Extron
+input line, the input change callback in main.cpp, the RT4K command and
+the Denon power-on and input select - and reports how long each stage
+took, as percentiles and histograms per device:
+
+    extron     Auto-switch command -> Extron input line (auto-switches only)
+    dispatch   Extron input line -> "Input change detected"
+    rt4k       Input change -> RT4K command sent (RT4K awake)
+    rt4k-wake  Input change -> RT4K command sent after waking the RT4K
+    avr-power  Input change -> Denon PWON sent
+    avr-input  Denon PWON -> Denon input select sent (includes SI_DELAY_MS)
+    to-rt4k    Extron input line -> RT4K command (RT4K awake)
+    to-avr     Extron input line -> Denon input select
+
+Timings use the device's own millisecond timestamps, so network latency
+doesn't enter into them. The Extron RX and TX lines are DEBUG entries;
+with a higher buffer level, transactions start at "Extron input changed"
+and the RT4K/Denon times come from their INFO lines instead.
+
+Usage:
+    switch_latency.py                          # Trace switches until Ctrl+C
+    switch_latency.py --once                   # Only what the device still holds
+    switch_latency.py --hosts bay1.local bay2.local --duration 600
+    switch_latency.py --archive logs/ --since 24h
+    switch_latency.py --archive logs/ --transactions --json latency.json
+
+Environment:
+    TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from datetime import datetime
+
+from logs import drain_logs, get_host, percentile, read_hosts_file
+
+# Stages reported, in order: (name, description)
+STAGES = [
+    ('extron', 'auto-switch command -> Extron input line'),
+    ('dispatch', 'Extron input line -> input change handled'),
+    ('rt4k', 'input change -> RT4K command (awake)'),
+    ('rt4k-wake', 'input change -> RT4K command (woken)'),
+    ('avr-power', 'input change -> Denon PWON'),
+    ('avr-input', 'Denon PWON -> Denon input select'),
+    ('to-rt4k', 'Extron input line -> RT4K command (awake)'),
+    ('to-avr', 'Extron input line -> Denon input select'),
+]
+
+# Percentiles reported per stage
+PERCENTILES = (0.50, 0.95, 0.99)
+
+# Histogram bucket upper bounds (ms); the last bucket holds everything above
+HISTOGRAM_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000)
+HISTOGRAM_WIDTH = 40
+
+# Longest a switch stays open waiting for its RT4K and Denon commands
+# (ms): RetroTink::BOOT_TIMEOUT_MS plus margin
+TRANSACTION_TIMEOUT = 20000
+
+# Seconds between log fetches when tracing a live device
+POLL_INTERVAL = 1.0
+
+# Log lines that make up a switch, from ExtronSwVgaSwitcher, main.cpp,
+# RetroTink and DenonAvr
+AUTO_SWITCH = re.compile(r'Extron: Signal detected on input (\d+) - auto-switching')
+RETRIGGER = re.compile(r'Extron: Signal restored on current input (\d+) - re-triggering')
+EXTRON_RX = re.compile(r'Extron RX: \[In(\d+) (?:All|Vid)')
+EXTRON_CHANGED = re.compile(r'Extron input changed to: (\d+)')
+DETECTED = re.compile(r'Input change detected: (\d+)')
+RT4K_TX = re.compile(r'RetroTink TX(?: \(stub\))?: \[(.*)\]')
+RT4K_SENT = re.compile(r'RetroTink: (?:Input \d+ triggered -> |Sending queued command: |Boot timeout)')
+RT4K_QUEUED = re.compile(r'RetroTink: (?:Queued command|Updated pending command)')
+RT4K_NO_TRIGGER = re.compile(r'RetroTink: No trigger defined for input')
+DENON_PWON = re.compile(r'DenonAvr(?: TX: \[PWON\]|: Input change - sent PWON)')
+DENON_SI = re.compile(r'DenonAvr(?: TX: \[SI|: Sent delayed input select)')
+
+
+class SwitchTracer:
+    """
+    Pairs one device's log entries, oldest first, into switch transactions.
+
+    A transaction opens on the Extron input line (or the first later line
+    of the switch that was buffered) and closes when the next switch
+    starts, or TRANSACTION_TIMEOUT after it opened. Each is a dict of
+    device timestamps per milestone.
+    """
+
+    def __init__(self):
+        self.transactions = []
+        self.lost = 0       # Entries overwritten before they were read
+        self.reboots = 0
+        self._open = None
+        self._auto = None   # (ts, input) of the last auto-switch command
+
+    def reset(self):
+        """The device rebooted: timestamps restart, nothing pairs across."""
+        self._close()
+        self._auto = None
+        self.reboots += 1
+
+    def finish(self):
+        self._close()
+
+    def _start(self, entry, number, origin):
+        self._close(superseded=True)
+        ts = entry['ts']
+        self._open = {'input': number, 'start': ts, 'origin': origin, 'wake': False}
+        if 't' in entry:
+            self._open['t'] = entry['t']
+        if self._auto and self._auto[1] == number and ts - self._auto[0] <= TRANSACTION_TIMEOUT:
+            self._open['auto'] = self._auto[0]
+        self._auto = None
+        return self._open
+
+    def _close(self, superseded=False):
+        txn = self._open
+        if txn is None:
+            return
+        txn['superseded'] = superseded and not self._complete(txn)
+        self.transactions.append(txn)
+        self._open = None
+
+    @staticmethod
+    def _complete(txn):
+        return ('rt4k' in txn or txn.get('no_trigger')) and 'avr_input' in txn
+
+    def add(self, entry):
+        ts, msg = entry['ts'], entry['msg']
+        txn = self._open
+        if txn is not None and ts - txn['start'] > TRANSACTION_TIMEOUT:
+            self._close()
+            txn = None
+
+        match = AUTO_SWITCH.match(msg)
+        if match:
+            self._auto = (ts, int(match.group(1)))
+            return
+        match = EXTRON_RX.match(msg)
+        if match:
+            self._start(entry, int(match.group(1)), 'extron')
+            return
+        match = RETRIGGER.match(msg)
+        if match:
+            self._start(entry, int(match.group(1)), 'retrigger')
+            return
+        match = EXTRON_CHANGED.match(msg)
+        if match:
+            # Follows the RX line unless that wasn't buffered
+            if txn is None or txn['input'] != int(match.group(1)) or 'detected' in txn:
+                self._start(entry, int(match.group(1)), 'changed')
+            return
+        match = DETECTED.match(msg)
+        if match:
+            if txn is None or txn['input'] != int(match.group(1)) or 'detected' in txn:
+                txn = self._start(entry, int(match.group(1)), 'detected')
+            txn['detected'] = ts
+            return
+
+        if txn is None or 'detected' not in txn:
+            return
+        match = RT4K_TX.match(msg)
+        if match:
+            command = match.group(1)
+            if command.startswith('pwr'):
+                txn['wake'] = True
+            elif not command.startswith('SVS CURRENT') and 'rt4k' not in txn:
+                txn['rt4k'] = ts
+        elif RT4K_SENT.match(msg):
+            txn.setdefault('rt4k', ts)
+        elif RT4K_QUEUED.match(msg):
+            txn['wake'] = True
+        elif RT4K_NO_TRIGGER.match(msg):
+            txn['no_trigger'] = True
+        elif DENON_PWON.match(msg):
+            txn.setdefault('avr_power', ts)
+        elif DENON_SI.match(msg):
+            txn.setdefault('avr_input', ts)
+
+
+def stage_times(txn):
+    """Per-stage durations (ms) of one transaction, for the stages it reached."""
+    times = {}
+    start = txn['start']
+    detected = txn.get('detected')
+    # Without the DEBUG RX line, "Extron input changed" stands in for it
+    from_extron = txn['origin'] in ('extron', 'changed')
+    if 'auto' in txn:
+        times['extron'] = start - txn['auto']
+    if txn['origin'] == 'extron' and detected is not None:
+        times['dispatch'] = detected - start
+    if detected is not None and 'rt4k' in txn:
+        times['rt4k-wake' if txn['wake'] else 'rt4k'] = txn['rt4k'] - detected
+        if from_extron and not txn['wake']:
+            times['to-rt4k'] = txn['rt4k'] - start
+    if detected is not None and 'avr_power' in txn:
+        times['avr-power'] = txn['avr_power'] - detected
+        if 'avr_input' in txn:
+            times['avr-input'] = txn['avr_input'] - txn['avr_power']
+    if from_extron and 'avr_input' in txn:
+        times['to-avr'] = txn['avr_input'] - start
+    return times
+
+
+def summarize(transactions):
+    """Samples and percentiles per stage for a list of transactions."""
+    samples = {name: [] for name, _ in STAGES}
+    for txn in transactions:
+        for name, value in stage_times(txn).items():
+            samples[name].append(value)
+    summary = {}
+    for name, values in samples.items():
+        if values:
+            row = {'count': len(values), 'max': max(values), 'samples': values}
+            for p in PERCENTILES:
+                row[f"p{int(p * 100)}"] = percentile(values, p)
+            summary[name] = row
+    return summary
+
+
+def histogram(values):
+    """Text histogram lines over HISTOGRAM_BOUNDS, trimmed to the used range."""
+    counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    for value in values:
+        bucket = 0
+        while bucket < len(HISTOGRAM_BOUNDS) and value >= HISTOGRAM_BOUNDS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    used = [i for i, count in enumerate(counts) if count]
+    peak = max(counts)
+    lines = []
+    for i in range(used[0], used[-1] + 1):
+        label = (f"< {HISTOGRAM_BOUNDS[i]} ms" if i < len(HISTOGRAM_BOUNDS)
+                 else f">= {HISTOGRAM_BOUNDS[-1]} ms")
+        bar = '#' * (counts[i] * HISTOGRAM_WIDTH // peak if counts[i] else 0)
+        lines.append(f"    {label:>11} {counts[i]:6} {bar}".rstrip())
+    return lines
+
+
+def print_report(name, tracer, show_histograms=True):
+    transactions = tracer.transactions
+    woken = sum(1 for txn in transactions if txn['wake'])
+    superseded = sum(1 for txn in transactions if txn['superseded'])
+    partial = sum(1 for txn in transactions if txn['origin'] != 'extron')
+    notes = [f"{woken} woke the RT4K", f"{superseded} superseded"]
+    if partial:
+        notes.append(f"{partial} without the Extron line (buffer level above DEBUG?)")
+    if tracer.lost:
+        notes.append(f"{tracer.lost} entries lost")
+    if tracer.reboots:
+        notes.append(f"{tracer.reboots} reboot{'s' if tracer.reboots != 1 else ''}")
+    print(f"{name}: {len(transactions)} switch{'es' if len(transactions) != 1 else ''} "
+          f"({', '.join(notes)})")
+    summary = summarize(transactions)
+    if not summary:
+        print()
+        return summary
+
+    print(f"  {'Stage':10} {'Count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for stage, description in STAGES:
+        row = summary.get(stage)
+        if row:
+            print(f"  {stage:10} {row['count']:6} {row['p50']:8} {row['p95']:8} "
+                  f"{row['p99']:8} {row['max']:8}  {description}")
+    if show_histograms:
+        for stage, _ in STAGES:
+            if stage in summary:
+                print(f"  {stage}:")
+                for line in histogram(summary[stage]['samples']):
+                    print(line)
+    print()
+    return summary
+
+
+def print_transactions(name, tracer):
+    for txn in tracer.transactions:
+        times = stage_times(txn)
+        stamp = datetime.fromtimestamp(txn['t']).strftime('%H:%M:%S') if 't' in txn else ''
+        fields = ', '.join(f"{stage} {times[stage]} ms" for stage, _ in STAGES if stage in times)
+        flags = ''.join([' [woke RT4K]' if txn['wake'] else '',
+                         ' [superseded]' if txn['superseded'] else ''])
+        print(f"{name} {stamp} [{txn['start'] / 1000:10.3f}] In{txn['input']}: "
+              f"{fields or 'no stages'}{flags}")
+
+
+def trace_live(hosts, duration=None, once=False):
+    """Follow each host's logs through cursor paging and feed the tracers.
+    Returns {host: SwitchTracer}, or None if a host cannot be paged."""
+    tracers = {host: SwitchTracer() for host in hosts}
+    cursors = dict.fromkeys(hosts, '')
+    deadline = time.monotonic() + duration if duration else None
+    print(f"Tracing input switches on {', '.join(hosts)}"
+          + (" (Ctrl+C to stop)" if not once else "") + "...", file=sys.stderr)
+    try:
+        while True:
+            for host in hosts:
+                result = drain_logs(host, cursors[host])
+                if result is None:
+                    if not cursors[host]:
+                        print(f"Error: Could not page logs from {host} "
+                              f"(offline, or firmware without cursor support?)", file=sys.stderr)
+                        return None
+                    continue
+                tracer = tracers[host]
+                if result['reset'] and cursors[host]:
+                    tracer.reset()
+                elif cursors[host]:
+                    tracer.lost += result['lost']
+                cursors[host] = result['cursor']
+                wall = time.time()
+                for entry in result['logs']:
+                    entry['t'] = wall - (result['now'] - entry['ts']) / 1000.0
+                    tracer.add(entry)
+            if once or (deadline and time.monotonic() >= deadline):
+                break
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
+    return tracers
+
+
+def trace_archive(path, since=None, until=None, host=None):
+    """Feed archived entries to one tracer per host. Returns {host: SwitchTracer}."""
+    from log_archive import search
+
+    sessions = {}
+    for entry in search(path, since, until, host=host):
+        sessions.setdefault((entry['host'], entry['boot']), []).append(entry)
+    tracers = {}
+    for (name, _), entries in sorted(sessions.items()):
+        tracer = tracers.get(name)
+        if tracer is None:
+            tracer = tracers[name] = SwitchTracer()
+        else:
+            tracer.reset()
+        entries.sort(key=lambda entry: entry['seq'])
+        for prev, entry in zip([None] + entries, entries):
+            if prev is not None:
+                tracer.lost += entry['seq'] - prev['seq'] - 1
+            tracer.add(entry)
+    return tracers
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Input switch latency per stage, from TinkLink-USB logs',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s --host 192.168.1.100 --duration 600
+  %(prog)s --hosts-file fleet.txt --transactions
+  %(prog)s --archive logs/ --since 24h --json latency.json
+
+Live tracing keeps its own cursor per device and needs firmware with
+/api/logs cursor paging. With scripts/emulator.py, use --switch-rate.
+        """
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--host', default=None, help='Device hostname or IP (default: $TINKLINK_HOST)')
+    source.add_argument('--hosts', nargs='+', metavar='HOST', help='Trace several devices')
+    source.add_argument('--hosts-file', metavar='FILE', help='Trace every device listed in FILE')
+    source.add_argument('--archive', metavar='DIR', help='Analyze a logs.py --archive directory')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Seconds to trace a live device (default: until Ctrl+C)')
+    parser.add_argument('--once', action='store_true',
+                        help='Only analyze the entries the device holds now')
+    parser.add_argument('--since', help='Archive: start time (ISO time or age like 2h)')
+    parser.add_argument('--until', help='Archive: end time (ISO time or age like 30m)')
+    parser.add_argument('--archive-host', metavar='HOST', help='Archive: only this host')
+    parser.add_argument('--transactions', action='store_true', help='Print every switch')
+    parser.add_argument('--no-histograms', action='store_true', help='Percentile tables only')
+    parser.add_argument('--json', metavar='FILE', help='Write transactions and percentiles as JSON')
+    args = parser.parse_args()
+
+    if args.archive:
+        from log_archive import parse_time
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+        tracers = trace_archive(args.archive, since, until, args.archive_host)
+    else:
+        if args.hosts_file:
+            try:
+                hosts = read_hosts_file(args.hosts_file)
+            except OSError as e:
+                print(f"Error: Could not read hosts file: {e}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            hosts = args.hosts or [args.host or get_host()]
+        tracers = trace_live(hosts, args.duration, args.once)
+        if tracers is None:
+            sys.exit(1)
+
+    for tracer in tracers.values():
+        tracer.finish()
+    if not tracers:
+        print("No log entries found")
+        return
+
+    if args.transactions:
+        for name, tracer in tracers.items():
+            print_transactions(name, tracer)
+        print()
+
+    results = {}
+    for name, tracer in tracers.items():
+        results[name] = print_report(name, tracer, not args.no_histograms)
+    if len(tracers) > 1:
+        combined = SwitchTracer()
+        for tracer in tracers.values():
+            combined.transactions += tracer.transactions
+            combined.lost += tracer.lost
+            combined.reboots += tracer.reboots
+        results['all'] = print_report('All devices', combined, not args.no_histograms)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'stages': {name: {stage: {k: v for k, v in row.items() if k != 'samples'}
+                                  for stage, row in summary.items()}
+                           for name, summary in results.items()},
+                'transactions': {name: tracer.transactions for name, tracer in tracers.items()},
+            }, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
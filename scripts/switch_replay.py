@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+TinkLink-USB Auto-Switch Replay
+
+Replays recorded Extron Sig/In lines through a copy of the firmware's
+signal-detection auto-switch (ExtronSwVgaSwitcher::parseSigMessage() and
+processAutoSwitch()), as fast as Python runs, to see how debounce settings
+would have behaved:
+
+    - switch decisions: "N!" auto-switches, re-triggers after signal loss,
+      and all-signals-lost holds
+    - debounce delay: from the first signal change to the decision, which
+      grows past SIG_DEBOUNCE_MS when further changes restart the timer
+    - glitch suppression: changes that reverted before the debounce
+      elapsed, and intermediate states that a later change replaced
+
+Sources are logs.py --archive directories (the DEBUG "Extron RX" lines,
+timed by the device) or capture files written by the capture command,
+which polls /api/switcher/receive and stamps each new line with the
+time of the poll that first saw it. Archives
+with the INFO auto-switch lines are also checked against the decisions
+the device actually made.
+
+Usage:
+    switch_replay.py replay logs/                      # Firmware settings
+    switch_replay.py replay logs/ --debounce 500,1000,2000,3000
+    switch_replay.py replay logs/ --host bay3.local --since 7d --decisions
+    switch_replay.py capture --host bay3.local capture.tsv
+    switch_replay.py replay capture.tsv --debounce 1000,2000
+
+Environment:
+    TINKLINK_HOST   Device hostname/IP (default: tinklink.local)
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from logs import percentile
+
+# ExtronSwVgaSwitcher::SIG_DEBOUNCE_MS and MAX_SIG_INPUTS
+SIG_DEBOUNCE_MS = 2000
+MAX_SIG_INPUTS = 16
+
+# Replayed decisions this close (ms) to a recorded one count as the same
+MATCH_TOLERANCE = 250
+
+# A recorded "In" line this soon (ms) after the device's own auto-switch
+# to that input is the switcher's reply, not a manual switch
+ACK_WINDOW = 1000
+
+# /api/switcher/receive buffer size (ExtronSwVgaSwitcher::MAX_RECENT_MESSAGES)
+RECEIVE_COUNT = 50
+
+# Seconds between /api/switcher/receive polls while capturing
+CAPTURE_INTERVAL = 0.5
+
+EXTRON_RX = re.compile(r'Extron RX: \[(.*)\]$')
+RECORDED_SWITCH = re.compile(r'Extron: Signal detected on input (\d+) - auto-switching')
+RECORDED_RETRIGGER = re.compile(r'Extron: Signal restored on current input (\d+) - re-triggering')
+RECORDED_LOST = re.compile(r'Extron: All signals lost')
+
+
+def is_input_message(line):
+    """ExtronSwVgaSwitcher::isInputMessage()"""
+    return line.startswith('In') and (line.find('All') > 0 or line.find('Vid') > 0)
+
+
+def parse_input_number(line):
+    """ExtronSwVgaSwitcher::parseInputNumber()"""
+    space = line.find(' ')
+    if space <= 2:
+        return -1
+    digits = re.match(r'[+-]?\d+', line[2:space])
+    return int(digits.group()) if digits else 0
+
+
+class AutoSwitch:
+    """
+    The firmware's auto-switch state machine, driven by replayed lines.
+
+    feed() takes each line with its time in ms. The firmware evaluates
+    the debounce on every loop() pass; here a pending decision fires at
+    its exact deadline, before any later line is processed.
+    """
+
+    def __init__(self, debounce_ms=SIG_DEBOUNCE_MS, current_input=0):
+        self.debounce_ms = debounce_ms
+        self.current_input = current_input
+        self.signal_was_lost = False
+        self.last_state = [0] * MAX_SIG_INPUTS
+        self.stable_state = [0] * MAX_SIG_INPUTS
+        self.num_inputs = 0
+        self.change_time = None
+        self.pending_since = None  # First divergence from the stable state
+
+        self.decisions = []        # (time ms, kind, input, delay ms)
+        self.suppressed = 0        # Divergences that reverted before the deadline
+        self.replaced = 0          # Pending states replaced by a newer one
+        self.manual = 0            # Input changes from the switcher itself
+
+    def _pending(self):
+        n = self.num_inputs
+        return self.last_state[:n] != self.stable_state[:n]
+
+    def _check(self, now):
+        """processAutoSwitch() at time `now`."""
+        if self.num_inputs == 0 or self.change_time is None or not self._pending():
+            return
+        if now - self.change_time < self.debounce_ms:
+            return
+
+        n = self.num_inputs
+        self.stable_state[:n] = self.last_state[:n]
+        delay = now - self.pending_since
+        self.pending_since = None
+
+        highest = 0
+        for i in range(n - 1, -1, -1):
+            if self.stable_state[i] == 1:
+                highest = i + 1
+                break
+
+        if highest == 0:
+            self.signal_was_lost = True
+            self.decisions.append((now, 'lost', self.current_input, delay))
+            return
+        if highest == self.current_input and not self.signal_was_lost:
+            return
+        if highest == self.current_input:
+            self.signal_was_lost = False
+            self.decisions.append((now, 'retrigger', highest, delay))
+            return
+        self.signal_was_lost = False
+        self.decisions.append((now, 'switch', highest, delay))
+        # The switcher confirms with "In<N> All"; the replay takes it as done
+        self.current_input = highest
+
+    def advance(self, now):
+        """Fire a decision whose deadline passed before `now`."""
+        if self.change_time is not None and self.change_time + self.debounce_ms < now:
+            self._check(self.change_time + self.debounce_ms)
+
+    def feed(self, now, line):
+        self.advance(now)
+        if is_input_message(line):
+            number = parse_input_number(line)
+            if number > 0:
+                if number != self.current_input:
+                    self.manual += 1
+                self.current_input = number
+        elif line.startswith('Sig '):
+            self._parse_sig(now, line)
+        # processAutoSwitch() runs after the lines read in the same loop
+        self._check(now)
+
+    def finish(self):
+        """Let a change still pending at the end of the recording settle."""
+        self.advance(float('inf'))
+
+    def _parse_sig(self, now, line):
+        """parseSigMessage()"""
+        state = [int(c) for c in line[4:] if c in '01'][:MAX_SIG_INPUTS]
+        if not state:
+            return
+        count = len(state)
+        if count == self.num_inputs and state == self.last_state[:count]:
+            return
+
+        was_pending = self._pending()
+        self.last_state[:count] = state
+        self.num_inputs = count
+        self.change_time = now
+        pending = self._pending()
+        if pending and not was_pending:
+            self.pending_since = now
+        elif pending:
+            self.replaced += 1
+        elif was_pending:
+            # Back to the stable state before the debounce elapsed
+            self.suppressed += 1
+            self.pending_since = None
+
+
+class Session:
+    """One continuous recording: a device boot from an archive, or a capture file."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []      # (time ms, line), oldest first
+        self.recorded = []   # (time ms, kind, input) decisions the device logged
+        self.responses = 0   # "In" replies to the device's own switches, skipped
+
+    @property
+    def span(self):
+        return self.lines[-1][0] - self.lines[0][0] if self.lines else 0
+
+
+def read_archive(path, since=None, until=None, host=None):
+    """Sessions per host and boot from a logs.py --archive directory."""
+    from log_archive import search
+
+    boots = {}
+    for entry in search(path, since, until, host=host, grep='Extron'):
+        boots.setdefault((entry['host'], entry['boot']), []).append(entry)
+
+    sessions = []
+    for (name, boot), entries in sorted(boots.items()):
+        session = Session(f"{name}#{boot}")
+        entries.sort(key=lambda entry: entry['seq'])
+        acks = {}
+        for entry in entries:
+            ts, msg = entry['ts'], entry['msg']
+            match = EXTRON_RX.match(msg)
+            if match:
+                line = match.group(1).strip()
+                if is_input_message(line):
+                    sent = acks.pop(parse_input_number(line), None)
+                    if sent is not None and ts - sent <= ACK_WINDOW:
+                        session.responses += 1
+                        continue
+                session.lines.append((ts, line))
+                continue
+            match = RECORDED_SWITCH.match(msg)
+            if match:
+                acks[int(match.group(1))] = ts
+                session.recorded.append((ts, 'switch', int(match.group(1))))
+                continue
+            match = RECORDED_RETRIGGER.match(msg)
+            if match:
+                session.recorded.append((ts, 'retrigger', int(match.group(1))))
+            elif RECORDED_LOST.match(msg):
+                session.recorded.append((ts, 'lost', None))
+        if session.lines:
+            sessions.append(session)
+    return sessions
+
+
+def read_capture(path):
+    """A capture file: one "<epoch seconds>\\t<line>" per received line."""
+    session = Session(os.path.basename(path))
+    with open(path) as f:
+        for number, text in enumerate(f, 1):
+            text = text.rstrip('\n')
+            if not text or text.startswith('#'):
+                continue
+            stamp, _, line = text.partition('\t')
+            try:
+                session.lines.append((float(stamp) * 1000.0, line.strip()))
+            except ValueError:
+                raise ValueError(f"{path}:{number}: expected <seconds><TAB><line>")
+    session.lines.sort(key=lambda item: item[0])
+    return session
+
+
+def replay(session, debounce_ms, initial_input=0):
+    """Run one session through the state machine. Returns the AutoSwitch."""
+    model = AutoSwitch(debounce_ms, initial_input)
+    for now, line in session.lines:
+        model.feed(now, line)
+    model.finish()
+    return model
+
+
+def match_recorded(session, model):
+    """(matched, recorded) decisions, pairing by kind and time."""
+    times = {}
+    for t, kind, _, _ in model.decisions:
+        times.setdefault(kind, []).append(t)
+    used = set()
+    matched = 0
+    for t, kind, _ in session.recorded:
+        candidates = times.get(kind, [])
+        i = bisect.bisect_left(candidates, t - MATCH_TOLERANCE)
+        while i < len(candidates) and candidates[i] <= t + MATCH_TOLERANCE:
+            if (kind, i) not in used:
+                used.add((kind, i))
+                matched += 1
+                break
+            i += 1
+    return matched, len(session.recorded)
+
+
+def format_stamp(session, t):
+    if t > 1e11:  # Capture files hold epoch milliseconds
+        return datetime.fromtimestamp(t / 1000.0).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return f"[{t / 1000.0:10.3f}]"
+
+
+def cmd_replay(args):
+    try:
+        debounces = [int(value) for value in args.debounce.split(',')]
+    except ValueError:
+        print(f"Error: --debounce takes comma-separated milliseconds, got {args.debounce!r}",
+              file=sys.stderr)
+        sys.exit(1)
+
+    sessions = []
+    for source in args.sources:
+        if os.path.isdir(source):
+            from log_archive import CATALOG_NAME, parse_time
+            if not os.path.exists(os.path.join(source, CATALOG_NAME)):
+                print(f"Error: {source} is not a logs.py --archive directory", file=sys.stderr)
+                sys.exit(1)
+            since = parse_time(args.since) if args.since else None
+            until = parse_time(args.until) if args.until else None
+            sessions += read_archive(source, since, until, args.host)
+        else:
+            try:
+                sessions.append(read_capture(source))
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+
+    lines = sum(len(session.lines) for session in sessions)
+    if not lines:
+        print("No Extron Sig/In lines found (archives need the DEBUG \"Extron RX\" entries)")
+        return
+    hours = sum(session.span for session in sessions) / 3600000.0
+    skipped = sum(session.responses for session in sessions)
+    print(f"{lines:,} lines from {len(sessions)} session{'s' if len(sessions) != 1 else ''} "
+          f"covering {hours:,.1f} h" + (f" ({skipped} switcher replies to recorded "
+                                        f"auto-switches skipped)" if skipped else ""))
+    print()
+
+    print(f"{'Debounce':>9} {'Switches':>9} {'Retrigger':>9} {'Lost':>6} {'Manual':>7} "
+          f"{'Suppressed':>10} {'Replaced':>9} {'Delay p50':>10} {'p95':>8} {'max':>8}  Device")
+    print("-" * 108)
+    started = time.perf_counter()
+    for debounce in debounces:
+        totals = {'switch': 0, 'retrigger': 0, 'lost': 0}
+        suppressed = replaced = manual = matched = recorded = 0
+        delays = []
+        for session in sessions:
+            model = replay(session, debounce, args.initial_input)
+            for t, kind, number, delay in model.decisions:
+                totals[kind] += 1
+                if kind != 'lost':
+                    delays.append(delay)
+                if args.decisions:
+                    print(f"  {session.name} {format_stamp(session, t)} {debounce} ms: "
+                          f"{kind} {number or '-'} after {delay:.0f} ms")
+            suppressed += model.suppressed
+            replaced += model.replaced
+            manual += model.manual
+            m, r = match_recorded(session, model)
+            matched += m
+            recorded += r
+        delay_cols = (f"{percentile(delays, 0.5):8.0f}ms {percentile(delays, 0.95):6.0f}ms "
+                      f"{max(delays):6.0f}ms" if delays else f"{'-':>10} {'-':>8} {'-':>8}")
+        print(f"{debounce:7} ms {totals['switch']:9} {totals['retrigger']:9} {totals['lost']:6} "
+              f"{manual:7} {suppressed:10} {replaced:9} {delay_cols}  "
+              + (f"{matched}/{recorded} matched" if recorded else "-"))
+    elapsed = time.perf_counter() - started
+    print()
+    print(f"Replayed {lines * len(debounces):,} lines in {elapsed:.2f}s "
+          f"({hours * len(debounces) / max(elapsed, 1e-9):,.0f} recorded hours per second)")
+
+
+def new_messages(previous, messages):
+    """
+    Lines in a /api/switcher/receive snapshot that the previous one lacked.
+
+    The buffer has no sequence numbers, so this finds the smallest shift
+    that lines the old snapshot up with the start of the new one. A run
+    of identical lines longer than the buffer is indistinguishable from
+    silence, and a snapshot that shares nothing (reboot, or the buffer
+    cycled between polls) is taken as all new.
+    """
+    for shift in range(len(previous)):
+        overlap = previous[shift:]
+        if messages[:len(overlap)] == overlap:
+            return messages[len(overlap):], False
+    return messages, bool(previous)
+
+
+def cmd_capture(args):
+    from logs import _pool, get_host
+
+    host = args.host or get_host()
+    print(f"Capturing switcher lines from {host} to {args.out} (Ctrl+C to stop)...")
+    previous = None
+    captured = 0
+    with open(args.out, 'a') as f:
+        try:
+            while True:
+                try:
+                    status, body = _pool.get(host, f"/api/switcher/receive?count={RECEIVE_COUNT}",
+                                             timeout=5)
+                    if status != 200:
+                        raise ValueError(f"HTTP {status}")
+                    messages = json.loads(body).get('messages', [])
+                except (OSError, ValueError) as e:
+                    print(f"  {host}: {e}", file=sys.stderr)
+                    time.sleep(args.interval)
+                    continue
+                stamp = time.time()
+                if previous is None:
+                    lines = []  # Already buffered: arrival times unknown
+                else:
+                    lines, gap = new_messages(previous, messages)
+                    if gap:
+                        print("  Buffer cycled between polls: lines may be missing "
+                              "(lower --interval)", file=sys.stderr)
+                previous = messages
+                for line in lines:
+                    f.write(f"{stamp:.3f}\t{line}\n")
+                if lines:
+                    f.flush()
+                    captured += len(lines)
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print(f"\n[Stopped] {captured} lines captured")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay recorded Extron signal lines through the auto-switch logic',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s replay logs/ --debounce 250,500,1000,2000,4000
+  %(prog)s replay logs/ --host bay3.local --since 2026-10-01 --decisions
+  %(prog)s capture --host 192.168.1.100 capture.tsv --interval 0.25
+
+Capture files are timed by the poll that read each line, so their
+resolution is --interval; archives use the device's own timestamps.
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('replay', help='Replay archives or capture files')
+    p.add_argument('sources', nargs='+', help='logs.py --archive directories or capture files')
+    p.add_argument('--debounce', default=str(SIG_DEBOUNCE_MS),
+                   help=f'Debounce settings to compare, ms, comma-separated '
+                        f'(default: {SIG_DEBOUNCE_MS})')
+    p.add_argument('--initial-input', type=int, default=0,
+                   help='Switcher input at the start of each session (default: 0, as after boot)')
+    p.add_argument('--host', help='Archive: only this host')
+    p.add_argument('--since', help='Archive: start time (ISO time or age like 7d)')
+    p.add_argument('--until', help='Archive: end time (ISO time or age like 1d)')
+    p.add_argument('--decisions', action='store_true', help='Print every replayed decision')
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser('capture', help='Record /api/switcher/receive lines with timestamps')
+    p.add_argument('out', help='Capture file to append to')
+    p.add_argument('--host', default=None, help='Device hostname or IP (default: $TINKLINK_HOST)')
+    p.add_argument('--interval', type=float, default=CAPTURE_INTERVAL,
+                   help=f'Seconds between polls (default: {CAPTURE_INTERVAL:g})')
+    p.set_defaults(func=cmd_capture)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
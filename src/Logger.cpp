@@ -8,6 +8,7 @@ Logger& Logger::instance() {
 
 void Logger::begin() {
     _startTime = millis();
+    _bootId = esp_random();
     _logBuffer.reserve(MAX_LOG_ENTRIES);
 }
 
@@ -102,6 +103,12 @@ void Logger::addToBuffer(LogLevel level, const String& message) {
 
     _logBuffer.push_back(entry);
     _totalCount++;
+
+    if (_listener && !_inListener) {
+        _inListener = true;
+        _listener(_logBuffer.back(), _totalCount);
+        _inListener = false;
+    }
 }
 
 const char* Logger::levelToString(LogLevel level) {
@@ -124,27 +131,16 @@ const char* Logger::levelToShortString(LogLevel level) {
     }
 }
 
-std::vector<LogEntry> Logger::getRecentLogs(int count) {
-    std::vector<LogEntry> result;
-
-    int start = 0;
-    if ((int)_logBuffer.size() > count) {
-        start = _logBuffer.size() - count;
-    }
-
-    for (int i = start; i < (int)_logBuffer.size(); i++) {
-        result.push_back(_logBuffer[i]);
-    }
-
-    return result;
+std::vector<LogEntry> Logger::getRecentLogs(int count, LogLevel minLevel, int* filtered) {
+    return collectLogs(0, count, minLevel, filtered);
 }
 
-std::vector<LogEntry> Logger::getLogsSince(unsigned long sinceIndex, int maxCount) {
-    std::vector<LogEntry> result;
-
+std::vector<LogEntry> Logger::getLogsSince(unsigned long sinceIndex, int maxCount,
+                                           LogLevel minLevel, int* filtered) {
     // Calculate how many logs we've received since sinceIndex
     if (_totalCount <= sinceIndex) {
-        return result;  // No new logs
+        if (filtered) *filtered = 0;
+        return std::vector<LogEntry>();  // No new logs
     }
 
     unsigned long newLogs = _totalCount - sinceIndex;
@@ -154,15 +150,60 @@ std::vector<LogEntry> Logger::getLogsSince(unsigned long sinceIndex, int maxCoun
     int startPos = bufferSize - (int)newLogs;
     if (startPos < 0) startPos = 0;
 
-    // Limit to maxCount
-    if (bufferSize - startPos > maxCount) {
-        startPos = bufferSize - maxCount;
+    return collectLogs(startPos, maxCount, minLevel, filtered);
+}
+
+std::vector<LogEntry> Logger::getLogsFrom(unsigned long fromIndex, int maxCount,
+                                          LogLevel minLevel, int* filtered,
+                                          unsigned long* nextIndex) {
+    std::vector<LogEntry> result;
+    int skipped = 0;
+
+    // Entries at or below the oldest index were overwritten; start after them
+    unsigned long oldest = getOldestIndex();
+    unsigned long next = fromIndex;
+    if (next < oldest) next = oldest;
+    if (next > _totalCount) next = _totalCount;
+
+    int bufferSize = _logBuffer.size();
+    for (int i = next - oldest; i < bufferSize && (int)result.size() < maxCount; i++) {
+        if (_logBuffer[i].level < minLevel) {
+            skipped++;
+        } else {
+            result.push_back(_logBuffer[i]);
+        }
+        next = oldest + i + 1;
+    }
+
+    if (filtered) *filtered = skipped;
+    if (nextIndex) *nextIndex = next;
+    return result;
+}
+
+std::vector<LogEntry> Logger::collectLogs(int startPos, int maxCount, LogLevel minLevel, int* filtered) {
+    // Walk back from the newest entry so maxCount keeps the latest matches
+    int bufferSize = _logBuffer.size();
+    int first = bufferSize;
+    int matched = 0;
+    int skipped = 0;
+    for (int i = bufferSize - 1; i >= startPos; i--) {
+        if (_logBuffer[i].level < minLevel) {
+            skipped++;
+        } else if (matched < maxCount) {
+            matched++;
+            first = i;
+        }
     }
 
-    for (int i = startPos; i < bufferSize; i++) {
-        result.push_back(_logBuffer[i]);
+    std::vector<LogEntry> result;
+    result.reserve(matched);
+    for (int i = first; i < bufferSize; i++) {
+        if (_logBuffer[i].level >= minLevel) {
+            result.push_back(_logBuffer[i]);
+        }
     }
 
+    if (filtered) *filtered = skipped;
     return result;
 }
 
@@ -41,6 +41,13 @@ struct LogEntry {
  */
 class Logger {
 public:
+    /**
+     * Callback invoked for every entry added to the buffer.
+     * @param entry The new log entry
+     * @param index Lifetime index of the entry (equals getLogCount() after adding)
+     */
+    using LogListener = std::function<void(const LogEntry& entry, unsigned long index)>;
+
     /**
      * Get the singleton Logger instance.
      * @return Reference to the global Logger
@@ -101,9 +108,12 @@ public:
     /**
      * Get the most recent log entries.
      * @param count Maximum number of entries to return (default 50)
+     * @param minLevel Skip entries below this level
+     * @param filtered If set, receives how many buffered entries were skipped
      * @return Vector of log entries, oldest first
      */
-    std::vector<LogEntry> getRecentLogs(int count = 50);
+    std::vector<LogEntry> getRecentLogs(int count = 50, LogLevel minLevel = LogLevel::DEBUG,
+                                        int* filtered = nullptr);
 
     /**
      * Get log entries added since a specific index.
@@ -111,10 +121,50 @@ public:
      *
      * @param sinceIndex The _totalCount value from a previous call to getLogCount()
      * @param maxCount Maximum entries to return (default 50)
+     * @param minLevel Skip entries below this level
+     * @param filtered If set, receives how many entries after sinceIndex
+     *                 were skipped by minLevel (so clients can tell them
+     *                 apart from entries lost to the ring buffer)
      * @return Vector of new log entries since sinceIndex, oldest first.
      *         Empty if no new logs or if sinceIndex >= current count.
      */
-    std::vector<LogEntry> getLogsSince(unsigned long sinceIndex, int maxCount = 50);
+    std::vector<LogEntry> getLogsSince(unsigned long sinceIndex, int maxCount = 50,
+                                       LogLevel minLevel = LogLevel::DEBUG,
+                                       int* filtered = nullptr);
+
+    /**
+     * Get log entries in order after a lifetime index, for paging through
+     * the buffer. Unlike getLogsSince(), which returns the newest entries,
+     * this returns the oldest ones first so successive pages join up.
+     *
+     * @param fromIndex Return entries after this lifetime index; entries
+     *                  already overwritten are skipped
+     * @param maxCount Maximum entries to return
+     * @param minLevel Skip entries below this level
+     * @param filtered If set, receives how many entries in the page were
+     *                 skipped by minLevel
+     * @param nextIndex If set, receives the lifetime index of the last entry
+     *                  the page covered, to continue from
+     * @return Vector of log entries, oldest first
+     */
+    std::vector<LogEntry> getLogsFrom(unsigned long fromIndex, int maxCount,
+                                      LogLevel minLevel = LogLevel::DEBUG,
+                                      int* filtered = nullptr,
+                                      unsigned long* nextIndex = nullptr);
+
+    /**
+     * Get the lifetime index just before the oldest buffered entry.
+     * Entries at or below it have been overwritten or cleared.
+     * @return Index of the newest entry no longer in the buffer
+     */
+    unsigned long getOldestIndex() const { return _totalCount - _logBuffer.size(); }
+
+    /**
+     * Get a random identifier chosen at boot. Lifetime indexes restart at
+     * each boot, so clients pair them with this to detect a reboot.
+     * @return Boot identifier
+     */
+    uint32_t getBootId() const { return _bootId; }
 
     /**
      * Get the total number of log messages ever recorded.
@@ -154,6 +204,17 @@ public:
      */
     void setBufferLogLevel(LogLevel level) { _bufferLogLevel = level; }
 
+    /** @return Minimum log level currently stored in the buffer */
+    LogLevel getBufferLogLevel() const { return _bufferLogLevel; }
+
+    /**
+     * Register a listener for new buffer entries (e.g. live log streaming).
+     * Messages logged from inside the listener are buffered but not passed
+     * back to it, so a listener cannot recurse into itself.
+     * @param listener Function called after each entry is buffered
+     */
+    void setListener(LogListener listener) { _listener = listener; }
+
 private:
     Logger() = default;
     ~Logger() = default;
@@ -162,17 +223,22 @@ private:
 
     void logInternal(LogLevel level, const char* format, va_list args);
     void addToBuffer(LogLevel level, const String& message);
+    std::vector<LogEntry> collectLogs(int startPos, int maxCount, LogLevel minLevel, int* filtered);
     const char* levelToString(LogLevel level);
     const char* levelToShortString(LogLevel level);
 
     static const int MAX_LOG_ENTRIES = 100;
     std::vector<LogEntry> _logBuffer;
     unsigned long _totalCount = 0;
+    uint32_t _bootId = 0;
 
     bool _serialEnabled = true;
     LogLevel _serialLogLevel = LogLevel::DEBUG;
     LogLevel _bufferLogLevel = LogLevel::DEBUG;
 
+    LogListener _listener;
+    bool _inListener = false;
+
     unsigned long _startTime = 0;
 };
 
@@ -0,0 +1,404 @@
+#include "OtaStream.h"
+#include "Logger.h"
+#include <Update.h>
+#include <esp_ota_ops.h>
+#include <esp_task_wdt.h>
+#include <rom/miniz.h>
+
+// Delta ops
+static const uint8_t OP_END = 0x00;
+static const uint8_t OP_COPY = 0x01;
+static const uint8_t OP_INSERT = 0x02;
+
+static const size_t DIGEST_SIZE = 32;
+
+// Feed the task watchdog this often during long flash reads/copies
+static const uint32_t WDT_FEED_BYTES = 64 * 1024;
+
+static String toHex(const uint8_t* digest) {
+    static const char HEX_DIGITS[] = "0123456789abcdef";
+    String hex;
+    hex.reserve(DIGEST_SIZE * 2);
+    for (size_t i = 0; i < DIGEST_SIZE; i++) {
+        hex += HEX_DIGITS[digest[i] >> 4];
+        hex += HEX_DIGITS[digest[i] & 0x0F];
+    }
+    return hex;
+}
+
+static uint32_t readU32(const uint8_t* p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static bool isCompressed(OtaEncoding encoding) {
+    return encoding == OtaEncoding::DEFLATE || encoding == OtaEncoding::DELTA_DEFLATE;
+}
+
+static bool isDelta(OtaEncoding encoding) {
+    return encoding == OtaEncoding::DELTA || encoding == OtaEncoding::DELTA_DEFLATE;
+}
+
+OtaStream::OtaStream()
+    : _encoding(OtaEncoding::RAW)
+    , _active(false)
+    , _written(0)
+    , _inflator(nullptr)
+    , _dict(nullptr)
+    , _dictOffset(0)
+    , _inflateDone(false)
+    , _hashing(false)
+    , _deltaState(DeltaState::HEADER)
+    , _fieldLen(0)
+    , _fieldNeeded(0)
+    , _op(0)
+    , _insertRemaining(0)
+    , _sourceSize(0)
+    , _targetSize(0)
+    , _source(nullptr)
+{
+}
+
+OtaStream::~OtaStream() {
+    release();
+}
+
+bool OtaStream::parseEncoding(const String& name, OtaEncoding& encoding) {
+    if (name.length() == 0 || name == "raw") {
+        encoding = OtaEncoding::RAW;
+    } else if (name == "deflate") {
+        encoding = OtaEncoding::DEFLATE;
+    } else if (name == "delta") {
+        encoding = OtaEncoding::DELTA;
+    } else if (name == "delta+deflate") {
+        encoding = OtaEncoding::DELTA_DEFLATE;
+    } else {
+        return false;
+    }
+    return true;
+}
+
+bool OtaStream::begin(OtaEncoding encoding, int command) {
+    if (_active) {
+        abort();
+    }
+    _error = "";
+    _sha256 = "";
+    _encoding = encoding;
+    _written = 0;
+    _dictOffset = 0;
+    _inflateDone = false;
+    _deltaState = DeltaState::HEADER;
+    _fieldLen = 0;
+    _fieldNeeded = DELTA_HEADER_SIZE;
+    _insertRemaining = 0;
+    _source = nullptr;
+
+    if (isDelta(encoding)) {
+        if (command != U_FLASH) {
+            return fail("Delta updates are firmware-only");
+        }
+        _source = esp_ota_get_running_partition();
+    }
+    mbedtls_sha256_init(&_targetHash);
+    mbedtls_sha256_starts(&_targetHash, 0);
+    _hashing = true;
+
+    if (isCompressed(encoding)) {
+        _inflator = (tinfl_decompressor*)malloc(sizeof(tinfl_decompressor));
+        _dict = (uint8_t*)malloc(TINFL_LZ_DICT_SIZE);
+        if (!_inflator || !_dict) {
+            release();
+            return fail("Not enough memory to inflate");
+        }
+        tinfl_init(_inflator);
+    }
+
+    if (!Update.begin(UPDATE_SIZE_UNKNOWN, command)) {
+        release();
+        return fail(Update.errorString());
+    }
+    _active = true;
+    return true;
+}
+
+bool OtaStream::write(const uint8_t* data, size_t len) {
+    if (!_active) {
+        return fail(_error.length() > 0 ? _error : String("No update in progress"));
+    }
+    bool ok = isCompressed(_encoding) ? inflate(data, len) : writeDecoded(data, len);
+    if (!ok) {
+        abort();
+    }
+    return ok;
+}
+
+bool OtaStream::end() {
+    if (!_active) {
+        return fail(_error.length() > 0 ? _error : String("No update in progress"));
+    }
+    if (isCompressed(_encoding) && !_inflateDone) {
+        abort();
+        return fail("Compressed image is truncated");
+    }
+    if (isDelta(_encoding) && _deltaState != DeltaState::DONE) {
+        abort();
+        return fail("Delta image is truncated");
+    }
+    if (!isDelta(_encoding)) {
+        // Delta digests are finished and checked at the END op
+        mbedtls_sha256_finish(&_targetHash, _digest);
+    }
+    if (!Update.end(true)) {
+        _error = Update.errorString();
+        abort();
+        return false;
+    }
+    _sha256 = toHex(_digest);
+    _active = false;
+    release();
+    return true;
+}
+
+String OtaStream::runningFirmwareSha256() {
+    uint8_t digest[DIGEST_SIZE];
+    const esp_partition_t* running = esp_ota_get_running_partition();
+    if (!running || esp_partition_get_sha256(running, digest) != ESP_OK) {
+        return "";
+    }
+    return toHex(digest);
+}
+
+void OtaStream::abort() {
+    if (_active) {
+        Update.abort();
+        _active = false;
+    }
+    release();
+}
+
+bool OtaStream::fail(const String& error) {
+    _error = error;
+    return false;
+}
+
+void OtaStream::release() {
+    free(_inflator);
+    _inflator = nullptr;
+    free(_dict);
+    _dict = nullptr;
+    if (_hashing) {
+        mbedtls_sha256_free(&_targetHash);
+        _hashing = false;
+    }
+}
+
+bool OtaStream::inflate(const uint8_t* data, size_t len) {
+    if (_inflateDone) {
+        return len == 0 || fail("Data after end of compressed image");
+    }
+
+    for (;;) {
+        size_t inBytes = len;
+        size_t outBytes = TINFL_LZ_DICT_SIZE - _dictOffset;
+        tinfl_status status = tinfl_decompress(_inflator, data, &inBytes,
+                                               _dict, _dict + _dictOffset, &outBytes,
+                                               TINFL_FLAG_PARSE_ZLIB_HEADER | TINFL_FLAG_HAS_MORE_INPUT);
+        data += inBytes;
+        len -= inBytes;
+
+        if (outBytes > 0) {
+            if (!writeDecoded(_dict + _dictOffset, outBytes)) {
+                return false;
+            }
+            // Output wraps around the dictionary, which must stay intact
+            // for back-references
+            _dictOffset = (_dictOffset + outBytes) & (TINFL_LZ_DICT_SIZE - 1);
+        }
+
+        if (status == TINFL_STATUS_DONE) {
+            _inflateDone = true;
+            return len == 0 || fail("Data after end of compressed image");
+        }
+        if (status < TINFL_STATUS_DONE) {
+            return fail("Inflate failed (" + String((int)status) + ")");
+        }
+        if (status == TINFL_STATUS_NEEDS_MORE_INPUT && len == 0) {
+            return true;
+        }
+    }
+}
+
+bool OtaStream::writeDecoded(const uint8_t* data, size_t len) {
+    return isDelta(_encoding) ? applyDelta(data, len) : writeImage(data, len);
+}
+
+bool OtaStream::applyDelta(const uint8_t* data, size_t len) {
+    while (len > 0) {
+        if (_deltaState == DeltaState::DONE) {
+            return fail("Data after end of delta");
+        }
+
+        if (_deltaState == DeltaState::INSERT) {
+            size_t n = min((size_t)_insertRemaining, len);
+            if (!writeImage(data, n)) {
+                return false;
+            }
+            data += n;
+            len -= n;
+            _insertRemaining -= n;
+            if (_insertRemaining == 0) {
+                _deltaState = DeltaState::OP;
+                _fieldNeeded = 1;
+            }
+            continue;
+        }
+
+        // Header, op and argument fields may be split across chunks
+        size_t n = min(_fieldNeeded - _fieldLen, len);
+        memcpy(_field + _fieldLen, data, n);
+        _fieldLen += n;
+        data += n;
+        len -= n;
+        if (_fieldLen == _fieldNeeded) {
+            _fieldLen = 0;
+            if (!handleDeltaField()) {
+                return false;
+            }
+        }
+    }
+    return true;
+}
+
+bool OtaStream::handleDeltaField() {
+    switch (_deltaState) {
+        case DeltaState::HEADER:
+            if (memcmp(_field, "TLD1", 4) != 0) {
+                return fail("Not a delta image");
+            }
+            _sourceSize = readU32(_field + 4);
+            _targetSize = readU32(_field + 40);
+            if (!verifySource(_field + 8)) {
+                return false;
+            }
+            LOG_INFO("OTA: Applying delta to running firmware (%u -> %u bytes)",
+                     _sourceSize, _targetSize);
+            _deltaState = DeltaState::OP;
+            _fieldNeeded = 1;
+            return true;
+
+        case DeltaState::OP:
+            _op = _field[0];
+            if (_op == OP_COPY) {
+                _deltaState = DeltaState::ARGS;
+                _fieldNeeded = 8;
+            } else if (_op == OP_INSERT) {
+                _deltaState = DeltaState::ARGS;
+                _fieldNeeded = 4;
+            } else if (_op == OP_END) {
+                _deltaState = DeltaState::DIGEST;
+                _fieldNeeded = DIGEST_SIZE;
+            } else {
+                return fail("Bad delta op " + String(_op));
+            }
+            return true;
+
+        case DeltaState::ARGS:
+            if (_op == OP_COPY) {
+                if (!copySource(readU32(_field), readU32(_field + 4))) {
+                    return false;
+                }
+                _deltaState = DeltaState::OP;
+                _fieldNeeded = 1;
+            } else {
+                _insertRemaining = readU32(_field);
+                _deltaState = _insertRemaining > 0 ? DeltaState::INSERT : DeltaState::OP;
+                _fieldNeeded = 1;
+            }
+            return true;
+
+        case DeltaState::DIGEST: {
+            if (_written != _targetSize) {
+                return fail("Delta produced " + String(_written) + " bytes, expected " +
+                            String(_targetSize));
+            }
+            mbedtls_sha256_finish(&_targetHash, _digest);
+            if (memcmp(_digest, _field, DIGEST_SIZE) != 0) {
+                return fail("Delta result does not match target hash");
+            }
+            _deltaState = DeltaState::DONE;
+            return true;
+        }
+
+        default:
+            return fail("Data after end of delta");
+    }
+}
+
+bool OtaStream::verifySource(const uint8_t* expected) {
+    if (!_source) {
+        return fail("No running firmware partition");
+    }
+    if (_sourceSize > _source->size) {
+        return fail("Delta base mismatch: base is larger than the running partition");
+    }
+
+    uint8_t buffer[COPY_BUFFER_SIZE];
+    uint8_t digest[DIGEST_SIZE];
+    mbedtls_sha256_context sha;
+    mbedtls_sha256_init(&sha);
+    mbedtls_sha256_starts(&sha, 0);
+
+    for (uint32_t offset = 0; offset < _sourceSize; ) {
+        size_t n = min((size_t)(_sourceSize - offset), (size_t)COPY_BUFFER_SIZE);
+        if (esp_partition_read(_source, offset, buffer, n) != ESP_OK) {
+            mbedtls_sha256_free(&sha);
+            return fail("Flash read failed");
+        }
+        mbedtls_sha256_update(&sha, buffer, n);
+        offset += n;
+        if (offset % WDT_FEED_BYTES == 0) {
+            esp_task_wdt_reset();
+        }
+    }
+    mbedtls_sha256_finish(&sha, digest);
+    mbedtls_sha256_free(&sha);
+
+    if (memcmp(digest, expected, DIGEST_SIZE) != 0) {
+        return fail("Delta base mismatch: device is not running the base image");
+    }
+    return true;
+}
+
+bool OtaStream::copySource(uint32_t offset, uint32_t length) {
+    if ((uint64_t)offset + length > _sourceSize) {
+        return fail("Delta copy outside the base image");
+    }
+
+    uint8_t buffer[COPY_BUFFER_SIZE];
+    uint32_t copied = 0;
+    while (copied < length) {
+        size_t n = min((size_t)(length - copied), (size_t)COPY_BUFFER_SIZE);
+        if (esp_partition_read(_source, offset + copied, buffer, n) != ESP_OK) {
+            return fail("Flash read failed");
+        }
+        if (!writeImage(buffer, n)) {
+            return false;
+        }
+        copied += n;
+        if (copied % WDT_FEED_BYTES == 0) {
+            esp_task_wdt_reset();
+        }
+    }
+    return true;
+}
+
+bool OtaStream::writeImage(const uint8_t* data, size_t len) {
+    if (Update.write(const_cast<uint8_t*>(data), len) != len) {
+        return fail(Update.errorString());
+    }
+    if (_hashing) {
+        mbedtls_sha256_update(&_targetHash, data, len);
+    }
+    _written += len;
+    return true;
+}
@@ -0,0 +1,149 @@
+#ifndef OTA_STREAM_H
+#define OTA_STREAM_H
+
+#include <Arduino.h>
+#include <esp_partition.h>
+#include <mbedtls/sha256.h>
+
+struct tinfl_decompressor_tag;
+
+/** Transfer encoding of an uploaded OTA image */
+enum class OtaEncoding {
+    RAW,            ///< Image bytes as-is
+    DEFLATE,        ///< zlib-compressed image
+    DELTA,          ///< Delta against the running firmware
+    DELTA_DEFLATE   ///< zlib-compressed delta
+};
+
+/**
+ * Decodes an uploaded OTA image into the Update library as it arrives.
+ *
+ * Compressed uploads are inflated with the ROM's miniz inflater. Delta
+ * uploads rebuild the new firmware from ranges of the running firmware
+ * plus inserted bytes, so only the changed regions cross the network.
+ *
+ * Delta format (little-endian):
+ *   "TLD1", u32 source size, u8[32] SHA-256 of source, u32 target size
+ *   then ops:
+ *     0x01 COPY   u32 offset, u32 length  - bytes from the running firmware
+ *     0x02 INSERT u32 length, data        - literal bytes
+ *     0x00 END    u8[32] SHA-256 of target
+ *
+ * The source hash is checked against the running partition before
+ * anything is written, and the target hash before Update.end().
+ * Every decoded image is hashed, so sha256() names what was flashed.
+ * Delta is firmware-only: the filesystem is rewritten in place, and it
+ * drifts from the built image as soon as config is saved.
+ */
+class OtaStream {
+public:
+    OtaStream();
+    ~OtaStream();
+
+    /**
+     * Parse an encoding name from the upload's "encoding" form field.
+     * @param name "raw", "deflate", "delta" or "delta+deflate"
+     * @param encoding Receives the parsed encoding
+     * @return false if the name is not recognized
+     */
+    static bool parseEncoding(const String& name, OtaEncoding& encoding);
+
+    /**
+     * Start an update.
+     * @param encoding Transfer encoding of the upload
+     * @param command U_FLASH or U_SPIFFS
+     * @return true on success; see error() otherwise
+     */
+    bool begin(OtaEncoding encoding, int command);
+
+    /**
+     * Decode and write a chunk of the upload.
+     * @return true on success; see error() otherwise
+     */
+    bool write(const uint8_t* data, size_t len);
+
+    /**
+     * Check the upload was complete and finish the update.
+     * @return true if the new image is valid and will boot
+     */
+    bool end();
+
+    /** Abandon the update and release buffers. */
+    void abort();
+
+    /** @return Error from the last failed call */
+    const String& error() const { return _error; }
+
+    /** @return Decoded image bytes written so far */
+    size_t written() const { return _written; }
+
+    /** @return Hex SHA-256 of the decoded image after a successful end(), else "" */
+    const String& sha256() const { return _sha256; }
+
+    /**
+     * Hash of the running firmware, as esp_partition_get_sha256() reports
+     * it: the digest esptool appends to the image (SHA-256 of the image
+     * without those last 32 bytes), or of the whole image if none.
+     * @return Hex digest, or "" if the partition can't be read
+     */
+    static String runningFirmwareSha256();
+
+private:
+    enum class DeltaState { HEADER, OP, ARGS, INSERT, DIGEST, DONE };
+
+    static const size_t DELTA_HEADER_SIZE = 44;
+    static const size_t COPY_BUFFER_SIZE = 1024;
+
+    OtaEncoding _encoding;
+    bool _active;
+    String _error;
+    size_t _written;
+    String _sha256;
+
+    // Inflate state (compressed encodings only)
+    tinfl_decompressor_tag* _inflator;
+    uint8_t* _dict;
+    size_t _dictOffset;
+    bool _inflateDone;
+
+    bool _hashing;  ///< _targetHash is initialized
+
+    // Delta state
+    DeltaState _deltaState;
+    uint8_t _field[DELTA_HEADER_SIZE];
+    size_t _fieldLen;
+    size_t _fieldNeeded;
+    uint8_t _op;
+    uint32_t _insertRemaining;
+    uint32_t _sourceSize;
+    uint32_t _targetSize;
+    const esp_partition_t* _source;
+    mbedtls_sha256_context _targetHash;
+    uint8_t _digest[32];  ///< Finished _targetHash
+
+    bool fail(const String& error);
+    void release();
+
+    /** Inflate compressed input and pass the output on. */
+    bool inflate(const uint8_t* data, size_t len);
+
+    /** Route decoded bytes to the delta decoder or straight to Update. */
+    bool writeDecoded(const uint8_t* data, size_t len);
+
+    /** Run the delta decoder over a chunk of the delta stream. */
+    bool applyDelta(const uint8_t* data, size_t len);
+
+    /** Act on a completely received header or op field. */
+    bool handleDeltaField();
+
+    /** Check the running firmware matches the delta's source hash. */
+    bool verifySource(const uint8_t* expected);
+
+    /** Write a range of the running firmware to the new image. */
+    bool copySource(uint32_t offset, uint32_t length);
+
+    /** Write image bytes to Update. */
+    bool writeImage(const uint8_t* data, size_t len);
+};
+
+#endif // OTA_STREAM_H
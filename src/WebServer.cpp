@@ -8,10 +8,76 @@
 #include "version.h"
 #include <ArduinoJson.h>
 #include <LittleFS.h>
+#include <Preferences.h>
 #include <Update.h>
 
+// NVS namespace and key for the last filesystem image flashed over OTA
+static const char* OTA_PREFS_NAMESPACE = "ota";
+static const char* OTA_PREFS_FS_SHA256 = "fsSha256";
+
+// Binary /api/logs encoding, sent when the Accept header asks for it:
+// "TLL1", u32 total, u32 now, u16 count, u16 filtered, u32 boot id, u32
+// next, u16 lost, u8 flags (bit 0 more, bit 1 reset), then count u32
+// timestamps, count u8 levels and count NUL-terminated messages (all
+// little-endian). Fields are grouped by column so clients can unpack each
+// in one call.
+static const char* LOGS_BINARY_TYPE = "application/x-tinklink-logs";
+static const size_t LOGS_BINARY_HEADER_SIZE = 27;
+
+// /api/logs cursor: "<boot id>-<lifetime index>", boot id as 8 hex digits
+static String logsCursor(unsigned long index) {
+    char cursor[24];
+    snprintf(cursor, sizeof(cursor), "%08lx-%lu",
+             static_cast<unsigned long>(Logger::instance().getBootId()), index);
+    return String(cursor);
+}
+
+// Parse a log level query parameter (0=DEBUG .. 3=ERROR)
+static bool parseLogLevel(AsyncWebServerRequest* request, const char* name, LogLevel& level) {
+    if (!request->hasParam(name)) {
+        return false;
+    }
+    int value = request->getParam(name)->value().toInt();
+    if (value < static_cast<int>(LogLevel::DEBUG)) value = static_cast<int>(LogLevel::DEBUG);
+    if (value > static_cast<int>(LogLevel::ERROR)) value = static_cast<int>(LogLevel::ERROR);
+    level = static_cast<LogLevel>(value);
+    return true;
+}
+
+// RSSI moves by a dB or two between polls; the fingerprint only follows
+// it once it has moved this far, so jitter doesn't defeat ETags. The
+// snapshot itself reports the exact reading from when it was built.
+static const int STATUS_RSSI_STEP = 5;
+
+// FNV-1a, for fingerprinting the fields /api/status is built from
+static const uint32_t FNV_OFFSET = 2166136261u;
+static const uint32_t FNV_PRIME = 16777619u;
+
+static void hashBytes(uint32_t& hash, const void* data, size_t len) {
+    const uint8_t* bytes = static_cast<const uint8_t*>(data);
+    for (size_t i = 0; i < len; i++) {
+        hash = (hash ^ bytes[i]) * FNV_PRIME;
+    }
+}
+
+static void hashString(uint32_t& hash, const char* value) {
+    // Include the terminator so adjacent fields can't run together
+    hashBytes(hash, value ? value : "", value ? strlen(value) + 1 : 1);
+}
+
+static void hashInt(uint32_t& hash, int32_t value) {
+    hashBytes(hash, &value, sizeof(value));
+}
+
+static void putLe32(uint8_t* out, uint32_t value) {
+    for (int i = 0; i < 4; i++) {
+        out[i] = (value >> (8 * i)) & 0xFF;
+    }
+}
+
 WebServer::WebServer(uint16_t port)
     : _server(new AsyncWebServer(port))
+    , _logEvents(new AsyncEventSource("/api/logs/events"))
     , _wifi(nullptr)
     , _config(nullptr)
     , _switcher(nullptr)
@@ -20,13 +86,19 @@ WebServer::WebServer(uint16_t port)
     , _otaMode(OTAMode::FIRMWARE)
     , _otaProgress(0)
     , _otaTotal(0)
+    , _otaWriteMicros(0)
     , _otaInProgress(false)
     , _otaError("")
+    , _otaRequest(nullptr)
+    , _statusFingerprint(0)
+    , _statusGeneration(0)
+    , _statusRssi(0)
 {
 }
 
 WebServer::~WebServer() {
     delete _server;
+    delete _logEvents;
 }
 
 void WebServer::begin(WifiManager* wifi, ConfigManager* config, Switcher* switcher, RetroTink* tink, DenonAvr** avr) {
@@ -36,13 +108,31 @@ void WebServer::begin(WifiManager* wifi, ConfigManager* config, Switcher* switch
     _tink = tink;
     _avrPtr = avr;
 
+    // Identify the installed images so clients can skip redundant uploads.
+    // The filesystem changes whenever config is saved, so the hash of the
+    // last image flashed over OTA is kept in NVS instead. A serial uploadfs
+    // doesn't update it, so it is informational only: clients don't skip
+    // filesystem uploads on it.
+    _firmwareSha256 = OtaStream::runningFirmwareSha256();
+    Preferences prefs;
+    if (prefs.begin(OTA_PREFS_NAMESPACE, true)) {
+        _filesystemSha256 = prefs.getString(OTA_PREFS_FS_SHA256, "");
+        prefs.end();
+    }
+
     setupRoutes();
     _server->begin();
 
+    // Push new log entries to live stream clients
+    Logger::instance().setListener([this](const LogEntry& entry, unsigned long index) {
+        sendLogEvent(entry, index);
+    });
+
     LOG_INFO("WebServer: Started on port 80");
 }
 
 void WebServer::end() {
+    Logger::instance().setListener(nullptr);
     _server->end();
 }
 
@@ -104,14 +194,23 @@ void WebServer::setupRoutes() {
     _server->on("/api/logs", HTTP_GET,
         [this](AsyncWebServerRequest* request) { handleApiLogs(request); });
 
+    // Live log stream (server-sent events)
+    _logEvents->onConnect(
+        [this](AsyncEventSourceClient* client) { handleLogEventsConnect(client); });
+    _server->addHandler(_logEvents);
+
     // OTA update endpoints
     _server->on("/api/ota/status", HTTP_GET,
         [this](AsyncWebServerRequest* request) { handleApiOtaStatus(request); });
 
     _server->on("/api/ota/upload", HTTP_POST,
         [this](AsyncWebServerRequest* request) {
-            // Final response after upload completes
-            if (_otaError.length() > 0) {
+            // Final response after upload completes. A rejected resume carries
+            // its own error and never touched the update in progress
+            if (request->_tempObject) {
+                request->send(409, "application/json",
+                    String("{\"error\":\"") + (const char*)request->_tempObject + "\"}");
+            } else if (_otaError.length() > 0) {
                 request->send(400, "application/json", "{\"error\":\"" + _otaError + "\"}");
             } else {
                 request->send(200, "application/json", "{\"status\":\"ok\",\"message\":\"Update successful. Rebooting...\"}");
@@ -155,6 +254,92 @@ void WebServer::setupRoutes() {
 }
 
 void WebServer::handleApiStatus(AsyncWebServerRequest* request) {
+    int rssi = _wifi->getRSSI();
+    if (abs(rssi - _statusRssi) >= STATUS_RSSI_STEP) {
+        _statusRssi = rssi;
+    }
+
+    // Rebuild the snapshot only when something it reports has changed;
+    // the fingerprint costs far less than a JsonDocument with every trigger
+    uint32_t fingerprint = statusFingerprint();
+    if (_statusJson.length() == 0 || fingerprint != _statusFingerprint) {
+        _statusJson = buildStatusJson();
+        _statusFingerprint = fingerprint;
+        _statusGeneration++;
+        char etag[24];
+        snprintf(etag, sizeof(etag), "\"%08lx-%lu\"",
+                 static_cast<unsigned long>(Logger::instance().getBootId()),
+                 static_cast<unsigned long>(_statusGeneration));
+        _statusEtag = etag;
+    }
+
+    // Clients that already hold this snapshot get an empty 304
+    if (request->hasHeader("If-None-Match")) {
+        const String& match = request->getHeader("If-None-Match")->value();
+        if (match == "*" || match.indexOf(_statusEtag) >= 0) {
+            AsyncWebServerResponse* response = request->beginResponse(304);
+            response->addHeader("ETag", _statusEtag);
+            response->addHeader("Cache-Control", "no-cache");
+            request->send(response);
+            return;
+        }
+    }
+
+    AsyncWebServerResponse* response = request->beginResponse(200, "application/json", _statusJson);
+    response->addHeader("ETag", _statusEtag);
+    // Browsers revalidate on every poll instead of reusing the snapshot
+    response->addHeader("Cache-Control", "no-cache");
+    request->send(response);
+}
+
+uint32_t WebServer::statusFingerprint() {
+    uint32_t hash = FNV_OFFSET;
+
+    hashInt(hash, _wifi->isConnected());
+    hashString(hash, _wifi->getSSID().c_str());
+    hashString(hash, _wifi->getIP().c_str());
+    hashInt(hash, _statusRssi);
+    hashString(hash, WiFi.getHostname());
+    hashInt(hash, static_cast<int>(_wifi->getState()));
+    hashInt(hash, static_cast<int>(_wifi->getMode()));
+    if (_wifi->isAPActive()) {
+        auto apConfig = _wifi->getAPConfig();
+        hashString(hash, apConfig.ssid.c_str());
+        hashString(hash, apConfig.ip.toString().c_str());
+    }
+
+    hashString(hash, _switcher->getTypeName());
+    hashInt(hash, _switcher->getCurrentInput());
+
+    hashInt(hash, _tink->isConnected());
+    hashString(hash, _tink->getPowerStateString());
+    hashString(hash, _tink->getLastCommand().c_str());
+
+    hashInt(hash, avr() != nullptr);
+    if (avr()) {
+        auto avrConfig = _config->getAvrConfig();
+        hashString(hash, avrConfig["type"] | "Denon X4300H");
+        hashString(hash, avrConfig["ip"] | "");
+        hashInt(hash, avr()->isConnected());
+        hashString(hash, avr()->getInput().c_str());
+        hashString(hash, avr()->getLastCommand().c_str());
+        hashString(hash, avr()->getLastResponse().c_str());
+    }
+
+    hashString(hash, _firmwareSha256.c_str());
+    hashString(hash, _filesystemSha256.c_str());
+    hashInt(hash, static_cast<int>(Logger::instance().getBufferLogLevel()));
+
+    for (const auto& trigger : _config->getTriggers()) {
+        hashInt(hash, trigger.switcherInput);
+        hashInt(hash, trigger.profile);
+        hashInt(hash, trigger.mode);
+        hashString(hash, trigger.name.c_str());
+    }
+    return hash;
+}
+
+String WebServer::buildStatusJson() {
     JsonDocument doc;
 
     // Version
@@ -215,6 +400,21 @@ void WebServer::handleApiStatus(AsyncWebServerRequest* request) {
         doc["avr"]["enabled"] = false;
     }
 
+    // OTA transfer encodings accepted by /api/ota/upload, and whether a
+    // dropped upload can be resumed at an offset
+    JsonArray encodings = doc["ota"]["encodings"].to<JsonArray>();
+    encodings.add("raw");
+    encodings.add("deflate");
+    encodings.add("delta");
+    encodings.add("delta+deflate");
+    doc["ota"]["resume"] = true;
+    doc["ota"]["firmwareSha256"] = _firmwareSha256;
+    doc["ota"]["filesystemSha256"] = _filesystemSha256;
+
+    // Log fetches can be filtered by level, and the buffer level changed
+    doc["logs"]["levelFilter"] = true;
+    doc["logs"]["bufferLevel"] = static_cast<int>(Logger::instance().getBufferLogLevel());
+
     // Triggers
     JsonArray triggersArray = doc["triggers"].to<JsonArray>();
     for (const auto& trigger : _config->getTriggers()) {
@@ -227,7 +427,7 @@ void WebServer::handleApiStatus(AsyncWebServerRequest* request) {
 
     String response;
     serializeJson(doc, response);
-    request->send(200, "application/json", response);
+    return response;
 }
 
 void WebServer::handleApiScan(AsyncWebServerRequest* request) {
@@ -542,6 +742,17 @@ void WebServer::handleApiLogs(AsyncWebServerRequest* request) {
         if (count > 100) count = 100;
     }
 
+    // Only return entries at or above this level
+    LogLevel minLevel = LogLevel::DEBUG;
+    parseLogLevel(request, "level", minLevel);
+
+    // Change which levels are stored in the buffer (until reboot)
+    LogLevel bufferLevel;
+    if (parseLogLevel(request, "bufferLevel", bufferLevel)) {
+        LOG_INFO("WebServer: Log buffer level set to %d", static_cast<int>(bufferLevel));
+        logger.setBufferLogLevel(bufferLevel);
+    }
+
     // Check if clear parameter is present
     if (request->hasParam("clear")) {
         logger.clearLogs();
@@ -549,16 +760,97 @@ void WebServer::handleApiLogs(AsyncWebServerRequest* request) {
 
     // Get logs
     std::vector<LogEntry> logs;
-    if (since > 0) {
-        logs = logger.getLogsSince(since, count);
+    LogsPage page;
+    if (request->hasParam("cursor")) {
+        // Page forward from a cursor returned by an earlier response. An
+        // empty cursor starts at the oldest buffered entry; one from an
+        // earlier boot restarts there too.
+        String cursor = request->getParam("cursor")->value();
+        unsigned long boot = 0;
+        unsigned long from = 0;
+        if (cursor.length() > 0 &&
+            (sscanf(cursor.c_str(), "%lx-%lu", &boot, &from) != 2 || boot != logger.getBootId())) {
+            page.reset = true;
+            from = 0;
+        }
+        unsigned long oldest = logger.getOldestIndex();
+        page.lost = oldest > from ? oldest - from : 0;
+        logs = logger.getLogsFrom(from, count, minLevel, &page.filtered, &page.next);
+        page.more = page.next < logger.getLogCount();
     } else {
-        logs = logger.getRecentLogs(count);
+        if (since > 0) {
+            logs = logger.getLogsSince(since, count, minLevel, &page.filtered);
+            unsigned long oldest = logger.getOldestIndex();
+            page.lost = oldest > since ? oldest - since : 0;
+        } else {
+            logs = logger.getRecentLogs(count, minLevel, &page.filtered);
+        }
+        page.next = logger.getLogCount();
     }
 
-    // Build JSON response
+    // Tools that understand the binary encoding ask for it; the web UI and
+    // older clients get JSON
+    if (request->hasHeader("Accept") &&
+        request->getHeader("Accept")->value().indexOf(LOGS_BINARY_TYPE) >= 0) {
+        sendLogsBinary(request, logs, page);
+        return;
+    }
+
+    request->send(200, "application/json", buildLogsJson(logs, page));
+}
+
+void WebServer::sendLogsBinary(AsyncWebServerRequest* request, const std::vector<LogEntry>& logs,
+                               const LogsPage& page) {
+    // Size the buffer up front so the body is a single allocation
+    size_t size = LOGS_BINARY_HEADER_SIZE + logs.size() * 5;
+    for (const LogEntry& entry : logs) {
+        size += entry.message.length() + 1;
+    }
+    AsyncResponseStream* response = request->beginResponseStream(LOGS_BINARY_TYPE, size);
+
+    uint8_t header[LOGS_BINARY_HEADER_SIZE];
+    memcpy(header, "TLL1", 4);
+    putLe32(header + 4, Logger::instance().getLogCount());
+    putLe32(header + 8, millis());
+    header[12] = logs.size() & 0xFF;
+    header[13] = logs.size() >> 8;
+    header[14] = page.filtered & 0xFF;
+    header[15] = page.filtered >> 8;
+    putLe32(header + 16, Logger::instance().getBootId());
+    putLe32(header + 20, page.next);
+    uint16_t lost = std::min<unsigned long>(page.lost, 0xFFFF);
+    header[24] = lost & 0xFF;
+    header[25] = lost >> 8;
+    header[26] = (page.more ? 0x01 : 0) | (page.reset ? 0x02 : 0);
+    response->write(header, sizeof(header));
+
+    uint8_t field[4];
+    for (const LogEntry& entry : logs) {
+        putLe32(field, entry.timestamp);
+        response->write(field, 4);
+    }
+    for (const LogEntry& entry : logs) {
+        response->write(static_cast<uint8_t>(entry.level));
+    }
+    // Messages come from vsnprintf() so never contain a NUL themselves
+    for (const LogEntry& entry : logs) {
+        response->write(reinterpret_cast<const uint8_t*>(entry.message.c_str()),
+                        entry.message.length() + 1);
+    }
+
+    request->send(response);
+}
+
+String WebServer::buildLogsJson(const std::vector<LogEntry>& logs, const LogsPage& page) {
     JsonDocument doc;
-    doc["total"] = logger.getLogCount();
+    doc["total"] = Logger::instance().getLogCount();
+    doc["now"] = millis();  // Lets clients measure how long entries waited
     doc["count"] = logs.size();
+    doc["filtered"] = page.filtered;  // Skipped by the level parameter, not lost
+    doc["cursor"] = logsCursor(page.next);
+    doc["more"] = page.more;
+    doc["lost"] = page.lost;
+    doc["reset"] = page.reset;
 
     JsonArray logsArray = doc["logs"].to<JsonArray>();
     for (const LogEntry& entry : logs) {
@@ -570,7 +862,43 @@ void WebServer::handleApiLogs(AsyncWebServerRequest* request) {
 
     String response;
     serializeJson(doc, response);
-    request->send(200, "application/json", response);
+    return response;
+}
+
+void WebServer::handleLogEventsConnect(AsyncEventSourceClient* client) {
+    Logger& logger = Logger::instance();
+    unsigned long lastId = client->lastId();
+
+    // Resume after Last-Event-ID if it belongs to this boot, otherwise send
+    // everything still buffered. One event keeps the client's message queue
+    // from overflowing on a full buffer.
+    std::vector<LogEntry> logs;
+    if (lastId > 0 && lastId <= logger.getLogCount()) {
+        logs = logger.getLogsSince(lastId, 100);
+    } else {
+        logs = logger.getRecentLogs(100);
+    }
+
+    LogsPage page;
+    page.next = logger.getLogCount();
+    client->send(buildLogsJson(logs, page).c_str(), "backlog", logger.getLogCount());
+}
+
+void WebServer::sendLogEvent(const LogEntry& entry, unsigned long index) {
+    if (_logEvents->count() == 0) {
+        return;
+    }
+
+    JsonDocument doc;
+    doc["seq"] = index;
+    doc["now"] = millis();
+    doc["ts"] = entry.timestamp;
+    doc["lvl"] = static_cast<int>(entry.level);
+    doc["msg"] = entry.message;
+
+    String data;
+    serializeJson(doc, data);
+    _logEvents->send(data.c_str(), "log", index);
 }
 
 void WebServer::handleApiOtaStatus(AsyncWebServerRequest* request) {
@@ -580,6 +908,11 @@ void WebServer::handleApiOtaStatus(AsyncWebServerRequest* request) {
     doc["progress"] = _otaProgress;
     doc["total"] = _otaTotal;
     doc["error"] = _otaError;
+    doc["upload"] = _otaUploadId;
+    // Decoded bytes written to flash, and the time spent on them, so clients
+    // can tell a slow link from slow flash writes
+    doc["written"] = _otaStream.written();
+    doc["writeMs"] = _otaWriteMicros / 1000;
 
     if (_otaTotal > 0) {
         doc["percent"] = (int)((_otaProgress * 100) / _otaTotal);
@@ -597,11 +930,37 @@ void WebServer::handleOtaUpload(AsyncWebServerRequest* request, String filename,
     // Track progress percentage for logging (reset each upload)
     static int lastPercent = -1;
 
-    // First chunk - initialize update
-    if (index == 0) {
+    // First chunk of a request that continues a dropped upload
+    size_t offset = 0;
+    if (index == 0 && request->hasParam("offset", true)) {
+        offset = request->getParam("offset", true)->value().toInt();
+    }
+    if (offset > 0) {
+        String uploadId = request->hasParam("upload", true) ?
+            request->getParam("upload", true)->value() : String("");
+        if (!_otaInProgress || uploadId.length() == 0 || uploadId != _otaUploadId ||
+            offset != _otaProgress) {
+            // Reject this request alone: another upload may still be streaming
+            String error = "Cannot resume at " + String(offset) + ": device has " +
+                           String(_otaProgress) + " bytes of upload '" + _otaUploadId + "'";
+            LOG_ERROR("OTA: %s", error.c_str());
+            request->_tempObject = strdup(error.c_str());  // Freed with the request
+            return;
+        }
+        _otaError = "";
+        claimOtaRequest(request);
+        LOG_INFO("OTA: Resuming upload at %u of %u bytes", _otaProgress, _otaTotal);
+    } else if (index == 0) {
+        // First chunk - initialize update
         _otaError = "";
         _otaProgress = 0;
-        _otaTotal = request->contentLength();
+        _otaWriteMicros = 0;
+        // Payload size from the form when given; the multipart body is a bit larger
+        _otaTotal = request->hasParam("size", true) ?
+            request->getParam("size", true)->value().toInt() : request->contentLength();
+        _otaUploadId = request->hasParam("upload", true) ?
+            request->getParam("upload", true)->value() : String("");
+        claimOtaRequest(request);
         _otaInProgress = true;
         lastPercent = -1;  // Reset progress tracking for new upload
 
@@ -622,23 +981,46 @@ void WebServer::handleOtaUpload(AsyncWebServerRequest* request, String filename,
         LOG_INFO("OTA: Starting %s update, size: %u bytes", updateType, _otaTotal);
         LOG_INFO("OTA: Filename: %s", filename.c_str());
 
-        // For filesystem updates, unmount LittleFS first
+        // For filesystem updates, unmount LittleFS first, and forget the
+        // old image's hash: a failed flash leaves neither image
         if (_otaMode == OTAMode::FILESYSTEM) {
             LittleFS.end();
+            saveFilesystemSha256("");
+        }
+
+        // Transfer encoding (compressed/delta) from the form field
+        OtaEncoding encoding = OtaEncoding::RAW;
+        if (request->hasParam("encoding", true)) {
+            String name = request->getParam("encoding", true)->value();
+            if (!OtaStream::parseEncoding(name, encoding)) {
+                _otaError = "Unknown encoding: " + name;
+                LOG_ERROR("OTA: %s", _otaError.c_str());
+                _otaInProgress = false;
+                return;
+            }
+            LOG_INFO("OTA: Encoding: %s", name.c_str());
         }
 
-        if (!Update.begin(UPDATE_SIZE_UNKNOWN, updateCommand)) {
-            _otaError = Update.errorString();
+        if (!_otaStream.begin(encoding, updateCommand)) {
+            _otaError = _otaStream.error();
             LOG_ERROR("OTA: Update.begin() failed: %s", _otaError.c_str());
             _otaInProgress = false;
             return;
         }
     }
 
+    // Chunks of a rejected resume must not reach the open update
+    if (request != _otaRequest) {
+        return;
+    }
+
     // Write chunk
     if (_otaInProgress && len > 0) {
-        if (Update.write(data, len) != len) {
-            _otaError = Update.errorString();
+        unsigned long writeStart = micros();
+        bool written = _otaStream.write(data, len);
+        _otaWriteMicros += micros() - writeStart;
+        if (!written) {
+            _otaError = _otaStream.error();
             LOG_ERROR("OTA: Update.write() failed: %s", _otaError.c_str());
             _otaInProgress = false;
             return;
@@ -653,16 +1035,47 @@ void WebServer::handleOtaUpload(AsyncWebServerRequest* request, String filename,
         }
     }
 
-    // Final chunk - finish update
-    if (final) {
-        if (!Update.end(true)) {
-            _otaError = Update.errorString();
+    // Final chunk - finish update (unless an earlier chunk already failed)
+    if (final && _otaInProgress) {
+        if (!_otaStream.end()) {
+            _otaError = _otaStream.error();
             LOG_ERROR("OTA: Update.end() failed: %s", _otaError.c_str());
         } else {
-            LOG_INFO("OTA: Update successful! Total: %u bytes", _otaProgress);
+            LOG_INFO("OTA: Update successful! Total: %u bytes (%u bytes written)",
+                     _otaProgress, _otaStream.written());
+            if (_otaMode == OTAMode::FILESYSTEM) {
+                saveFilesystemSha256(_otaStream.sha256());
+            }
         }
         _otaInProgress = false;
+        _otaRequest = nullptr;
+    }
+}
+
+void WebServer::claimOtaRequest(AsyncWebServerRequest* request) {
+    _otaRequest = request;
+    // Forget the request when its connection goes, so a later request
+    // allocated at the same address can't pass for it
+    request->onDisconnect([this, request]() {
+        if (_otaRequest == request) {
+            _otaRequest = nullptr;
+        }
+    });
+}
+
+void WebServer::saveFilesystemSha256(const String& sha256) {
+    _filesystemSha256 = sha256;
+    Preferences prefs;
+    if (!prefs.begin(OTA_PREFS_NAMESPACE, false)) {
+        LOG_WARN("OTA: Could not open NVS to record filesystem hash");
+        return;
+    }
+    if (sha256.length() > 0) {
+        prefs.putString(OTA_PREFS_FS_SHA256, sha256);
+    } else {
+        prefs.remove(OTA_PREFS_FS_SHA256);
     }
+    prefs.end();
 }
 
 void WebServer::handleApiAvrSend(AsyncWebServerRequest* request) {
@@ -4,12 +4,15 @@
 #include <Arduino.h>
 #include <ESPAsyncWebServer.h>
 #include <functional>
+#include <vector>
+#include "OtaStream.h"
 
 class WifiManager;
 class ConfigManager;
 class Switcher;
 class RetroTink;
 class DenonAvr;
+struct LogEntry;
 
 /**
  * LED control callback function type.
@@ -25,6 +28,17 @@ enum class OTAMode {
     FILESYSTEM   ///< LittleFS filesystem update
 };
 
+/**
+ * Position and paging details sent with a batch of /api/logs entries.
+ */
+struct LogsPage {
+    unsigned long next = 0;   ///< Lifetime index the batch ends at (next cursor)
+    unsigned long lost = 0;   ///< Entries after the requested position already overwritten
+    int filtered = 0;         ///< Entries skipped by the level parameter
+    bool more = false;        ///< More entries are buffered after this batch
+    bool reset = false;       ///< Cursor was from an earlier boot; paging restarted
+};
+
 /**
  * Async web server for TinkLink-USB.
  *
@@ -36,7 +50,7 @@ enum class OTAMode {
  * - System log retrieval
  *
  * API Endpoints:
- * - GET  /api/status             - System status (WiFi, switcher, triggers)
+ * - GET  /api/status             - System status (WiFi, switcher, triggers); ETag/If-None-Match
  * - GET  /api/wifi/scan          - Scan for WiFi networks
  * - POST /api/wifi/connect       - Connect to WiFi network
  * - POST /api/wifi/disconnect    - Disconnect from WiFi
@@ -46,8 +60,9 @@ enum class OTAMode {
  * - POST /api/switcher/send      - Send message to video switcher
  * - GET  /api/switcher/receive   - Get recent switcher messages
  * - GET  /api/logs               - Get system logs
+ * - GET  /api/logs/events        - Live log stream (server-sent events)
  * - GET  /api/ota/status         - Get OTA update progress
- * - POST /api/ota/upload         - Upload firmware or filesystem
+ * - POST /api/ota/upload         - Upload firmware or filesystem (raw, compressed or delta)
  */
 class WebServer {
 public:
@@ -80,6 +95,7 @@ public:
 
 private:
     AsyncWebServer* _server;
+    AsyncEventSource* _logEvents;
     WifiManager* _wifi;
     ConfigManager* _config;
     Switcher* _switcher;
@@ -92,13 +108,26 @@ private:
     OTAMode _otaMode;
     size_t _otaProgress;
     size_t _otaTotal;
+    unsigned long _otaWriteMicros;  ///< Time spent decoding and writing to flash
     bool _otaInProgress;
     String _otaError;
+    OtaStream _otaStream;
+    String _otaUploadId;                 ///< Client's name for the upload, for resuming
+    AsyncWebServerRequest* _otaRequest;  ///< Request currently feeding _otaStream
+    String _firmwareSha256;              ///< Running firmware, hashed once at startup
+    String _filesystemSha256;            ///< Last filesystem image flashed over OTA
 
     // Config restore state
     String _restoreBody;
     String _restoreError;
 
+    // /api/status snapshot, rebuilt only when a field it reports changes
+    String _statusJson;           ///< Serialized status last built
+    String _statusEtag;           ///< ETag of _statusJson: boot id and generation
+    uint32_t _statusFingerprint;  ///< Hash of the fields _statusJson was built from
+    uint32_t _statusGeneration;   ///< Snapshots built since boot
+    int _statusRssi;              ///< RSSI the fingerprint follows, in STATUS_RSSI_STEP moves
+
     /** Configure all HTTP routes and handlers. */
     void setupRoutes();
 
@@ -126,8 +155,73 @@ private:
                                      size_t index, size_t total);
     void handleNotFound(AsyncWebServerRequest* request);
 
+    /**
+     * Hash every field /api/status reports, without building the JSON.
+     * @return FNV-1a fingerprint; changes whenever the status would
+     */
+    uint32_t statusFingerprint();
+
+    /**
+     * Serialize the /api/status response.
+     * @return JSON with version, wifi, switcher, tink, avr, ota, logs and
+     *         triggers fields
+     */
+    String buildStatusJson();
+
+    /**
+     * Serialize log entries in the /api/logs response format.
+     * @param logs Entries to include, oldest first
+     * @param page Cursor and paging details for the batch
+     * @return JSON with total, now (millis), count, filtered, cursor, more,
+     *         lost, reset and logs fields
+     */
+    String buildLogsJson(const std::vector<LogEntry>& logs, const LogsPage& page);
+
+    /**
+     * Send log entries in the binary /api/logs encoding (see api.html),
+     * built straight into a pre-sized response buffer.
+     * @param request Request to answer
+     * @param logs Entries to include, oldest first
+     * @param page Cursor and paging details for the batch
+     */
+    void sendLogsBinary(AsyncWebServerRequest* request, const std::vector<LogEntry>& logs,
+                        const LogsPage& page);
+
+    /**
+     * Replay buffered entries to a newly connected log stream client.
+     * Resumes after the client's Last-Event-ID when the buffer still
+     * covers it, otherwise sends the whole buffer as one "backlog" event.
+     * @param client The connecting event source client
+     */
+    void handleLogEventsConnect(AsyncEventSourceClient* client);
+
+    /**
+     * Push a new log entry to all connected log stream clients.
+     * @param entry The new log entry
+     * @param index Lifetime index of the entry
+     */
+    void sendLogEvent(const LogEntry& entry, unsigned long index);
+
+    /**
+     * Record the hash of the installed filesystem image in NVS.
+     * @param sha256 Hex digest, or "" to forget it
+     */
+    void saveFilesystemSha256(const String& sha256);
+
+    /**
+     * Make a request the one feeding _otaStream, until it disconnects.
+     * @param request The upload request
+     */
+    void claimOtaRequest(AsyncWebServerRequest* request);
+
     /**
      * Handle chunked OTA upload.
+     *
+     * An upload whose connection drops stays open. A later request with
+     * the same "upload" id and an "offset" equal to the bytes received so
+     * far continues it; any other offset is rejected with 409, leaving the
+     * open upload untouched.
+     *
      * @param request The HTTP request
      * @param filename Uploaded filename
      * @param index Byte offset of this chunk